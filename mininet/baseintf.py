@@ -20,12 +20,15 @@ def __init__( self, name, node, port=None, link=None,
         self.link = link
         self.mac = mac
         self.ip, self.prefixLen = None, None
+        # Cached addresses that may be out of date (see cachedIP())
+        self.staleAddrs = set( [ 'ip', 'mac' ] )
 
         # if interface is lo/lo0, we know the ip is 127.0.0.1.
         # This saves an ifconfig command per node
         if self.name == 'lo' or self.name == 'lo0':
             self.ip = '127.0.0.1'
             self.prefixLen = 8
+            self.staleAddrs.discard( 'ip' )
         # Add to node (and move ourselves if necessary )
         moveIntfFn = params.pop( 'moveIntfFn', None )
         if moveIntfFn:
@@ -48,6 +51,7 @@ def setIP( self, ipstr, prefixLen=None ):
         """Set our IP address"""
         # This is a sign that we should perhaps rethink our prefix
         # mechanism and/or the way we specify IP addresses
+        self.staleAddrs.discard( 'ip' )
         if '/' in ipstr:
             self.ip, self.prefixLen = ipstr.split( '/' )
             return self.ifconfig( ipstr, 'up' )
@@ -96,6 +100,28 @@ def updateAddr( self ):
         self.mac = macs[ 0 ] if macs else None
         return self.ip, self.mac
 
+    # Address cache: ip and mac are filled in when we set them, and
+    # refreshed for all of a node's interfaces at once by
+    # node.refreshAddrs() when they may be out of date
+
+    def invalidate( self ):
+        "Mark our cached addresses as possibly out of date"
+        self.staleAddrs = set( [ 'ip', 'mac' ] )
+
+    def cachedIP( self ):
+        """Return IP address from cache, refreshing our node's
+           addresses first if it may be out of date"""
+        if 'ip' in self.staleAddrs:
+            self.node.refreshAddrs()
+        return self.ip
+
+    def cachedMAC( self ):
+        """Return MAC address from cache, refreshing our node's
+           addresses first if it may be out of date"""
+        if 'mac' in self.staleAddrs:
+            self.node.refreshAddrs()
+        return self.mac
+
     def IP( self ):
         "Return IP address"
         return self.ip
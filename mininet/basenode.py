@@ -7,6 +7,7 @@
 import re
 import select
 from subprocess import Popen, PIPE
+from time import time
 
 plat = os.uname()[ 0 ]
 if plat == 'FreeBSD':
@@ -17,17 +18,106 @@
     from mininet.openbsd.util import LO, moveIntf
 
 from mininet.log import info, error, warn, debug
+from mininet.profiler import count
 from mininet.util import quietRun
 from mininet.moduledeps import pathCheck
 from mininet.link import Link
 from re import findall
 
 
+class DeferredOutput( str ):
+    """Output of commands queued by BaseNode.deferCmds(). It reads as ''
+       until the commands have run, and may be concatenated with other
+       output, so that config methods can return it as they would
+       return the output of cmd()."""
+
+    def __new__( cls, parts ):
+        "parts: list of command indices and literal strings"
+        self = str.__new__( cls, '' )
+        self.parts = parts
+        return self
+
+    @staticmethod
+    def partsOf( value ):
+        "Return parts of value, which may be a DeferredOutput"
+        if isinstance( value, DeferredOutput ):
+            return value.parts
+        return [ value ]
+
+    def __add__( self, other ):
+        return DeferredOutput( self.parts + self.partsOf( other ) )
+
+    def __radd__( self, other ):
+        return DeferredOutput( self.partsOf( other ) + self.parts )
+
+    def resolve( self, outputs ):
+        """Return actual output
+           outputs: list of outputs of the queued commands"""
+        result = []
+        for part in self.parts:
+            if isinstance( part, int ):
+                part = outputs[ part ] if part < len( outputs ) else ''
+            result.append( part )
+        return ''.join( result )
+
+
+class PendingOutput( object ):
+    """Output of a command sent with BaseNode.acmd(), collected without
+       blocking. done() reads whatever output is ready, and fileno()
+       lets one select() or poll() wait for commands on many nodes.
+       This is a Python 2 stand-in for an asyncio future:
+         pending = [ h.acmd( 'ping -c1', h2.IP() ) for h in hosts ]
+         outputs = [ p.result() for p in pending ]"""
+
+    def __init__( self, node ):
+        "node: node the command was sent to"
+        self.node = node
+        self.chunks = []
+        self.output = None
+
+    def fileno( self ):
+        "Return the fd that becomes readable as output arrives"
+        return self.node.stdout.fileno()
+
+    def buffered( self ):
+        "Is output already read from the shell waiting to be parsed?"
+        return self.output is None and len( self.node.readbuf ) > 0
+
+    def readable( self, timeout=0 ):
+        """Is there output to read? (The node's own poller also reports
+           that the shell is writable, so it can't tell us.)
+           timeout: seconds to wait, or None to wait indefinitely"""
+        return ( self.buffered() or
+                 bool( select.select( [ self ], [], [], timeout )[ 0 ] ) )
+
+    def done( self ):
+        """Read any output that is ready without blocking
+           returns: True if the command has finished"""
+        while self.output is None and self.readable():
+            self.chunks.append( self.node.monitor( timeoutms=0 ) )
+            if not self.node.waiting:
+                self.output = ''.join( self.chunks )
+        return self.output is not None
+
+    def result( self, timeoutms=None ):
+        """Wait for the command to finish
+           timeoutms: timeout in ms or None to wait indefinitely
+           returns: output, or None if the command is still running"""
+        end = None if timeoutms is None else time() + timeoutms / 1000.0
+        while not self.done():
+            remaining = None if end is None else end - time()
+            if remaining is not None and remaining <= 0:
+                return None
+            self.readable( remaining )
+        return self.output
+
+
 class BaseNode( object ):
     """A virtual network node is simply a shell in a network namespace.
        We communicate with it using pipes."""
 
     portBase = 0  # Nodes always start with eth0/port0, even in OF 1.0
+    readSize = 65536  # Maximum bytes to read from shell at once
 
     def __init__( self, name, inNamespace=True, **params ):
         """name: name of node
@@ -42,6 +132,10 @@ def __init__( self, name, inNamespace=True, **params ):
         self.privateDirs = params.get( 'privateDirs', [] )
         self.inNamespace = params.get( 'inNamespace', inNamespace )
 
+        # Spawn our shell without waiting for its prompt?
+        waitPrompt = params.pop( 'waitPrompt', True )
+        self.readSize = params.pop( 'readSize', self.readSize )
+
         # Stash configuration parameters for future reference
         self.params = params
 
@@ -55,10 +149,12 @@ def __init__( self, name, inNamespace=True, **params ):
             self.lastPid, self.lastCmd, self.pollOut ) = (
                 None, None, None, None, None, None, None, None )
         self.waiting = False
-        self.readbuf = ''
+        self.promptPending = False
+        self.readbuf = bytearray()
+        self.deferred = None  # commands queued by deferCmds()
 
         # Start command interpreter shell
-        self.startShell()
+        self.startShell( waitPrompt=waitPrompt )
         self.mountPrivateDirs()
 
     # File descriptor to node mapping support
@@ -84,8 +180,12 @@ def isShellBuiltin( self, cmd ):
         pass
 
     # Command support via shell process in namespace
-    def startShell( self, mnopts=None ):
-        "Start a shell process for running commands"
+    def startShell( self, mnopts=None, waitPrompt=True ):
+        """Start a shell process for running commands
+           mnopts: options for mnexec (optional)
+           waitPrompt: wait for the shell's prompt? If False, the
+               prompt is collected later by waitPrompt() or by the
+               first command sent to the shell"""
         if self.shell:
             error( "%s: shell is already running\n" % self.name )
             return
@@ -95,6 +195,7 @@ def startShell( self, mnopts=None ):
         # received by the parent
         master, slave = pty.openpty()
         self.shell = self.getShell( master, slave, mnopts )
+        count( 'processes' )
         self.stdin = os.fdopen( master, 'rw' )
         self.stdout = self.stdin
         self.pid = self.shell.pid
@@ -108,16 +209,33 @@ def startShell( self, mnopts=None ):
         self.execed = False
         self.lastCmd = None
         self.lastPid = None
-        self.readbuf = ''
-        # Wait for prompt
-        while True:
-            data = self.read( 1024 )
-            if data[ -1 ] == chr( 127 ):
-                break
+        self.readbuf = bytearray()
+        self.promptPending = True
+        if waitPrompt:
+            self.waitPrompt()
+
+    def readPrompt( self ):
+        """Read available output from a newly started shell.
+           returns: True if the prompt has been received"""
+        data = self.read()
+        return len( data ) > 0 and data[ -1 ] == chr( 127 )
+
+    def waitPrompt( self ):
+        "Wait for the prompt of a newly started shell, then set it up."
+        while not self.readPrompt():
             self.pollOut.poll()
+        self.initShell()
+
+    def initShell( self, wait=True ):
+        """Set up a shell whose prompt has been received.
+           wait: wait for the setup command to complete? If False,
+               the caller must call waitOutput()"""
+        self.promptPending = False
         self.waiting = False
         # +m: disable job control notification
-        self.cmd( 'unset HISTFILE; stty -echo; set +m' )
+        self.sendCmd( 'unset HISTFILE; stty -echo; set +m' )
+        if wait:
+            self.waitOutput()
 
     def mountPrivateDirs( self ):
         "mount private directories - overridden"
@@ -133,6 +251,7 @@ def _popen( self, cmd, **params ):
             params: parameters to Popen()"""
         # Leave this is as an instance method for now
         assert self
+        count( 'processes' )
         return Popen( cmd, **params )
 
     def cleanup( self ):
@@ -141,30 +260,35 @@ def cleanup( self ):
 
     # Subshell I/O, commands and control
 
-    def read( self, maxbytes=1024 ):
+    def read( self, maxbytes=None ):
         """Buffered read from node, potentially blocking.
-           maxbytes: maximum number of bytes to return"""
-        count = len( self.readbuf )
-        if count < maxbytes:
-            data = os.read( self.stdout.fileno(), maxbytes - count )
+           maxbytes: maximum number of bytes to return (readSize)"""
+        if maxbytes is None:
+            maxbytes = self.readSize
+        if not self.readbuf:
+            data = os.read( self.stdout.fileno(),
+                            max( maxbytes, self.readSize ) )
+            if len( data ) <= maxbytes:
+                # Common case: no need to copy through our buffer
+                return data
             self.readbuf += data
-        if maxbytes >= len( self.readbuf ):
-            result = self.readbuf
-            self.readbuf = ''
-        else:
-            result = self.readbuf[ :maxbytes ]
-            self.readbuf = self.readbuf[ maxbytes: ]
+        result = bytes( self.readbuf[ :maxbytes ] )
+        del self.readbuf[ :maxbytes ]
         return result
 
     def readline( self ):
         """Buffered readline from node, potentially blocking.
            returns: line (minus newline) or None"""
-        self.readbuf += self.read( 1024 )
-        if '\n' not in self.readbuf:
-            return None
-        pos = self.readbuf.find( '\n' )
-        line = self.readbuf[ 0: pos ]
-        self.readbuf = self.readbuf[ pos + 1: ]
+        pos = self.readbuf.find( b'\n' )
+        if pos < 0:
+            # Only scan data we haven't looked at yet
+            start = len( self.readbuf )
+            self.readbuf += os.read( self.stdout.fileno(), self.readSize )
+            pos = self.readbuf.find( b'\n', start )
+            if pos < 0:
+                return None
+        line = bytes( self.readbuf[ :pos ] )
+        del self.readbuf[ :pos + 1 ]
         return line
 
     # overridden in some platforms
@@ -187,22 +311,20 @@ def stop( self, deleteIntfs=False ):
     def waitReadable( self, timeoutms=None ):
         """Wait until node's output is readable.
            timeoutms: timeout in ms or None to wait indefinitely.
-           returns: result of poll()"""
+           returns: result of poll(), or True if data is buffered"""
         if len( self.readbuf ) == 0:
             return self.pollOut.poll( timeoutms )
+        return True
 
-    def sendCmd( self, *args, **kwargs ):
-        """Send a command, followed by a command to echo a sentinel,
-           and return without waiting for the command to complete.
-           args: command and arguments, or string
-           printPid: print command's PID? (False)"""
-        assert self.shell and not self.waiting
-        printPid = kwargs.get( 'printPid', True )
+    @staticmethod
+    def cmdString( args ):
+        """Return command arguments as a single command string
+           args: command and arguments, or string, or [ list ]"""
         # Allow sendCmd( [ list ] )
         if len( args ) == 1 and isinstance( args[ 0 ], list ):
             cmd = args[ 0 ]
         # Allow sendCmd( cmd, arg1, arg2... )
-        elif len( args ) > 0:
+        else:
             cmd = args
         # Convert to string
         if not isinstance( cmd, str ):
@@ -210,6 +332,18 @@ def sendCmd( self, *args, **kwargs ):
         if not re.search( r'\w', cmd ):
             # Replace empty commands with something harmless
             cmd = 'echo -n'
+        return cmd
+
+    def sendCmd( self, *args, **kwargs ):
+        """Send a command, followed by a command to echo a sentinel,
+           and return without waiting for the command to complete.
+           args: command and arguments, or string
+           printPid: print command's PID? (False)"""
+        if self.promptPending:
+            self.waitPrompt()
+        assert self.shell and not self.waiting
+        printPid = kwargs.get( 'printPid', True )
+        cmd = self.cmdString( args )
         self.lastCmd = cmd
         # if a builtin command is backgrounded, it still yields a PID
         if len( cmd ) > 0 and cmd[ -1 ] == '&':
@@ -217,6 +351,8 @@ def sendCmd( self, *args, **kwargs ):
             cmd += ' printf "\\001%d\\012" $! '
         elif printPid and not self.isShellBuiltin( cmd ):
             cmd = 'mnexec -p ' + cmd
+            count( 'processes' )
+        count( 'roundtrips' )
         self.write( cmd + '\n' )
         self.lastPid = None
         self.waiting = True
@@ -229,21 +365,23 @@ def monitor( self, timeoutms=None, findPid=True ):
         ready = self.waitReadable( timeoutms )
         if not ready:
             return ''
-        data = self.read( 1024 )
-        pidre = r'\[\d+\] \d+\r\n'
-        # Look for PID
-        marker = chr( 1 ) + r'\d+\r\n'
-        if findPid and chr( 1 ) in data:
+        data = self.read()
+        # Look for PID marker, once per command
+        if findPid and self.lastPid is None and chr( 1 ) in data:
             # suppress the job and PID of a backgrounded command
-            if re.findall( pidre, data ):
-                data = re.sub( pidre, '', data )
-            # Marker can be read in chunks; continue until all of it is read
-            while not re.findall( marker, data ):
-                data += self.read( 1024 )
-            markers = re.findall( marker, data )
-            if markers:
-                self.lastPid = int( markers[ 0 ][ 1: ] )
-                data = re.sub( marker, '', data )
+            data = re.sub( r'\[\d+\] \d+\r\n', '', data )
+            # Marker can be read in chunks; read until its end arrives,
+            # scanning only the newly read data each time
+            chunks = [ data ]
+            pos = data.find( chr( 1 ) )
+            while chunks[ -1 ].find( '\n', pos ) < 0:
+                pos = 0
+                chunks.append( self.read() )
+            data = ''.join( chunks )
+            match = re.search( chr( 1 ) + r'(\d+)\r\n', data )
+            if match:
+                self.lastPid = int( match.group( 1 ) )
+                data = data[ :match.start() ] + data[ match.end(): ]
         # Look for sentinel/EOF
         if len( data ) > 0 and data[ -1 ] == chr( 127 ):
             self.waiting = False
@@ -260,12 +398,12 @@ def waitOutput( self, verbose=False, findPid=True ):
            the output, including trailing newline.
            verbose: print output interactively"""
         log = info if verbose else debug
-        output = ''
+        output = []
         while self.waiting:
             data = self.monitor( findPid=findPid )
-            output += data
+            output.append( data )
             log( data )
-        return output
+        return ''.join( output )
 
     def cmd( self, *args, **kwargs ):
         """Send a command, wait for output, and return it.
@@ -273,12 +411,89 @@ def cmd( self, *args, **kwargs ):
         verbose = kwargs.get( 'verbose', False )
         log = info if verbose else debug
         log( '*** %s : %s\n' % ( self.name, args ) )
+        if self.deferred is not None:
+            # Queue command for runDeferred() or Mininet.configHosts()
+            self.deferred.append( self.cmdString( args ) )
+            return DeferredOutput( [ len( self.deferred ) - 1 ] )
         if self.shell:
             self.sendCmd( *args, **kwargs )
             return self.waitOutput( verbose )
         else:
             warn( '(%s exited - ignoring cmd%s)\n' % ( self, args ) )
 
+    # Deferred commands: cmd() queues commands, which are later sent
+    # to the shell as a single script, saving a round trip per command
+
+    deferSep = chr( 2 )  # printed between the outputs of deferred commands
+
+    # Set deferConfig in a node class whose config() ignores the output
+    # of the commands it runs, so that Mininet.configHosts() may defer
+    # them. Subclasses that override config() don't inherit it.
+    deferConfig = False
+
+    @classmethod
+    def defersConfig( cls ):
+        """Return whether config() commands may be deferred: we (or the
+           class that set deferConfig) must not have overridden config()"""
+        for klass in cls.__mro__:
+            if 'deferConfig' in vars( klass ):
+                return klass.deferConfig
+            if 'config' in vars( klass ):
+                return False
+        return False
+
+    def deferCmds( self ):
+        """Queue commands sent with cmd() rather than running them;
+           cmd() returns a DeferredOutput, which reads as '' until
+           resolveDeferred() replaces it with the command's output"""
+        self.deferred = []
+
+    def deferredScript( self ):
+        """Stop deferring commands and return the queued commands as
+           a single shell script, or None if there are none"""
+        cmds, self.deferred = self.deferred, None
+        if not cmds:
+            return None
+        sep = "printf '\\%03o\\n';" % ord( self.deferSep )
+        script = []
+        for cmd in cmds[ :-1 ]:
+            cmd = cmd.rstrip().rstrip( ';' )
+            # A backgrounded command can't be followed by ';'
+            script.append( cmd + ( ' ' if cmd.endswith( '&' ) else '; ' ) +
+                           sep )
+        script.append( cmds[ -1 ] )
+        return ' '.join( script )
+
+    def resolveDeferred( self, results, output ):
+        """Replace DeferredOutputs in results with command outputs
+           results: dict of results (e.g. from config()) to update
+           output: output of script from deferredScript()
+           returns: results"""
+        outputs = re.split( self.deferSep + r'\r?\n', output or '' )
+        for name, value in results.items():
+            if isinstance( value, DeferredOutput ):
+                results[ name ] = value.resolve( outputs )
+        return results
+
+    def runDeferred( self, results=None ):
+        """Run commands queued since deferCmds() as a single script
+           results: dict of results to resolve (optional)
+           returns: results"""
+        results = {} if results is None else results
+        script = self.deferredScript()
+        if script:
+            output = self.cmd( script, printPid=False )
+            self.resolveDeferred( results, output )
+        return results
+
+    def acmd( self, *args, **kwargs ):
+        """Send a command without waiting for it to complete
+           args, kwargs: as for sendCmd()
+           returns: PendingOutput for the command's output"""
+        debug( '*** %s : %s\n' % ( self.name, args ) )
+        self.sendCmd( *args, **kwargs )
+        return PendingOutput( self )
+
     def cmdPrint( self, *args):
         """Call cmd and printing its output
            cmd: string"""
@@ -402,6 +617,13 @@ def setARP( self, ip, mac ):
         result = self.cmd( 'arp', '-s', ip, mac )
         return result
 
+    def setARPs( self, entries ):
+        """Add many ARP entries with a single shell command.
+           entries: list of ( ip, mac ) strings"""
+        if entries:
+            return self.cmd( '; '.join( 'arp -s %s %s' % ( ip, mac )
+                                        for ip, mac in entries ) )
+
     def setHostRoute( self, ip, intf ):
         """Add route to host.
            ip: IP address as dotted decimal
@@ -437,6 +659,18 @@ def MAC( self, intf=None ):
         "Return MAC address of a node or specific interface."
         return self.intf( intf ).MAC()
 
+    def refreshAddrs( self ):
+        """Refresh the cached addresses of all of our interfaces
+           (see Intf.cachedIP())"""
+        for intf in self.intfList():
+            intf.updateAddr()
+            intf.staleAddrs.clear()
+
+    def invalidateAddrs( self ):
+        "Mark the cached addresses of all of our interfaces as stale"
+        for intf in self.intfList():
+            intf.invalidate()
+
     def intfIsUp( self, intf=None ):
         "Check if an interface is up."
         return self.intf( intf ).isUp()
@@ -490,7 +724,7 @@ def config( self, mac=None, ip=None,
     def configDefault( self, **moreParams ):
         "Configure with default parameters"
         self.params.update( moreParams )
-        self.config( **self.params )
+        return self.config( **self.params )
 
     # This is here for backward compatibility
     def linkTo( self, node, link=Link ):
@@ -0,0 +1,243 @@
+"""
+bench.py: scalability benchmarks for Mininet
+
+Build, start, ping and stop standard topologies at increasing sizes,
+with each available switch and link class, and record how long each
+step takes, how many processes and shell round trips it needs, and
+the peak memory used. Each network is run in a forked child, so that
+its peak memory use is measured on its own rather than as the
+high-water mark of every run so far:
+
+  python -m mininet.bench --topos single,linear --sizes 10,100 \\
+      --format csv --output bench.csv
+
+Results are written as JSON (a list of records) or CSV, so that the
+cost of bringing up networks can be compared between releases.
+
+Sizes are interpreted per topology: the number of hosts for single,
+the number of switches for linear, the fanout of a depth-2 tree, and
+the side of a square torus (which must be at least 3). Torus
+topologies have loops, so they are not pinged.
+"""
+
+import csv
+import json
+import os
+import sys
+from optparse import OptionParser
+from resource import getrusage, RUSAGE_SELF, RUSAGE_CHILDREN
+from time import time
+
+from mininet.clean import cleanup
+from mininet.log import setLogLevel, info, error, LEVELS
+from mininet.net import Mininet
+from mininet.profiler import counters
+from mininet.topo import SingleSwitchTopo, LinearTopo
+from mininet.topolib import TreeTopo, TorusTopo
+from mininet.util import customClass
+
+plat = os.uname()[ 0 ]
+if plat == 'FreeBSD':
+    from mininet.freebsd.mnopts import SWITCHES, LINKS, CONTROLLERS
+elif plat == 'OpenBSD':
+    from mininet.openbsd.mnopts import SWITCHES, LINKS, CONTROLLERS
+else:
+    from mininet.linux.mnopts import SWITCHES, LINKS, CONTROLLERS
+
+TOPOS = { 'single': lambda size: SingleSwitchTopo( k=size ),
+          'linear': lambda size: LinearTopo( k=size ),
+          'tree': lambda size: TreeTopo( depth=2, fanout=size ),
+          'torus': lambda size: TorusTopo( size, size ) }
+
+# Topologies with loops, which we don't ping
+LOOPY = ( 'torus', )
+
+FIELDS = [ 'topo', 'size', 'switch', 'link', 'hosts', 'switches', 'links',
+           'build', 'start', 'ping', 'stop', 'total', 'ploss',
+           'processes', 'roundtrips', 'maxrss', 'childmaxrss', 'error' ]
+
+
+def available( cls ):
+    "Can class cls be used here?"
+    try:
+        cls.setup()
+    except ( Exception, SystemExit ):  # pylint: disable=broad-except
+        return False
+    return True
+
+def nodeClasses( classes, specs=None ):
+    """Return list of ( name, class )
+       classes: dict of name -> class
+       specs: list of class specs (e.g. ovs,datapath=user), or None for
+              each class in classes, skipping aliases"""
+    if specs:
+        return [ ( spec, customClass( classes, spec ) ) for spec in specs ]
+    result, seen = [], []
+    # Prefer real names to 'default'
+    for name in sorted( classes, key=lambda n: ( n == 'default', n ) ):
+        if classes[ name ] not in seen:
+            seen.append( classes[ name ] )
+            result.append( ( name, classes[ name ] ) )
+    return result
+
+def measure( topoName, size, switch, link, controller, ping=True ):
+    """Build, start, ping and stop a single network; called in a
+       fresh child, so that rusage covers just this network
+       returns: dict of results (see FIELDS)"""
+    before = dict( counters )
+    times = {}
+    result = {}
+    net = None
+    start = time()
+    try:
+        topo = TOPOS[ topoName ]( size )
+        net = Mininet( topo=topo, switch=switch, link=link,
+                       controller=controller, build=False,
+                       waitConnected=True )
+        step = time()
+        net.build()
+        times[ 'build' ], step = time() - step, time()
+        net.start()
+        times[ 'start' ], step = time() - step, time()
+        if ping and topoName not in LOOPY:
+            result[ 'ploss' ] = net.ping()
+            times[ 'ping' ], step = time() - step, time()
+        result.update( hosts=len( net.hosts ), switches=len( net.switches ),
+                       links=len( net.links ) )
+        net.stop()
+        net = None
+        times[ 'stop' ] = time() - step
+    except Exception as e:  # pylint: disable=broad-except
+        error( '*** Benchmark %s,%s failed: %s\n' % ( topoName, size, e ) )
+        result[ 'error' ] = str( e )
+        if net:
+            net.stop()
+        cleanup()
+    result.update( times )
+    result.update( total=time() - start,
+                   processes=counters[ 'processes' ] - before[ 'processes' ],
+                   roundtrips=( counters[ 'roundtrips' ] -
+                                before[ 'roundtrips' ] ),
+                   maxrss=getrusage( RUSAGE_SELF ).ru_maxrss,
+                   childmaxrss=getrusage( RUSAGE_CHILDREN ).ru_maxrss )
+    return result
+
+def runOne( topoName, size, switch, link, controller, ping=True ):
+    """Run measure() in a forked child and return its results
+       returns: dict of results (see FIELDS)"""
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close( rfd )
+        status = 1
+        try:
+            result = measure( topoName, size, switch, link, controller,
+                              ping )
+            with os.fdopen( wfd, 'w' ) as f:
+                json.dump( result, f )
+            status = 0
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit( status )  # pylint: disable=protected-access
+    os.close( wfd )
+    with os.fdopen( rfd ) as f:
+        data = f.read()
+    _pid, status = os.waitpid( pid, 0 )
+    if not data:
+        error( '*** Benchmark %s,%s died\n' % ( topoName, size ) )
+        cleanup()
+        if os.WIFSIGNALED( status ):
+            return { 'error': 'benchmark killed by signal %d' %
+                     os.WTERMSIG( status ) }
+        return { 'error': 'benchmark exited with status %d' %
+                 os.WEXITSTATUS( status ) }
+    return dict( ( str( key ), value )
+                 for key, value in json.loads( data ).items() )
+
+def runBenchmarks( topos, sizes, switches, links, controller, ping=True ):
+    """Run benchmarks for each combination of parameters
+       topos: list of topology names (see TOPOS)
+       sizes: list of sizes
+       switches: list of ( name, class )
+       links: list of ( name, class )
+       controller: controller class
+       ping: run pingall?
+       returns: list of result dicts"""
+    results = []
+    for topoName in topos:
+        for size in sizes:
+            for switchName, switch in switches:
+                for linkName, link in links:
+                    info( '*** Benchmark: topo=%s size=%s switch=%s '
+                          'link=%s\n' % ( topoName, size, switchName,
+                                          linkName ) )
+                    result = runOne( topoName, size, switch, link,
+                                     controller, ping )
+                    result.update( topo=topoName, size=size,
+                                   switch=switchName, link=linkName )
+                    results.append( result )
+    return results
+
+def writeResults( results, outfile, fmt='json' ):
+    """Write results to outfile
+       fmt: json or csv"""
+    if fmt == 'csv':
+        writer = csv.DictWriter( outfile, FIELDS )
+        writer.writeheader()
+        for result in results:
+            writer.writerow( result )
+    else:
+        json.dump( results, outfile, indent=2, sort_keys=True )
+        outfile.write( '\n' )
+
+def main( argv=None ):
+    "Parse command line and run benchmarks"
+    parser = OptionParser( usage='python -m mininet.bench [options]' )
+    parser.add_option( '--topos', default=','.join( sorted( TOPOS ) ),
+                       help='comma-separated topologies (%default)' )
+    parser.add_option( '--sizes', default='3,6,9',
+                       help='comma-separated sizes (%default)' )
+    parser.add_option( '--switches', default=None,
+                       help='colon-separated switch types, e.g. '
+                       'ovs:lxbr,stp=1 (default: all available)' )
+    parser.add_option( '--links', default=None,
+                       help='colon-separated link types (default: all)' )
+    parser.add_option( '--controller', default='default',
+                       help='controller type (%default)' )
+    parser.add_option( '--noping', action='store_true', default=False,
+                       help="don't run pingall" )
+    parser.add_option( '--format', type='choice', choices=[ 'json', 'csv' ],
+                       default='json', help='output format (%default)' )
+    parser.add_option( '--output', '-o', default=None,
+                       help='output file (default: stdout)' )
+    parser.add_option( '--verbosity', '-v', type='choice',
+                       choices=list( LEVELS.keys() ), default='warning',
+                       help='|'.join( LEVELS.keys() ) )
+    opts, args = parser.parse_args( argv )
+    if args:
+        parser.error( 'unexpected arguments: %s' % ' '.join( args ) )
+    setLogLevel( opts.verbosity )
+    topos = opts.topos.split( ',' )
+    for topoName in topos:
+        if topoName not in TOPOS:
+            parser.error( 'unknown topology %s' % topoName )
+    sizes = [ int( size ) for size in opts.sizes.split( ',' ) ]
+    switches = nodeClasses( SWITCHES, opts.switches and
+                            opts.switches.split( ':' ) )
+    if not opts.switches:
+        switches = [ ( name, cls ) for name, cls in switches
+                     if available( cls ) ]
+    links = nodeClasses( LINKS, opts.links and opts.links.split( ':' ) )
+    controller = customClass( CONTROLLERS, opts.controller )
+    results = runBenchmarks( topos, sizes, switches, links, controller,
+                             ping=not opts.noping )
+    if opts.output:
+        with open( opts.output, 'w' ) as outfile:
+            writeResults( results, outfile, opts.format )
+    else:
+        writeResults( results, sys.stdout, opts.format )
+
+
+if __name__ == '__main__':
+    main()
@@ -8,13 +8,19 @@
 code), this script may be used to get rid of unwanted garbage.
 It may also get rid of 'false positives', but hopefully
 nothing irreplaceable!
+
+If the runs being cleaned up left manifests (see mininet.manifest),
+only the resources they list are removed, and the search for
+leftovers is used only if that doesn't account for everything.
 """
+import os
 from os import uname
 from subprocess import ( Popen, PIPE, check_output as co,
                          CalledProcessError )
 import time
 
-from mininet.log import info
+from mininet.log import info, warn
+from mininet.manifest import STATE_DIR, manifestPaths, loadManifest
 from mininet.term import cleanUpScreens
 
 def sh( cmd ):
@@ -102,6 +108,16 @@ def _ifcfgCleanLo( listCmd ):
                          for lo in los[ i : i + n ] )
         sh( '( %s ) 2> /dev/null' % cmd )
 
+def _ipBatchDel( names ):
+    "Delete interfaces with a single 'ip -batch'"
+    return ( 'printf "%s" | ip -force -batch - 2> /dev/null' %
+             ''.join( 'link del dev %s\\n' % name for name in names ) )
+
+def _ifDestroy( names ):
+    "Destroy interfaces with ifconfig"
+    return '( %s ) 2> /dev/null' % ';'.join( 'ifconfig %s destroy' % name
+                                            for name in names )
+
 
 platform = uname()[ 0 ]
 if platform == 'FreeBSD':
@@ -110,6 +126,7 @@ def _ifcfgCleanLo( listCmd ):
     pidsFunc   = _popenPids
     cleanNodes = killnodes
     zkill_cmd = ( 'killall -9 ping mnexec ryu-manager' )
+    delLinksCmd = _ifDestroy
 elif platform == 'Linux':
     cleanLinks, args = _iplinkClean, None
     pidsFunc   = _coPids
@@ -117,12 +134,143 @@ def _ifcfgCleanLo( listCmd ):
     zkill_cmd = ( 'killall -9 controller ofprotocol ofdatapath ping nox_core'
                 'lt-nox_core ovs-openflowd ovs-controller'
                 'ovs-testcontroller udpbwtest mnexec ivs ryu-manager' )
+    delLinksCmd = _ipBatchDel
 else: # OpenBSD
     cleanLinks = _ifcfgCleanLo
     args = "ifconfig %s | sed -n 's|\(^[a-z]\{1,\}[0-9]\{1,\}\):.*|\\1| p'"
     pidsFunc   = _coPids
     cleanNodes = killprocs
     zkill_cmd = ( 'pkill -9 ping mnexec switchd' )
+    delLinksCmd = _ifDestroy
+
+
+def _livePids( pids ):
+    "Return dict of pid -> command line for those of pids still running"
+    if not pids:
+        return {}
+    out = Popen( [ 'ps', '-o', 'pid=', '-o', 'command=', '-p',
+                   ','.join( str( pid ) for pid in pids ) ],
+                 stdout=PIPE, stderr=PIPE ).communicate()[ 0 ]
+    live = {}
+    for line in out.splitlines():
+        fields = line.split( None, 1 )
+        if len( fields ) == 2:
+            live[ int( fields[ 0 ] ) ] = fields[ 1 ]
+    return live
+
+def _sessionPids( sessions ):
+    "Return list of PIDs of processes in sessions"
+    if not sessions:
+        return []
+    out = Popen( [ 'pgrep', '-s', ','.join( str( sid ) for sid in sessions ) ],
+                 stdout=PIPE ).communicate()[ 0 ]
+    return [ int( pid ) for pid in out.split() ]
+
+def _waitPids( pids, sessions=(), timeout=2 ):
+    """Wait for processes and all processes in sessions to exit
+       returns: list of PIDs still running"""
+    end = time.time() + timeout
+    while True:
+        running = list( _livePids( pids ) ) + _sessionPids( sessions )
+        if not running or time.time() > end:
+            return running
+        time.sleep( .05 )
+
+def cleanManifests( stateDir=STATE_DIR ):
+    """Remove exactly the resources listed in the manifests left in
+       stateDir by Mininet runs that did not stop cleanly, using a few
+       batched commands for all of them, run in parallel. Manifests
+       that can't be read are removed, but we can't tell what their
+       runs left behind, so we don't claim to have removed everything.
+       returns: number of manifests, True if everything was removed"""
+    manifests, unreadable = [], []
+    for path in manifestPaths( stateDir ):
+        manifest = loadManifest( path )
+        if not manifest:
+            # Unless its run has just removed it
+            if os.path.exists( path ):
+                warn( '*** Could not read manifest %s\n' % path )
+                unreadable.append( path )
+            continue
+        owner = manifest.get( 'pid' )
+        if owner and owner != os.getpid() and owner in _livePids( [ owner ] ):
+            warn( '*** Mininet process %s is still running; not cleaning '
+                  'up its resources\n' % owner )
+            continue
+        manifests.append( ( path, manifest ) )
+    for path in unreadable:
+        try:
+            os.unlink( path )
+        except OSError:
+            pass
+    if not manifests:
+        return len( unreadable ), False
+    info( '*** Cleaning up resources from %d Mininet manifests\n' %
+          len( manifests ) )
+    # Kill node sessions and tunnels, unless their PIDs have been
+    # reused. A session ID can't be reused while the session has
+    # processes in it, so sessions whose leaders are gone are still ours.
+    sessions, tunnels = [], []
+    for _path, manifest in manifests:
+        sessions += manifest.get( 'sessions', [] )
+        tunnels += manifest.get( 'tunnels', [] )
+    expected = { pid: 'ssh' for pid in tunnels }
+    for _path, manifest in manifests:
+        for pid, name in manifest.get( 'commands', {} ).items():
+            expected[ int( pid ) ] = 'mininet:' + name
+    live = _livePids( list( expected ) )
+    # Match whole arguments, so that e.g. mininet:h10 isn't mininet:h1
+    reused = [ pid for pid, command in live.items()
+               if expected[ pid ] not in
+               [ os.path.basename( arg ) for arg in command.split() ] ]
+    sessions = [ pid for pid in sessions if pid not in reused ]
+    tunnels = [ pid for pid in tunnels if pid in live and pid not in reused ]
+    if sessions:
+        sh( 'pkill -9 -s %s' % ','.join( str( pid ) for pid in sessions ) )
+    if tunnels:
+        sh( 'kill -9 %s' % ' '.join( str( pid ) for pid in tunnels ) )
+    complete = not _waitPids( tunnels, sessions )
+    # Remove everything else with one command per resource type
+    resources = {}
+    for _path, manifest in manifests:
+        for key in 'interfaces', 'bridges', 'cgroups', 'mounts', 'jails':
+            resources.setdefault( key, [] ).extend( manifest.get( key, [] ) )
+    cmds = []
+    if resources[ 'jails' ]:
+        cmds.append( ';'.join( 'jail -r %s 2>/dev/null' % jid
+                               for jid in resources[ 'jails' ] ) )
+    if resources[ 'bridges' ]:
+        cmds.append( 'ovs-vsctl --timeout=1 ' + ' -- '.join(
+            '--if-exists del-br ' + br for br in resources[ 'bridges' ] ) )
+    if resources[ 'interfaces' ]:
+        cmds.append( delLinksCmd( resources[ 'interfaces' ] ) )
+    if resources[ 'cgroups' ]:
+        # Node shells are gone, so the cgroups are empty
+        cmds.append( 'rmdir ' + ' '.join( resources[ 'cgroups' ] ) +
+                     ' 2> /dev/null' )
+    if resources[ 'mounts' ]:
+        cmds.append( ';'.join( 'umount %s 2>/dev/null' % mount
+                               for mount in resources[ 'mounts' ] ) )
+    procs = []
+    for cmd in cmds:
+        info( cmd + '\n' )
+        procs.append( Popen( [ '/bin/sh', '-c', cmd ], stdout=PIPE ) )
+    for proc in procs:
+        proc.communicate()
+    for path, _manifest in manifests:
+        try:
+            os.unlink( path )
+        except OSError:
+            pass
+    return len( manifests ) + len( unreadable ), complete and not unreadable
+
+def cleanJunk():
+    "Remove junk from /tmp and old X11 tunnels"
+    info( "*** Removing junk from /tmp\n" )
+    sh( 'rm -f /tmp/vconn* /tmp/vlogs* /tmp/*.out /tmp/*.log' )
+
+    info( "*** Removing old X11 tunnels\n" )
+    cleanUpScreens()
 
 
 class Cleanup( object ):
@@ -131,9 +279,19 @@ class Cleanup( object ):
     callbacks = []
 
     @classmethod
-    def cleanup( cls):
+    def cleanup( cls, scan=None ):
         """Clean up junk which might be left over from old runs;
-           do fast stuff before slow dp and link removal!"""
+           do fast stuff before slow dp and link removal!
+           scan: search for junk as well as removing what is listed
+                 in run manifests? (default: only if needed)"""
+
+        if scan is not True:
+            found, complete = cleanManifests()
+            if ( found and complete ) or scan is False:
+                cleanJunk()
+                cls.runCallbacks()
+                info( "*** Cleanup complete.\n" )
+                return
 
         info( "*** Removing excess controllers/ofprotocols/ofdatapaths/"
               "pings/noxes\n" )
@@ -148,11 +306,7 @@ def cleanup( cls):
         # And kill off sudo mnexec
         sh( 'pkill -9 -f "mnexec"')
 
-        info( "*** Removing junk from /tmp\n" )
-        sh( 'rm -f /tmp/vconn* /tmp/vlogs* /tmp/*.out /tmp/*.log' )
-
-        info( "*** Removing old X11 tunnels\n" )
-        cleanUpScreens()
+        cleanJunk()
 
         info( "*** Removing excess kernel datapaths\n" )
         dps = sh( "ps ax | egrep -o 'dp[0-9]+' | sed 's/dp/nl:/'"
@@ -182,12 +336,16 @@ def cleanup( cls):
         killprocs( pidsFunc, '.ssh\/mn' )
         sh( 'rm -f ~/.ssh/mn/*' )
 
-        # Call any additional cleanup code if necessary
-        for callback in cls.callbacks:
-            callback()
+        cls.runCallbacks()
 
         info( "*** Cleanup complete.\n" )
 
+    @classmethod
+    def runCallbacks( cls ):
+        "Call any additional cleanup code if necessary"
+        for callback in cls.callbacks:
+            callback()
+
     @classmethod
     def addCleanupCallback( cls, callback ):
         "Add cleanup callback"
@@ -37,7 +37,7 @@
 from mininet.log import info, output, error
 from mininet.term import makeTerms, runX11
 from mininet.util import ( quietRun, dumpNodeConnections,
-                           dumpPorts )
+                           dumpPorts, makeNumeric )
 
 class CLI( Cmd ):
     "Simple command-line interface to talk to nodes."
@@ -274,6 +274,25 @@ def do_link( self, line ):
         else:
             self.mn.configLinkStatus( *args )
 
+    def do_tclink( self, line ):
+        """Change bandwidth, delay or loss of link(s) between two nodes
+           in place; none removes a parameter.
+           Usage: tclink node1 node2 param=value ...
+           e.g. tclink s1 s2 bw=10 delay=5ms loss=none"""
+        args = line.split()
+        if len( args ) < 3 or not all( '=' in arg for arg in args[ 2: ] ):
+            error( 'invalid args: tclink end1 end2 param=value ...\n' )
+            return
+        params = {}
+        for arg in args[ 2: ]:
+            key, value = arg.split( '=', 1 )
+            params[ key ] = ( None if value.lower() == 'none'
+                              else makeNumeric( value ) )
+        try:
+            self.mn.configLinkParams( args[ 0 ], args[ 1 ], **params )
+        except Exception as e:  # pylint: disable=broad-except
+            error( str( e ) + '\n' )
+
     def do_xterm( self, line, term='xterm' ):
         """Spawn xterm(s) for the given node(s).
            Usage: xterm node1 node2 ..."""
@@ -412,14 +431,16 @@ def default( self, line ):
             node = self.mn[ first ]
             rest = args.split()
             # Substitute IP addresses for node names in command
-            # If updateIP() returns None, then use node name
-            rest = [ self.mn[ arg ].defaultIntf().updateIP() or arg
+            # If cachedIP() returns None, then use node name
+            rest = [ self.mn[ arg ].defaultIntf().cachedIP() or arg
                      if arg in self.mn else arg
                      for arg in rest ]
             rest = ' '.join( rest )
             # Run cmd on node:
             node.sendCmd( rest )
             self.waitForNode( node )
+            # The command may have changed node's addresses
+            node.invalidateAddrs()
         else:
             error( '*** Unknown command: %s\n' % line )
 
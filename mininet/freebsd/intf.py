@@ -10,6 +10,7 @@ class Intf( BaseIntf ):
 
     def setMAC( self, macstr ):
         self.mac = macstr
+        self.staleAddrs.discard( 'mac' )
         return ( self.ifconfig( 'down' ) +
                  self.ifconfig( 'ether', macstr, 'up' ) )
 
@@ -29,12 +29,23 @@
 if plat == 'FreeBSD':
     from mininet.freebsd.intf import Intf
     from mininet.freebsd.util import makeIntfPair
+    makeIntfPairs = batchDeleteIntfs = ipAddrs = setLinkStates = None
+    plainIfconfigs = ( Intf.ifconfig, )
 elif plat == 'Linux':
-    from mininet.linux.intf import Intf
-    from mininet.linux.util import makeIntfPair
+    from mininet.linux.intf import Intf, NetlinkIntf
+    from mininet.linux.util import ( makeIntfPair, makeIntfPairs,
+                                     batchDeleteIntfs, ipAddrs,
+                                     setLinkStates )
+    plainIfconfigs = ( Intf.ifconfig, NetlinkIntf.ifconfig )
 else:
     from mininet.openbsd.intf import Intf
     from mininet.openbsd.util import makeIntfPair
+    makeIntfPairs = batchDeleteIntfs = ipAddrs = setLinkStates = None
+    plainIfconfigs = ( Intf.ifconfig, )
+
+import re
+from subprocess import PIPE, STDOUT
+from time import sleep, time
 
 from mininet.log import info, error, debug
 
@@ -130,6 +141,142 @@ def tc( self, cmd, tc='tc' ):
         debug(" *** executing command: %s\n" % c)
         return self.cmd( c )
 
+    # Shaping commands queued by config() while batching, as
+    # ( intf, ethtool args, tc commands or None, tcoutputs list )
+    batch = None
+
+    # ( kind, major handle ) of the root qdisc config() installed
+    rootQdisc = None
+
+    # Shaping parameters and tc commands of the last config()
+    tcParams = None
+    tcCmds = None
+
+    @staticmethod
+    def namespace( intf ):
+        "Return key for intf's network namespace"
+        return intf.node.pid if intf.node.inNamespace else None
+
+    @staticmethod
+    def parseRoots( output ):
+        """Parse tc qdisc show output
+           returns: dict of intf name -> ( kind, major handle ) of
+                    its root qdisc"""
+        roots = {}
+        for kind, major, name in re.findall(
+                r'qdisc (\S+) (\w+):\S* dev (\S+) root', output ):
+            roots[ name ] = ( kind, major )
+        return roots
+
+    @classmethod
+    def reapply( cls, intfs ):
+        """Re-run config() on interfaces whose root qdisc is no longer
+           the one config() installed, e.g. because a switch replaced
+           it; roots are read with one tc per network namespace
+           intfs: interfaces to check
+           returns: list of interfaces reconfigured"""
+        groups = {}  # namespace -> list of shaped intfs
+        for intf in intfs:
+            if isinstance( intf, TCIntf ) and intf.rootQdisc:
+                groups.setdefault( cls.namespace( intf ), [] ).append( intf )
+        stale = []
+        for intfs in groups.values():
+            roots = cls.parseRoots( intfs[ 0 ].node.cmd( 'tc qdisc show' ) )
+            stale += [ intf for intf in intfs
+                       if roots.get( intf.name ) != intf.rootQdisc ]
+        if not stale:
+            return stale
+        debug( '*** Reapplying tc config to %s\n' %
+               ' '.join( intf.name for intf in stale ) )
+        batched = cls.batch is not None
+        cls.startBatch()
+        for intf in stale:
+            intf.config( **intf.params )
+        if not batched:
+            cls.runBatch()
+        return stale
+
+    @classmethod
+    def startBatch( cls ):
+        "Queue ethtool and tc commands from config() until runBatch()"
+        if cls.batch is None:
+            cls.batch = []
+
+    @staticmethod
+    def batchErrors( output ):
+        """Parse tc -force -batch output
+           returns: dict of input line number -> error message"""
+        errors, lines = {}, []
+        for line in output.splitlines():
+            match = re.match( r'Command failed \S*:(\d+)', line )
+            if match:
+                errors[ int( match.group( 1 ) ) ] = '\n'.join( lines )
+                lines = []
+            elif line.strip():
+                lines.append( line )
+        return errors
+
+    @classmethod
+    def runBatch( cls ):
+        """Run queued shaping commands: one process per network
+           namespace runs each interface's ethtool, then a single
+           tc -batch for all of them; tcoutputs of the interfaces'
+           config() results are filled in. Since we can't look at
+           existing qdiscs first, each shaped interface's root qdisc
+           is deleted, ignoring errors, before it is configured.
+           returns: dict of intf -> list of ethtool and tc error messages"""
+        batch, cls.batch = cls.batch, None
+        groups = {}  # namespace -> list of batch entries
+        for entry in batch or []:
+            key = cls.namespace( entry[ 0 ] )
+            groups.setdefault( key, [] ).append( entry )
+        procs = []
+        for entries in groups.values():
+            # Failed ethtools' errors are marked with their entry's index
+            script = [ 'e=$(ethtool -K %s %s 2>&1 > /dev/null) || '
+                       'echo "$e" | sed "s/^/@ethtool %d /"' %
+                       ( intf, args, index )
+                       for index, ( intf, args, _cmds, _outputs )
+                       in enumerate( entries ) ]
+            lines, tcin = [], []  # ( entry, command index ), tc input
+            for entry in entries:
+                intf, _args, cmds, _outputs = entry
+                if cmds is None:
+                    continue
+                lines.append( ( entry, None ) )
+                tcin.append( 'qdisc del dev %s root\n' % intf )
+                for i, cmd in enumerate( cmds ):
+                    lines.append( ( entry, i ) )
+                    tcin.append( ( cmd % ( '', intf ) ).strip() + '\n' )
+            script.append( 'exec tc -force -batch -' if lines else 'true' )
+            proc = entries[ 0 ][ 0 ].node.popen(
+                [ 'sh', '-c', '; '.join( script ) ],
+                stdin=PIPE, stderr=STDOUT )
+            procs.append( ( proc, ''.join( tcin ), entries, lines ) )
+        # The ethtool commands all run while we feed each tc in turn;
+        # communicate() reads output as it writes, so that a tc whose
+        # output fills its pipe can't stall us
+        errors = {}
+        for proc, tcin, entries, lines in procs:
+            output, _err = proc.communicate( tcin )
+            ethtool = re.findall( r'^@ethtool (\d+) (.*)$', output, re.M )
+            for index, message in ethtool:
+                intf = entries[ int( index ) ][ 0 ]
+                error( '*** Error: %s: ethtool: %s\n' % ( intf, message ) )
+                errors.setdefault( intf, [] ).append( 'ethtool: ' + message )
+            output = re.sub( r'(?m)^@ethtool .*\n?', '', output )
+            failed = cls.batchErrors( output )
+            for lineno, ( entry, i ) in enumerate( lines, 1 ):
+                if i is None:
+                    # Deleting the root qdisc fails if there isn't one
+                    continue
+                intf, outputs = entry[ 0 ], entry[ 3 ]
+                outputs[ i ] = failed.get( lineno, '' )
+                if outputs[ i ]:
+                    error( '*** Error: %s: %s\n' % ( intf, outputs[ i ] ) )
+                    errors.setdefault( intf, [] ).append( outputs[ i ] )
+        return errors
+
     def config( self, bw=None, delay=None, jitter=None, loss=None,
                 gro=False, txo=True, rxo=True,
                 speedup=0, use_hfsc=False, use_tbf=False,
@@ -161,23 +308,38 @@ def on( isOn ):
             return 'on' if isOn else 'off'
 
         # Set offload parameters with ethool
-        self.cmd( 'ethtool -K', self,
-                  'gro', on( gro ),
-                  'tx', on( txo ),
-                  'rx', on( rxo ) )
+        offload = 'gro %s tx %s rx %s' % ( on( gro ), on( txo ), on( rxo ) )
+        batch = TCIntf.batch
+        if batch is None:
+            self.cmd( 'ethtool -K', self, offload )
 
         # Optimization: return if nothing else to configure
         # Question: what happens if we want to reset things?
         if ( bw is None and not delay and not loss
              and max_queue_size is None ):
-            return
-
-        # Clear existing configuration
-        tcoutput = self.tc( '%s qdisc show dev %s' )
-        if "priomap" not in tcoutput and "noqueue" not in tcoutput:
-            cmds = [ '%s qdisc del dev %s root' ]
-        else:
+            # Remove any shaping we configured before, e.g. if
+            # update() took away the last shaping parameter
+            shaped = self.tcCmds
+            self.rootQdisc = self.tcParams = self.tcCmds = None
+            if batch is not None:
+                # runBatch() deletes the root qdisc before empty cmds
+                batch.append( ( self, offload, [] if shaped else None, [] ) )
+            elif shaped:
+                tcoutput = self.tc( '%s qdisc del dev %s root' )
+                if tcoutput:
+                    error( '*** Error: %s: %s' % ( self, tcoutput ) )
+                result[ 'tcoutputs' ] = [ tcoutput ]
+            return result
+
+        # Clear existing configuration (runBatch() does it for a batch)
+        if batch is not None:
             cmds = []
+        else:
+            tcoutput = self.tc( '%s qdisc show dev %s' )
+            if "priomap" not in tcoutput and "noqueue" not in tcoutput:
+                cmds = [ '%s qdisc del dev %s root' ]
+            else:
+                cmds = []
 
         # Bandwidth limits via various methods
         bwcmds, parent = self.bwCmds( bw=bw, speedup=speedup,
@@ -203,6 +365,25 @@ def on( isOn ):
                     if enable_red else [] ) )
         info( '(' + ' '.join( stuff ) + ') ' )
 
+        # Remember our setup, for reapply() and update()
+        self.tcParams = dict( bw=bw, delay=delay, jitter=jitter, loss=loss,
+                              speedup=speedup, use_hfsc=use_hfsc,
+                              use_tbf=use_tbf, latency_ms=latency_ms,
+                              enable_ecn=enable_ecn, enable_red=enable_red,
+                              max_queue_size=max_queue_size )
+        self.tcCmds = bwcmds + delaycmds
+        roots = re.findall( r'\sroot\s+handle\s+(\w+):\S*\s+(\w+)',
+                            '\n'.join( cmds ) )
+        self.rootQdisc = ( ( roots[ 0 ][ 1 ], roots[ 0 ][ 0 ] ) if roots
+                           else None )
+
+        if batch is not None:
+            # tcoutputs is filled in by runBatch()
+            result[ 'tcoutputs' ] = [ '' ] * len( cmds )
+            result[ 'parent' ] = parent
+            batch.append( ( self, offload, cmds, result[ 'tcoutputs' ] ) )
+            return result
+
         # Execute all the commands in our node
         debug("at map stage w/cmds: %s\n" % cmds)
         tcoutputs = [ self.tc(cmd) for cmd in cmds ]
@@ -216,6 +397,56 @@ def on( isOn ):
 
         return result
 
+    @staticmethod
+    def tcLayout( cmds ):
+        """Return the qdiscs and classes that tc commands add
+           returns: list of ( qdisc/class, parent, handle, kind )"""
+        return re.findall( r'(qdisc|class) add dev %s\s+(root|parent \S+)'
+                           r'\s+(?:handle|classid) (\S+) (\w+)',
+                           '\n'.join( cmds ) )
+
+    def update( self, **params ):
+        """Change shaping parameters in place with tc change, so that
+           the qdiscs and their queued packets are kept; if qdiscs
+           must be added or removed, e.g. to add a delay to a link
+           that had none, we fall back to config()
+           params: shaping parameters for config(), e.g. bw, delay,
+                   jitter, loss; None removes a parameter
+           returns: tc output"""
+        self.params = dict( self.params, **params )
+        if self.tcParams is None:
+            return self.reconfig()
+        tcParams = dict( self.tcParams, **params )
+        bwcmds, parent = self.bwCmds( **{
+            key: tcParams[ key ] for key in (
+                'bw', 'speedup', 'use_hfsc', 'use_tbf', 'latency_ms',
+                'enable_ecn', 'enable_red' ) } )
+        delaycmds, parent = self.delayCmds(
+            parent=parent, delay=tcParams[ 'delay' ],
+            jitter=tcParams[ 'jitter' ], loss=tcParams[ 'loss' ],
+            max_queue_size=tcParams[ 'max_queue_size' ] )
+        cmds = bwcmds + delaycmds
+        if self.tcLayout( cmds ) != self.tcLayout( self.tcCmds ):
+            debug( '*** %s: qdiscs changed, reconfiguring\n' % self )
+            return self.reconfig()
+        changes = [ new.replace( ' add ', ' change ', 1 )
+                    for old, new in zip( self.tcCmds, cmds ) if old != new ]
+        self.tcParams, self.tcCmds = tcParams, cmds
+        if not changes:
+            return ''
+        debug( '*** %s: %s\n' % ( self, changes ) )
+        tcoutput = self.cmd( '; '.join( cmd % ( 'tc', self )
+                                        for cmd in changes ) )
+        if tcoutput:
+            error( '*** Error: %s: %s' % ( self, tcoutput ) )
+        return tcoutput
+
+    def reconfig( self ):
+        """Re-run config() with our current parameters
+           returns: tc output"""
+        result = self.config( **self.params )
+        return ''.join( result.get( 'tcoutputs', [] ) )
+
 
 class Link( object ):
 
@@ -299,6 +530,10 @@ def intfName( self, node, n ):
         assert self
         return node.name + '-eth' + repr( n )
 
+    # Interface pairs created in advance by makeIntfPairs(),
+    # mapped to the error output (if any) from creating them
+    batchedPairs = {}
+
     @classmethod
     def makeIntfPair( cls, intfname1, intfname2, addr1=None, addr2=None,
                       node1=None, node2=None, deleteIntfs=True ):
@@ -313,9 +548,40 @@ def makeIntfPair( cls, intfname1, intfname2, addr1=None, addr2=None,
            to change link type)"""
         # Leave this as a class method for now
         assert cls
+        key = ( intfname1, intfname2 )
+        if key in cls.batchedPairs:
+            cmdOutput = cls.batchedPairs.pop( key )
+            if cmdOutput:
+                raise Exception( "Error creating interface pair (%s,%s): %s " %
+                                 ( intfname1, intfname2, cmdOutput ) )
+            return key
         return makeIntfPair( intfname1, intfname2, addr1, addr2, node1, node2,
                              deleteIntfs=deleteIntfs )
 
+    @classmethod
+    def canBatch( cls ):
+        """Can our interface pairs be created by makeIntfPairs(), with
+           the names that we would give them?"""
+        return ( makeIntfPairs is not None and
+                 all( getattr( getattr( cls, method ), '__func__', None ) is
+                      getattr( Link, method ).__func__
+                      for method in ( 'makeIntfPair', 'intfName' ) ) )
+
+    @classmethod
+    def batchIntfName( cls, node, n ):
+        "Return the name intfName() gives a batched interface"
+        assert cls.canBatch()
+        return Link.intfName.__func__( cls, node, n )
+
+    @classmethod
+    def makeIntfPairs( cls, pairs ):
+        """Create many interface pairs at once; makeIntfPair() will
+           then find them (and report any error) when each link is built.
+           pairs: list of ( intfname1, intfname2, addr1, addr2,
+                            node1, node2 )"""
+        assert cls.canBatch()
+        Link.batchedPairs.update( makeIntfPairs( pairs ) )
+
     def delete( self ):
         "Delete this link"
         self.intf1.delete()
@@ -327,6 +593,104 @@ def stop( self ):
         "Override to stop and clean up link as needed"
         self.delete()
 
+    @classmethod
+    def canBatchStop( cls ):
+        "Can our links be stopped by batchStop()?"
+        return ( batchDeleteIntfs is not None and
+                 cls.stop == Link.stop and cls.delete == Link.delete )
+
+    @classmethod
+    def batchStop( cls, links ):
+        """Stop many veth links without deleting them one at a time.
+           A veth pair with an end in a node's own namespace goes away
+           with that namespace, so it is left for the node's terminate()
+           to remove; the others are deleted with a single 'ip -batch'.
+           links: list of links
+           returns: list of links stopped, list of names of root
+                    namespace interfaces left for waitRemoved()"""
+        assert cls.canBatchStop()
+        stopped, rootIntfs, pending = [], {}, []
+        for link in links:
+            if link.intf1.node.inNamespace or link.intf2.node.inNamespace:
+                stopped.append( link )
+                pending += [ intf.name for intf in ( link.intf1, link.intf2 )
+                             if not intf.node.inNamespace ]
+            else:
+                # Deleting one end of a veth pair deletes both
+                rootIntfs[ link.intf1.name ] = link
+        errors = batchDeleteIntfs( list( rootIntfs ) )
+        stopped += [ link for name, link in rootIntfs.items()
+                     if name not in errors ]
+        for link in stopped:
+            for intf in link.intf1, link.intf2:
+                intf.node.delIntf( intf )
+                intf.link = None
+            link.intf1, link.intf2 = None, None
+        return stopped, pending
+
+    @staticmethod
+    def batchStatus( changes ):
+        """Set many links up or down at once, returning once every
+           change has been made: on Linux, with one batch of rtnetlink
+           requests per network namespace; elsewhere, with one shell
+           command per node, sent to every node before waiting for any
+           changes: list of ( link, status ), status 'up' or 'down'
+           returns: dict of intf -> error message, for failed changes"""
+        batch, errors = [], {}
+        for link, status in changes:
+            for intf in link.intf1, link.intf2:
+                if type( intf ).ifconfig in plainIfconfigs:
+                    batch.append( ( intf, status ) )
+                else:
+                    # e.g. OVSIntf, which knows better
+                    result = intf.ifconfig( status )
+                    if result:
+                        errors[ intf ] = result
+        if setLinkStates:
+            errors.update( setLinkStates( batch ) )
+            return errors
+        cmds = {}  # node -> list of ( intf, command )
+        for intf, status in batch:
+            name = getattr( intf, 'realname', None ) or intf.name
+            cmds.setdefault( intf.node, [] ).append(
+                ( intf, 'ifconfig %s %s' % ( name, status ) ) )
+        for node, nodeCmds in cmds.items():
+            node.sendCmd( '; '.join( cmd for _intf, cmd in nodeCmds ) )
+        for node, nodeCmds in cmds.items():
+            result = node.waitOutput().strip()
+            if result:
+                # We can't tell which command failed
+                for intf, _cmd in nodeCmds:
+                    errors[ intf ] = result
+        return errors
+
+    @staticmethod
+    def waitRemoved( names, timeout=2 ):
+        """Wait for root namespace interfaces left by batchStop() to go
+           away with their peers' namespaces (which the kernel removes
+           asynchronously), deleting any that remain after timeout
+           names: list of interface names
+           timeout: maximum seconds to wait"""
+        end = time() + timeout
+        while names:
+            remaining = ipAddrs()
+            names = [ name for name in names if name in remaining ]
+            if not names or time() > end:
+                break
+            sleep( .01 )
+        if names:
+            batchDeleteIntfs( names )
+
+    def update( self, **params ):
+        """Change shaping parameters of both ends in place
+           params: parameters for TCIntf.update(), e.g. bw, delay, loss
+           returns: tc output of each end"""
+        for intf in self.intf1, self.intf2:
+            if not isinstance( intf, TCIntf ):
+                raise Exception( '%s is not a TCIntf' % intf )
+        return [ self.intf1.update( **params ),
+                 self.intf2.update( **params ) ]
+
     def status( self ):
         "Return link status as a string"
         return "(%s %s)" % ( self.intf1.status(), self.intf2.status() )
@@ -370,6 +734,43 @@ def makeIntfPair( self, *args, **kwargs ):
             return Link.makeIntfPair( *args, **kwargs )
 
 
+class NetlinkLink( Link ):
+    """Link whose veth pair is created, and whose interfaces are
+       configured, over rtnetlink rather than with ip and ifconfig
+       (Linux only)"""
+
+    def __init__( self, node1, node2, **kwargs ):
+        "See Link.__init__() for options"
+        from mininet.linux.intf import NetlinkIntf
+        kwargs.setdefault( 'cls1', NetlinkIntf )
+        kwargs.setdefault( 'cls2', NetlinkIntf )
+        Link.__init__( self, node1, node2, **kwargs )
+
+    @classmethod
+    def makeIntfPair( cls, intfname1, intfname2, addr1=None, addr2=None,
+                      node1=None, node2=None, deleteIntfs=True ):
+        "Create pair of interfaces, directly in their nodes' namespaces"
+        from mininet.linux.netlink import nlSocket, NetlinkError
+        pid1 = node1.pid if node1 else None
+        pid2 = node2.pid if node2 else None
+        if deleteIntfs:
+            # Delete any old interfaces with the same names
+            for name, pid in ( intfname1, pid1 ), ( intfname2, pid2 ):
+                try:
+                    nl = nlSocket( pid )
+                    nl.delLink( nl.linkIndex( name ) )
+                except ( NetlinkError, IOError, OSError ):
+                    # No such interface, or namespace
+                    pass
+        try:
+            nlSocket().addVeth( intfname1, intfname2, addr1, addr2,
+                                pid1, pid2 )
+        except NetlinkError as e:
+            raise Exception( "Error creating interface pair (%s,%s): %s " %
+                             ( intfname1, intfname2, e ) )
+        return intfname1, intfname2
+
+
 class TCLink( Link ):
     "Link with symmetric TC interfaces configured via opts"
     def __init__( self, node1, node2, port1=None, port2=None,
@@ -0,0 +1,178 @@
+"""
+Control groups, managed by reading and writing files under
+/sys/fs/cgroup directly rather than by running cgcreate, cgset,
+cgget, cgclassify and cgdelete.
+
+Both the cgroup v1 layout (a hierarchy per controller, e.g.
+/sys/fs/cgroup/cpu/h1/cpu.cfs_quota_us) and the cgroup v2 unified
+hierarchy (/sys/fs/cgroup/h1/cpu.max) are supported. Parameters are
+named as in v1 (resource, param), and are translated for v2:
+
+  cpu.cfs_period_us, cpu.cfs_quota_us -> cpu.max ("quota period")
+  cpuset.cpus, cpuset.mems -> cpuset.cpus, cpuset.mems
+  cpuacct.usage -> cpu.stat (usage_usec)
+
+RT group scheduling (cpu.rt_*) is only available with cgroup v1.
+"""
+
+import errno
+import os
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def cgroupVersion( root=CGROUP_ROOT ):
+    "Return 2 if root is a cgroup v2 unified hierarchy, otherwise 1"
+    if os.path.exists( os.path.join( root, 'cgroup.controllers' ) ):
+        return 2
+    return 1
+
+def writeFile( path, value ):
+    "Write value to a cgroup file"
+    with open( path, 'w' ) as f:
+        f.write( '%s\n' % value )
+
+def readFile( path ):
+    "Return contents of a cgroup file"
+    with open( path ) as f:
+        return f.read().strip()
+
+def enableControllers( controllers=( 'cpu', 'cpuset' ), root=CGROUP_ROOT ):
+    """Make controllers available to child cgroups of root (cgroup v2)
+       controllers: controller names"""
+    available = readFile( os.path.join( root, 'cgroup.controllers' ) ).split()
+    enabled = readFile( os.path.join( root,
+                                      'cgroup.subtree_control' ) ).split()
+    missing = [ c for c in controllers if c in available and c not in enabled ]
+    if missing:
+        writeFile( os.path.join( root, 'cgroup.subtree_control' ),
+                   ' '.join( '+' + c for c in missing ) )
+
+
+class Cgroup( object ):
+    "A cgroup named name, for the cpu, cpuacct and cpuset controllers"
+
+    controllers = ( 'cpu', 'cpuacct', 'cpuset' )
+
+    def __init__( self, name, root=CGROUP_ROOT ):
+        "name: cgroup name (e.g. host name)"
+        self.name = name
+        self.root = root
+        self.version = cgroupVersion( root )
+        # cgroup v2 has a single cpu.max for quota and period
+        self.cpuMax = [ 'max', 100000 ]
+
+    def __str__( self ):
+        return self.name
+
+    def paths( self ):
+        "Return list of our cgroup directories"
+        if self.version == 2:
+            return [ os.path.join( self.root, self.name ) ]
+        # Controllers may share a hierarchy, e.g. cpu -> cpu,cpuacct
+        paths = []
+        for controller in self.controllers:
+            path = os.path.join( os.path.realpath(
+                os.path.join( self.root, controller ) ), self.name )
+            if path not in paths:
+                paths.append( path )
+        return paths
+
+    def path( self, resource ):
+        "Return our cgroup directory for resource"
+        if self.version == 2:
+            return os.path.join( self.root, self.name )
+        return os.path.join( self.root, resource, self.name )
+
+    def create( self ):
+        "Create our cgroup directories"
+        for path in self.paths():
+            try:
+                os.mkdir( path )
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def addPid( self, pid, resources=None ):
+        """Move a process into our cgroup
+           pid: process ID
+           resources: controllers to move it for (v1; default all)"""
+        if self.version == 2:
+            writeFile( os.path.join( self.path( 'cpu' ), 'cgroup.procs' ),
+                       pid )
+            return
+        for resource in resources or self.controllers:
+            writeFile( os.path.join( self.path( resource ), 'tasks' ), pid )
+
+    def set( self, resource, param, value ):
+        "Set a cgroup parameter, e.g. set( 'cpu', 'cfs_quota_us', 1000 )"
+        if self.version == 1:
+            writeFile( os.path.join( self.path( resource ),
+                                     '%s.%s' % ( resource, param ) ), value )
+        elif ( resource, param ) == ( 'cpu', 'cfs_quota_us' ):
+            self.cpuMax[ 0 ] = 'max' if int( value ) < 0 else value
+            self.writeCpuMax()
+        elif ( resource, param ) == ( 'cpu', 'cfs_period_us' ):
+            self.cpuMax[ 1 ] = value
+            self.writeCpuMax()
+        elif resource == 'cpuset':
+            writeFile( os.path.join( self.path( resource ),
+                                     'cpuset.%s' % param ), value )
+        else:
+            raise Exception( 'cgroup v2 does not support %s.%s' %
+                             ( resource, param ) )
+
+    def writeCpuMax( self ):
+        "Write cpu.max from our quota and period (cgroup v2)"
+        writeFile( os.path.join( self.path( 'cpu' ), 'cpu.max' ),
+                   '%s %s' % tuple( self.cpuMax ) )
+
+    def get( self, resource, param ):
+        "Return the value of a cgroup parameter as a string"
+        if self.version == 1:
+            return readFile( os.path.join( self.path( resource ),
+                                           '%s.%s' % ( resource, param ) ) )
+        if resource == 'cpu' and param in ( 'cfs_quota_us', 'cfs_period_us' ):
+            quota, period = readFile( os.path.join(
+                self.path( 'cpu' ), 'cpu.max' ) ).split()
+            if param == 'cfs_period_us':
+                return period
+            return '-1' if quota == 'max' else quota
+        if resource == 'cpuset':
+            return readFile( os.path.join( self.path( resource ),
+                                           'cpuset.%s' % param ) )
+        raise Exception( 'cgroup v2 does not support %s.%s' %
+                         ( resource, param ) )
+
+    def usagePath( self ):
+        "Return path of the file that counts our CPU time"
+        if self.version == 1:
+            return os.path.join( self.path( 'cpuacct' ), 'cpuacct.usage' )
+        return os.path.join( self.path( 'cpu' ), 'cpu.stat' )
+
+    def parseUsage( self, text ):
+        """Return CPU time in seconds
+           text: contents of usagePath()"""
+        if self.version == 1:
+            return int( text ) / 1e9
+        for line in text.splitlines():
+            key, value = line.split()
+            if key == 'usage_usec':
+                return int( value ) / 1e6
+        return 0.0
+
+    def cpuUsage( self ):
+        "Return CPU time used by our cgroup, in seconds"
+        return self.parseUsage( readFile( self.usagePath() ) )
+
+    def delete( self ):
+        """Remove our cgroup directories, which must have no processes
+           returns: True if they are gone"""
+        success = True
+        for path in self.paths():
+            try:
+                os.rmdir( path )
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    success = False
+        return success
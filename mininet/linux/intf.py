@@ -1,8 +1,10 @@
 """
 A interface object that relies on ifconfig(8) and ip(8) to manipulate
-network interfaces and devices.
+network interfaces and devices, and a variant that uses rtnetlink directly.
 """
 from mininet.baseintf import BaseIntf
+from mininet.log import error
+from mininet.linux.netlink import nlSocket, NetlinkError
 
 class Intf( BaseIntf ):
     """Interface objects that use 'ip' and 'ifconfig' to configure the
@@ -10,10 +12,27 @@ class Intf( BaseIntf ):
 
     def setMAC( self, macstr ):
         self.mac = macstr
+        self.staleAddrs.discard( 'mac' )
         return ( self.ifconfig( 'down' ) +
                  self.ifconfig( 'hw', 'ether', macstr ) +
                  self.ifconfig( 'up' ) )
 
+    # Use one 'ip' dump for all of our node's interfaces rather
+    # than running ifconfig for each address we want
+
+    def updateIP( self ):
+        "Return updated IP address"
+        return self.updateAddr()[ 0 ]
+
+    def updateMAC( self ):
+        "Return updated MAC address"
+        return self.updateAddr()[ 1 ]
+
+    def updateAddr( self ):
+        "Return updated IP address and MAC address"
+        self.node.refreshAddrs()
+        return self.ip, self.mac
+
     def rename( self, newname ):
         "Rename interface"
         self.ifconfig( 'down' )
@@ -38,3 +57,115 @@ def status( self ):
             return "OK"
         else:
             return "MISSING"
+
+
+class NetlinkIntf( Intf ):
+    """Interface objects that are configured over rtnetlink sockets
+    in their node's namespace, rather than by running ip and ifconfig"""
+
+    # Errors from netlink requests, or from opening a socket in a
+    # namespace that has gone away
+    nlErrors = ( NetlinkError, IOError, OSError )
+
+    def nl( self ):
+        "Return netlink socket for our node's namespace"
+        return nlSocket( self.node.pid )
+
+    def setLink( self, **kwargs ):
+        """Change our link attributes (see RtNetlink.setLink())
+           returns: error string, or '' on success, like ifconfig"""
+        try:
+            nl = self.nl()
+            nl.setLink( nl.linkIndex( self.name ), **kwargs )
+        except self.nlErrors as e:
+            return '%s: %s\n' % ( self.name, e )
+        return ''
+
+    def ifconfig( self, *args ):
+        "Set ourselves up or down directly; use ifconfig for anything else"
+        if args in ( ( 'up', ), ( 'down', ) ):
+            return self.setLink( up=( args[ 0 ] == 'up' ) )
+        return Intf.ifconfig( self, *args )
+
+    def setIP( self, ipstr, prefixLen=None ):
+        """Set our IP address, replacing any address we set before"""
+        if '/' in ipstr:
+            ipstr, prefixLen = ipstr.split( '/' )
+        elif prefixLen is None:
+            raise Exception( 'No prefix length set for IP address %s'
+                             % ( ipstr, ) )
+        # Compare with the int prefix lengths that refreshAddrs() reads
+        prefixLen = int( prefixLen )
+        try:
+            nl = self.nl()
+            index = nl.linkIndex( self.name )
+            if self.ip and ( self.ip, self.prefixLen ) != ( ipstr, prefixLen ):
+                try:
+                    nl.delAddr( index, self.ip, self.prefixLen )
+                except NetlinkError:
+                    pass
+            nl.addAddr( index, ipstr, prefixLen )
+            nl.setLink( index, up=True )
+        except self.nlErrors as e:
+            return '%s: %s\n' % ( self.name, e )
+        self.ip, self.prefixLen = ipstr, prefixLen
+        self.staleAddrs.discard( 'ip' )
+        return ''
+
+    def setMAC( self, macstr ):
+        self.mac = macstr
+        self.staleAddrs.discard( 'mac' )
+        return self.setLink( mac=macstr )
+
+    def updateIP( self ):
+        "Return updated IP address based on rtnetlink"
+        return self.updateAddr()[ 0 ]
+
+    def updateMAC( self ):
+        "Return updated MAC address based on rtnetlink"
+        return self.updateAddr()[ 1 ]
+
+    def updateAddr( self ):
+        "Return IP address and MAC address based on rtnetlink"
+        try:
+            nl = self.nl()
+            link = nl.linkInfo( self.name )
+            addrs = nl.addrs( link[ 'index' ] )
+        except self.nlErrors:
+            link, addrs = { 'mac': None }, []
+        self.ip = addrs[ 0 ][ 1 ] if addrs else None
+        if addrs:
+            self.prefixLen = addrs[ 0 ][ 2 ]
+        self.mac = link[ 'mac' ]
+        return self.ip, self.mac
+
+    def isUp( self, setUp=False ):
+        "Return whether interface is up"
+        if setUp:
+            err = self.setLink( up=True )
+            if err:
+                error( "Error setting %s up: %s " % ( self.name, err ) )
+                return False
+            return True
+        try:
+            return self.nl().linkInfo( self.name )[ 'up' ]
+        except self.nlErrors:
+            return False
+
+    def delete( self ):
+        "Delete interface"
+        try:
+            nl = self.nl()
+            nl.delLink( nl.linkIndex( self.name ) )
+        except self.nlErrors:
+            pass
+        self.node.delIntf( self )
+        self.link = None
+
+    def status( self ):
+        "Return intf status as a string"
+        try:
+            self.nl().linkIndex( self.name )
+            return "OK"
+        except self.nlErrors:
+            return "MISSING"
@@ -1,7 +1,7 @@
 """
 Options used by mn that differ wildly with OS.
 """
-from mininet.link import Link, TCLink, TCULink, OVSLink
+from mininet.link import Link, TCLink, TCULink, OVSLink, NetlinkLink
 from mininet.node import ( Host, CPULimitedHost, Controller, OVSController,
                            Ryu, NOX, RemoteController, findController,
                            DefaultController, NullController,
@@ -38,4 +38,5 @@
 LINKS = { 'tc': TCLink,
           'tcu': TCULink,
           'ovs': OVSLink,
+          'netlink': NetlinkLink,
           'default': Link }
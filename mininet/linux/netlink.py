@@ -0,0 +1,416 @@
+"""
+A minimal rtnetlink client for Linux, used to create, move and configure
+network interfaces without spawning ip(8) or ifconfig(8).
+
+Netlink sockets belong to the network namespace they were opened in, so we
+keep one socket per namespace: nlSocket( pid ) briefly enters the namespace
+of process pid via setns(2), opens a socket there, and returns to our own
+namespace. Sockets hold a reference to their namespace, so they must be
+closed (nlClose( pid )) before a node is shut down.
+
+setns(2) moves only the calling thread, so nsCall() saves and restores
+the namespace of that thread. Cached sockets may be shared by several
+threads (e.g. the main thread and a Timeline), so each socket serializes
+its requests, and their acks, with a lock.
+
+Only the handful of messages Mininet needs are supported:
+
+RTM_NEWLINK: create veth pairs, set MAC addresses, move interfaces
+RTM_SETLINK: set many interfaces up or down at once
+RTM_GETLINK: look up interface index, flags and MAC address
+RTM_NEWADDR/RTM_DELADDR/RTM_GETADDR: manage IPv4 addresses
+RTM_DELLINK: delete interfaces
+"""
+
+import ctypes
+import errno
+import os
+import socket
+import struct
+import threading
+
+from mininet.log import debug
+
+# Netlink protocol constants (see linux/netlink.h, linux/rtnetlink.h,
+# linux/if_link.h and linux/if_addr.h)
+
+NETLINK_ROUTE = 0
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_SETLINK = 19
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_LINKINFO = 18
+IFLA_NET_NS_PID = 19
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+VETH_INFO_PEER = 1
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_BROADCAST = 4
+
+IFF_UP = 0x1
+
+CLONE_NEWNET = 0x40000000
+
+# struct nlmsghdr, ifinfomsg, ifaddrmsg and rtattr
+NLMSGHDR = struct.Struct( '=LHHLL' )
+IFINFOMSG = struct.Struct( '=BxHiII' )
+IFADDRMSG = struct.Struct( '=BBBBi' )
+RTATTR = struct.Struct( '=HH' )
+
+
+class NetlinkError( Exception ):
+    "Error reported by the kernel in response to a netlink request"
+
+    def __init__( self, code, msg='' ):
+        self.code = code
+        Exception.__init__( self, '%s%s' % ( msg and msg + ': ',
+                                             os.strerror( code ) ) )
+
+
+def align( length ):
+    "Round length up to a multiple of 4, as netlink requires"
+    return ( length + 3 ) & ~3
+
+def attr( atype, data ):
+    """Return an encoded rtattr
+       atype: attribute type
+       data: attribute payload (string, or int for a 32-bit value)"""
+    if isinstance( data, int ):
+        data = struct.pack( '=I', data )
+    length = RTATTR.size + len( data )
+    return ( RTATTR.pack( length, atype ) + data +
+             b'\0' * ( align( length ) - length ) )
+
+def parseAttrs( data, offset=0 ):
+    "Return dict of attribute type -> payload for rtattrs in data"
+    attrs = {}
+    while offset + RTATTR.size <= len( data ):
+        length, atype = RTATTR.unpack_from( data, offset )
+        if length < RTATTR.size:
+            break
+        attrs[ atype ] = data[ offset + RTATTR.size : offset + length ]
+        offset += align( length )
+    return attrs
+
+def macBytes( mac ):
+    "Convert colon-hex MAC address string to bytes"
+    return struct.pack( '6B', *[ int( b, 16 ) for b in mac.split( ':' ) ] )
+
+def macStr( data ):
+    "Convert bytes to colon-hex MAC address string"
+    return ':'.join( '%02x' % b for b in struct.unpack( '6B', data[ :6 ] ) )
+
+def ifname( name ):
+    "Return NUL-terminated interface name"
+    return str( name ).encode() + b'\0'
+
+
+class RtNetlink( object ):
+    "An rtnetlink socket in the network namespace it was opened in"
+
+    def __init__( self ):
+        self.sock = socket.socket( socket.AF_NETLINK, socket.SOCK_RAW,
+                                   NETLINK_ROUTE )
+        self.sock.bind( ( 0, 0 ) )
+        self.seq = 0
+        self.lock = threading.Lock()  # held while awaiting replies
+
+    def close( self ):
+        "Close our socket"
+        self.sock.close()
+
+    def request( self, mtype, payload, flags=0 ):
+        """Send a request and return the list of replies
+           mtype: message type (RTM_*)
+           payload: encoded message body
+           flags: additional NLM_F_* flags
+           returns: list of ( type, body ) for each reply message
+           raises NetlinkError on failure"""
+        with self.lock:
+            return self._request( mtype, payload, flags )
+
+    def _request( self, mtype, payload, flags ):
+        "Internal method: request() while holding our lock"
+        self.seq += 1
+        flags |= NLM_F_REQUEST | NLM_F_ACK
+        self.sock.send( NLMSGHDR.pack( NLMSGHDR.size + len( payload ),
+                                       mtype, flags, self.seq, 0 ) +
+                        payload )
+        replies = []
+        while True:
+            data = self.sock.recv( 65536 )
+            offset = 0
+            while offset + NLMSGHDR.size <= len( data ):
+                length, rtype, _flags, seq, _pid = NLMSGHDR.unpack_from(
+                    data, offset )
+                body = data[ offset + NLMSGHDR.size : offset + length ]
+                offset += align( length )
+                if seq != self.seq:
+                    continue
+                if rtype == NLMSG_DONE:
+                    return replies
+                if rtype == NLMSG_ERROR:
+                    code = -struct.unpack_from( '=i', body )[ 0 ]
+                    if code:
+                        raise NetlinkError( code )
+                    # A zero error is an ack, which ends the exchange
+                    return replies
+                replies.append( ( rtype, body ) )
+
+    def requests( self, messages, chunkSize=64 ):
+        """Send many requests without waiting for each reply, and
+           return once all of them have been acknowledged; we send
+           chunkSize messages at a time so that their acks fit in our
+           socket's receive buffer
+           messages: list of ( mtype, payload, flags )
+           returns: list of NetlinkError or None, per message"""
+        with self.lock:
+            return self._requests( messages, chunkSize )
+
+    def _requests( self, messages, chunkSize ):
+        "Internal method: requests() while holding our lock"
+        results = []
+        for i in range( 0, len( messages ), chunkSize ):
+            chunk = messages[ i : i + chunkSize ]
+            first = self.seq + 1
+            data = b''
+            for mtype, payload, flags in chunk:
+                self.seq += 1
+                data += NLMSGHDR.pack( NLMSGHDR.size + len( payload ), mtype,
+                                       flags | NLM_F_REQUEST | NLM_F_ACK,
+                                       self.seq, 0 ) + payload
+            self.sock.sendall( data )
+            acks = {}  # seq -> error code
+            while len( acks ) < len( chunk ):
+                data = self.sock.recv( 65536 )
+                offset = 0
+                while offset + NLMSGHDR.size <= len( data ):
+                    length, rtype, _flags, seq, _pid = NLMSGHDR.unpack_from(
+                        data, offset )
+                    body = data[ offset + NLMSGHDR.size : offset + length ]
+                    offset += align( length )
+                    if rtype == NLMSG_ERROR and first <= seq <= self.seq:
+                        acks[ seq ] = -struct.unpack_from( '=i', body )[ 0 ]
+            results += [ NetlinkError( acks[ seq ] ) if acks[ seq ] else None
+                         for seq in range( first, self.seq + 1 ) ]
+        return results
+
+    # Links
+
+    @staticmethod
+    def linkMsg( index=0, flags=0, change=0, attrs=b'' ):
+        "Return encoded ifinfomsg with attributes"
+        return IFINFOMSG.pack( socket.AF_UNSPEC, 0, index,
+                               flags, change ) + attrs
+
+    def linkInfo( self, name ):
+        """Look up an interface by name
+           returns: dict with index, flags, up, mac"""
+        replies = self.request( RTM_GETLINK, self.linkMsg(
+            attrs=attr( IFLA_IFNAME, ifname( name ) ) ) )
+        for rtype, body in replies:
+            if rtype == RTM_NEWLINK:
+                _family, _type, index, flags, _change = IFINFOMSG.unpack_from(
+                    body )
+                attrs = parseAttrs( body, IFINFOMSG.size )
+                mac = attrs.get( IFLA_ADDRESS )
+                return { 'index': index, 'flags': flags,
+                         'up': bool( flags & IFF_UP ),
+                         'mac': macStr( mac ) if mac else None }
+        raise NetlinkError( errno.ENODEV, name )
+
+    def linkIndex( self, name ):
+        "Return index of interface name"
+        return self.linkInfo( name )[ 'index' ]
+
+    def addVeth( self, name1, name2, addr1=None, addr2=None,
+                 pid1=None, pid2=None ):
+        """Create a veth pair
+           name1, name2: interface names
+           addr1, addr2: MAC addresses (optional)
+           pid1, pid2: pids whose namespaces will hold each end (optional)"""
+        peer = attr( IFLA_IFNAME, ifname( name2 ) )
+        if addr2:
+            peer += attr( IFLA_ADDRESS, macBytes( addr2 ) )
+        if pid2:
+            peer += attr( IFLA_NET_NS_PID, pid2 )
+        info = ( attr( IFLA_INFO_KIND, b'veth' ) +
+                 attr( IFLA_INFO_DATA,
+                       attr( VETH_INFO_PEER, self.linkMsg( attrs=peer ) ) ) )
+        attrs = attr( IFLA_IFNAME, ifname( name1 ) )
+        if addr1:
+            attrs += attr( IFLA_ADDRESS, macBytes( addr1 ) )
+        if pid1:
+            attrs += attr( IFLA_NET_NS_PID, pid1 )
+        attrs += attr( IFLA_LINKINFO, info )
+        self.request( RTM_NEWLINK, self.linkMsg( attrs=attrs ),
+                      NLM_F_CREATE | NLM_F_EXCL )
+
+    def setLink( self, index, up=None, mac=None, pid=None ):
+        """Change interface attributes
+           index: interface index
+           up: set interface up (True) or down (False) (optional)
+           mac: MAC address (optional)
+           pid: move to the namespace of process pid (optional)"""
+        flags = change = 0
+        if up is not None:
+            change = IFF_UP
+            flags = IFF_UP if up else 0
+        attrs = b''
+        if mac:
+            attrs += attr( IFLA_ADDRESS, macBytes( mac ) )
+        if pid:
+            attrs += attr( IFLA_NET_NS_PID, pid )
+        self.request( RTM_NEWLINK, self.linkMsg( index, flags, change,
+                                                 attrs ) )
+
+    def setLinkStates( self, states ):
+        """Set many interfaces up or down, by name, in one batch of
+           requests
+           states: list of ( name, up )
+           returns: dict of name -> NetlinkError, for failed changes"""
+        messages = [ ( RTM_SETLINK,
+                       self.linkMsg( flags=IFF_UP if up else 0,
+                                     change=IFF_UP,
+                                     attrs=attr( IFLA_IFNAME,
+                                                 ifname( name ) ) ), 0 )
+                     for name, up in states ]
+        results = self.requests( messages )
+        return { name: err for ( name, _up ), err in zip( states, results )
+                 if err }
+
+    def delLink( self, index ):
+        "Delete interface with the given index"
+        self.request( RTM_DELLINK, self.linkMsg( index ) )
+
+    # Addresses
+
+    @staticmethod
+    def addrMsg( index, ip, prefixLen ):
+        "Return encoded ifaddrmsg for an IPv4 address"
+        addr = socket.inet_aton( ip )
+        bcast = struct.pack( '!I', struct.unpack( '!I', addr )[ 0 ] |
+                             ( 0xffffffff >> int( prefixLen ) ) )
+        return ( IFADDRMSG.pack( socket.AF_INET, int( prefixLen ), 0, 0,
+                                 index ) +
+                 attr( IFA_LOCAL, addr ) + attr( IFA_ADDRESS, addr ) +
+                 attr( IFA_BROADCAST, bcast ) )
+
+    def addAddr( self, index, ip, prefixLen ):
+        "Add IPv4 address ip/prefixLen to interface index"
+        self.request( RTM_NEWADDR, self.addrMsg( index, ip, prefixLen ),
+                      NLM_F_CREATE | NLM_F_REPLACE )
+
+    def delAddr( self, index, ip, prefixLen ):
+        "Remove IPv4 address ip/prefixLen from interface index"
+        self.request( RTM_DELADDR, self.addrMsg( index, ip, prefixLen ) )
+
+    def addrs( self, index=None ):
+        """Return IPv4 addresses
+           index: interface index, or None for all interfaces
+           returns: list of ( index, ip, prefixLen )"""
+        replies = self.request( RTM_GETADDR, IFADDRMSG.pack(
+            socket.AF_INET, 0, 0, 0, 0 ), NLM_F_DUMP )
+        result = []
+        for rtype, body in replies:
+            if rtype != RTM_NEWADDR:
+                continue
+            _family, prefixLen, _flags, _scope, aindex = IFADDRMSG.unpack_from(
+                body )
+            if index is not None and aindex != index:
+                continue
+            attrs = parseAttrs( body, IFADDRMSG.size )
+            addr = attrs.get( IFA_LOCAL, attrs.get( IFA_ADDRESS ) )
+            if addr:
+                result.append( ( aindex, socket.inet_ntoa( addr ),
+                                 prefixLen ) )
+        return result
+
+
+# Namespace support
+
+_libc = None
+
+def setns( fd ):
+    "Move the calling thread into the network namespace open on fd"
+    global _libc  # pylint: disable=global-statement
+    if _libc is None:
+        _libc = ctypes.CDLL( None, use_errno=True )
+    if _libc.setns( fd, CLONE_NEWNET ) != 0:
+        code = ctypes.get_errno()
+        raise NetlinkError( code, 'setns' )
+
+def nsCall( pid, fn, *args ):
+    """Call fn( *args ) in the network namespace of process pid, e.g. to
+       open a socket there, and return its result"""
+    # /proc/self is the thread group leader; we want our own thread
+    path = '/proc/thread-self/ns/net'
+    if not os.path.exists( path ):
+        # Before Linux 3.17, which only the main thread can use
+        if not isinstance( threading.current_thread(), threading._MainThread ):
+            raise NetlinkError( errno.ENOTSUP,
+                                'nsCall from other threads' )
+        path = '/proc/self/ns/net'
+    with open( path ) as ours:
+        with open( '/proc/%s/ns/net' % pid ) as theirs:
+            setns( theirs.fileno() )
+            try:
+                return fn( *args )
+            finally:
+                setns( ours.fileno() )
+
+def available():
+    "Can we open rtnetlink sockets and enter network namespaces here?"
+    try:
+        RtNetlink().close()
+    except ( AttributeError, socket.error ):
+        # No AF_NETLINK, or not allowed
+        return False
+    return os.path.exists( '/proc/self/ns/net' )
+
+_sockets = {}  # pid -> RtNetlink
+_socketsLock = threading.Lock()
+
+def nlSocket( pid=None ):
+    """Return (cached) rtnetlink socket in the namespace of process pid
+       pid: process in target namespace, or None for our own namespace"""
+    if pid is None:
+        pid = os.getpid()
+    with _socketsLock:
+        sock = _sockets.get( pid )
+        if sock:
+            return sock
+        if pid == os.getpid():
+            sock = RtNetlink()
+        else:
+            debug( '*** nlSocket: opening netlink socket for pid %s\n' % pid )
+            sock = nsCall( pid, RtNetlink )
+        _sockets[ pid ] = sock
+        return sock
+
+def nlClose( pid ):
+    "Close the cached socket for pid's namespace, if any"
+    with _socketsLock:
+        sock = _sockets.pop( pid, None )
+    if sock:
+        sock.close()
@@ -12,9 +12,11 @@
 
 from subprocess import PIPE, Popen
 
-from mininet.log import debug
-from mininet.util import quietRun
+from mininet.log import debug, error
+from mininet.util import quietRun, ipParse
 from mininet.basenode import BaseNode
+from mininet.linux.netlink import nlClose
+from mininet.linux.util import ipAddrs, ipBatch
 
 class Node( BaseNode ):
     """A virtual network node that manipulates and tracks namespaces."""
@@ -71,6 +73,8 @@ def unmountPrivateDirs( self ):
     def terminate( self ):
         """ Cleanup when node is killed.  """
         self.unmountPrivateDirs()
+        # Don't keep our namespace alive with a netlink socket
+        nlClose( self.pid )
         if self.shell:
             if self.shell.poll() is None:
                 killpg( self.shell.pid, signal.SIGHUP )
@@ -108,6 +112,60 @@ def sendInt( self, intr=chr( 3 ) ):
         debug( 'sendInt: writing chr(%d)\n' % ord( intr ) )
         self.write( intr )
 
+    def arpIntf( self, ip ):
+        """Return the interface to put an ARP entry for ip on: the one
+           with the longest prefix whose subnet contains ip, or our only
+           interface, or None to let the kernel choose by route"""
+        intfs = [ intf for intf in self.intfList() if intf.name != 'lo' ]
+        num, best = ipParse( ip ), None
+        for intf in intfs:
+            if not intf.IP() or intf.prefixLen is None:
+                continue
+            prefixLen = int( intf.prefixLen )
+            mask = ( 0xffffffff << ( 32 - prefixLen ) ) & 0xffffffff
+            if ( ( ipParse( intf.IP() ) ^ num ) & mask == 0 and
+                 ( not best or prefixLen > int( best.prefixLen ) ) ):
+                best = intf
+        if not best and len( intfs ) == 1:
+            best = intfs[ 0 ]
+        return best
+
+    def setARPs( self, entries ):
+        """Add many ARP entries with a single 'ip -batch' process; each
+           goes on the interface from arpIntf(), and those without one
+           are added with arp -s, as setARP() does.
+           entries: list of ( ip, mac ) strings
+           returns: dict of entry index -> error output"""
+        cmds, indices, errors = [], [], {}
+        for index, ( ip, mac ) in enumerate( entries ):
+            intf = self.arpIntf( ip )
+            if intf:
+                cmds.append( 'neigh replace %s lladdr %s dev %s nud permanent'
+                             % ( ip, mac, intf ) )
+                indices.append( index )
+            else:
+                err = self.setARP( ip, mac ).strip()
+                if err:
+                    errors[ index ] = err
+        if cmds:
+            for index, err in ipBatch( cmds, node=self ).items():
+                errors[ indices[ index ] ] = err
+        for index, err in sorted( errors.items() ):
+            error( '*** %s: error adding ARP entry %s %s: %s\n' %
+                   ( self, entries[ index ][ 0 ], entries[ index ][ 1 ], err ) )
+        return errors
+
+    def refreshAddrs( self ):
+        """Refresh the cached addresses of all of our interfaces
+           with a single 'ip' dump (see Intf.cachedIP())"""
+        addrs = ipAddrs( node=self )
+        for intf in self.intfList():
+            addr = addrs.get( intf.name, {} )
+            intf.ip, intf.mac = addr.get( 'ip' ), addr.get( 'mac' )
+            if intf.ip:
+                intf.prefixLen = addr[ 'prefixLen' ]
+            intf.staleAddrs.clear()
+
     def setHostRoute( self, ip, intf ):
         """Add route to host.
            ip: IP address as dotted decimal
@@ -2,8 +2,18 @@
 OS-specific utility functions for Linux, counterpart to util.py.
 """
 
+import errno
+import re
+import select
+import socket
+import struct
 from resource import getrlimit, setrlimit, RLIMIT_NPROC, RLIMIT_NOFILE
+from subprocess import Popen, PIPE, STDOUT
+from time import sleep, time
 from mininet.log import error, warn, debug
+from mininet.profiler import count
+from mininet.linux.cgroup import enableControllers
+from mininet.linux.netlink import nsCall, nlSocket, NetlinkError
 from mininet.util import ( errRun, quietRun, retry )
 
 
@@ -62,6 +72,128 @@ def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
     return intf1, intf2
 
 
+def ipBatch( cmds, node=None ):
+    """Run ip commands with a single 'ip -force -batch' process
+       cmds: list of ip commands, without the leading 'ip'
+       node: node whose namespace to run in (default: root namespace)
+       returns: dict of command index -> error output, for failed commands"""
+    debug( '*** ipBatch: %d commands\n' % len( cmds ) )
+    if not node:
+        count( 'processes' )
+    popen = ( node.popen if node else Popen )(
+        [ 'ip', '-force', '-batch', '-' ],
+        stdin=PIPE, stdout=PIPE, stderr=STDOUT )
+    out, _err = popen.communicate( ''.join( cmd + '\n' for cmd in cmds ) )
+    # ip reports each failure as its error message(s) followed by
+    # 'Command failed -:N', where N is the 1-based line number
+    errors, lines = {}, []
+    for line in out.splitlines():
+        m = re.match( r'Command failed -:(\d+)', line )
+        if m:
+            errors[ int( m.group( 1 ) ) - 1 ] = '\n'.join( lines )
+            lines = []
+        elif line:
+            lines.append( line )
+    return errors
+
+def batchDeleteIntfs( names ):
+    """Delete many root namespace interfaces with a single 'ip -batch'
+       names: list of interface names
+       returns: dict of name -> error output, for failed deletions"""
+    errors = ipBatch( [ 'link del dev %s' % name for name in names ] )
+    return { names[ index ]: err for index, err in errors.items() }
+
+def setLinkStates( changes ):
+    """Set many interfaces up or down with one batch of rtnetlink
+       requests per network namespace, returning once all changes
+       have been made
+       changes: list of ( intf, status ), status 'up' or 'down'
+       returns: dict of intf -> error message, for failed changes"""
+    groups = {}  # pid or None -> { name: intf }, [ ( name, up ) ]
+    for intf, status in changes:
+        node = intf.node
+        intfs, states = groups.setdefault(
+            node.pid if node.inNamespace else None, ( {}, [] ) )
+        intfs[ intf.name ] = intf
+        states.append( ( intf.name, status == 'up' ) )
+    errors = {}
+    for pid, ( intfs, states ) in groups.items():
+        try:
+            failed = nlSocket( pid ).setLinkStates( states )
+        except ( NetlinkError, IOError, OSError ) as e:
+            # e.g. the node's namespace is gone
+            failed = { name: e for name in intfs }
+        for name, err in failed.items():
+            errors[ intfs[ name ] ] = '%s: %s' % ( name, err )
+    return errors
+
+def ipAddrs( node=None ):
+    """Dump interface addresses with a single 'ip -o -batch' process
+       node: node whose namespace to dump (default: root namespace)
+       returns: dict of intf name -> { 'mac', 'up', 'ip', 'prefixLen' }"""
+    if not node:
+        count( 'processes' )
+    popen = ( node.popen if node else Popen )(
+        [ 'ip', '-o', '-batch', '-' ], stdin=PIPE, stdout=PIPE, stderr=STDOUT )
+    out, _err = popen.communicate( 'link show\naddr show\n' )
+    addrs = {}
+    for line in out.splitlines():
+        # 2: h1-eth0@if2: <BROADCAST,MULTICAST,UP,LOWER_UP> ...
+        #    link/ether 56:a4:f8:07:53:0e brd ...
+        m = re.match( r'\d+: ([^:@\s]+)\S*: <([^>]*)>.* link/\S+ ?'
+                      r'([0-9a-f:]*)', line )
+        if m:
+            name, flags, mac = m.groups()
+            addrs.setdefault( name, { 'ip': None, 'prefixLen': None } )
+            addrs[ name ].update( mac=mac or None,
+                                  up='UP' in flags.split( ',' ) )
+            continue
+        # 2: h1-eth0    inet 10.0.0.1/8 brd 10.255.255.255 ...
+        m = re.match( r'\d+: (\S+)\s+inet (\d+\.\d+\.\d+\.\d+)/(\d+)', line )
+        if m:
+            name, ip, prefixLen = m.groups()
+            addr = addrs.setdefault( name, { 'mac': None, 'up': False,
+                                             'ip': None } )
+            # Keep the first (primary) address
+            if addr[ 'ip' ] is None:
+                addr.update( ip=ip, prefixLen=int( prefixLen ) )
+    return addrs
+
+def makeIntfPairs( pairs, chunkSize=1000, deleteIntfs=True ):
+    """Make many veth pairs at once, using one 'ip -batch' per chunk
+       pairs: list of ( intf1, intf2, addr1, addr2, node1, node2 )
+       chunkSize: maximum number of pairs per ip process
+       deleteIntfs: delete intfs before creating them
+       returns: dict of ( intf1, intf2 ) -> error output ('' if created)"""
+    # Nodes' namespaces are new, so old interfaces with the same
+    # names can only be left in the root namespace
+    existing = set( ipAddrs() ) if deleteIntfs else set()
+    results = {}
+    for i in range( 0, len( pairs ), chunkSize ):
+        chunk = pairs[ i : i + chunkSize ]
+        stale = [ name for intf1, intf2, _a1, _a2, node1, node2 in chunk
+                  for name, node in ( intf1, node1 ), ( intf2, node2 )
+                  if name in existing and
+                  not ( node and node.inNamespace ) ]
+        cmds = [ 'link del dev %s' % name for name in stale ]
+        for intf1, intf2, addr1, addr2, node1, node2 in chunk:
+            # Unlike makeIntfPair(), we run in the root namespace, so
+            # both ends are placed in their nodes' namespaces explicitly
+            netns1 = 1 if not node1 else node1.pid
+            netns2 = 1 if not node2 else node2.pid
+            cmds.append( 'link add name %s%s netns %s '
+                         'type veth peer name %s%s netns %s' %
+                         ( intf1, ' address %s' % addr1 if addr1 else '',
+                           netns1,
+                           intf2, ' address %s' % addr2 if addr2 else '',
+                           netns2 ) )
+        errors = ipBatch( cmds )
+        for n, pair in enumerate( chunk ):
+            results[ pair[ 0 ], pair[ 1 ] ] = errors.get( len( stale ) + n,
+                                                          '' )
+    return results
+
+
 def deleteCmd( intf, node=None ):
     """Command to destroy an interface."""
     return 'ip link del ' + intf
@@ -154,6 +286,11 @@ def mountCgroups():
     mounts = quietRun( 'cat /proc/mounts' )
     cgdir = '/sys/fs/cgroup'
     csdir = cgdir + '/cpuset'
+    if 'cgroup2 %s ' % cgdir in mounts:
+        # Unified hierarchy: let our cgroups use the cpu and cpuset
+        # controllers
+        enableControllers( root=cgdir )
+        return
     if ('cgroup %s' % cgdir not in mounts and
             'cgroups %s' % cgdir not in mounts):
         raise Exception( "cgroups not mounted on " + cgdir )
@@ -186,3 +323,92 @@ def modprobe( mod ):
     """Return output of modprobe
        mod: module string"""
     return quietRun( [ 'modprobe', mod ] )
+
+# Waiting for servers
+
+def tcpListening( node, port ):
+    "Is anything listening on TCP port in node's network namespace?"
+    for proto in 'tcp', 'tcp6':
+        try:
+            with open( '/proc/%d/net/%s' % ( node.pid, proto ) ) as f:
+                lines = f.readlines()[ 1: ]
+        except IOError:
+            continue
+        for line in lines:
+            # sl local_address rem_address st ...; 0A is LISTEN
+            fields = line.split()
+            if ( fields[ 3 ] == '0A' and
+                 int( fields[ 1 ].split( ':' )[ 1 ], 16 ) == port ):
+                return True
+    return False
+
+def nsSocket( node, stype ):
+    "Return a non-blocking socket in node's network namespace"
+    if node and node.inNamespace:
+        sock = nsCall( node.pid, socket.socket, socket.AF_INET, stype )
+    else:
+        sock = socket.socket( socket.AF_INET, stype )
+    sock.setblocking( False )
+    return sock
+
+def tcpConnect( client, serverIP, port, wait ):
+    """Try a non-blocking TCP connect from client's namespace
+       wait: seconds to wait for the connection
+       returns: 0 if connected, otherwise an errno"""
+    sock = nsSocket( client, socket.SOCK_STREAM )
+    try:
+        err = sock.connect_ex( ( serverIP, port ) )
+        if err == errno.EINPROGRESS:
+            _r, writable, _x = select.select( [], [ sock ], [], wait )
+            err = ( sock.getsockopt( socket.SOL_SOCKET, socket.SO_ERROR )
+                    if writable else errno.ETIMEDOUT )
+        if err == 0:
+            # Reset rather than close, to leave the server alone
+            sock.setsockopt( socket.SOL_SOCKET, socket.SO_LINGER,
+                             struct.pack( 'ii', 1, 0 ) )
+        return err
+    finally:
+        sock.close()
+
+def hasRoute( client, serverIP ):
+    """Does client have a route to serverIP? Connecting a UDP socket
+       looks up the route without sending anything"""
+    sock = nsSocket( client, socket.SOCK_DGRAM )
+    try:
+        sock.connect( ( serverIP, 9 ) )
+    except socket.error as e:
+        if e.errno in ( errno.ENETUNREACH, errno.EHOSTUNREACH ):
+            return False
+        raise
+    finally:
+        sock.close()
+    return True
+
+def waitListening( client=None, server='127.0.0.1', port=80, timeout=None ):
+    """Wait until server is listening on port, polling with exponential
+       backoff from 1 ms. If server is a node, we check for a listening
+       socket in its namespace, so that it doesn't see a connection;
+       otherwise we connect to it from client's namespace.
+       client: node to connect from, or None for the root namespace
+       server: node or IP address
+       returns True if server is listening"""
+    # pylint: disable=maybe-no-member
+    node = None if isinstance( server, basestring ) else server
+    serverIP = server.IP() if node else server
+    if not hasRoute( client, serverIP ):
+        error( 'no route to %s from %s\n' % ( server, client or 'root' ) )
+        return False
+    start, delay = time(), .001
+    while True:
+        if node:
+            listening = tcpListening( node, port )
+        else:
+            listening = tcpConnect( client, serverIP, port, delay ) == 0
+        if listening:
+            return True
+        if timeout and time() - start >= timeout:
+            error( 'could not connect to %s on port %d\n' % ( server, port ) )
+            return False
+        debug( 'waiting for', server, 'to listen on port', port, '\n' )
+        sleep( delay )
+        delay = min( delay * 2, .5 )
@@ -0,0 +1,122 @@
+"""
+manifest.py: record the resources created by a Mininet run
+
+While a network is running, Mininet keeps a manifest of the system
+resources it has created in a state directory (/var/run/mininet, or
+$MN_STATE_DIR), one JSON file per Mininet object:
+
+  pid: the Mininet process
+  sessions: node shell PIDs, each the leader of a session containing
+            everything started in that node
+  commands: shell PID -> node name, to check PIDs haven't been reused
+  interfaces: interfaces created in the root namespace
+  bridges: OVS bridges
+  cgroups: cgroup directories created for hosts
+  mounts: private directories mounted outside of node namespaces
+  jails: persistent jails (FreeBSD)
+  tunnels: PIDs of tunnel processes
+
+Network namespaces are not named, so they go away with the node
+shells in them.
+
+cleanup() in mininet.clean reads the manifests of runs that did not
+exit cleanly and removes exactly what they list, rather than searching
+for anything that looks like it might belong to Mininet.
+"""
+
+import json
+import os
+from glob import glob
+
+from mininet.log import debug
+
+plat = os.uname()[ 0 ]
+
+STATE_DIR = os.environ.get( 'MN_STATE_DIR', '/var/run/mininet' )
+
+
+def manifestPaths( stateDir=STATE_DIR ):
+    "Return list of manifest paths in stateDir"
+    return sorted( glob( os.path.join( stateDir, '*.json' ) ) )
+
+def loadManifest( path ):
+    "Return manifest dict from path, or None if it can't be read"
+    try:
+        with open( path ) as f:
+            return json.load( f )
+    except ( IOError, OSError, ValueError ) as e:
+        debug( '*** Could not read manifest %s: %s\n' % ( path, e ) )
+        return None
+
+
+class Manifest( object ):
+    "Manifest of the resources created by a Mininet object"
+
+    def __init__( self, stateDir=STATE_DIR ):
+        self.stateDir = stateDir
+        self.path = os.path.join( stateDir, '%d-%x.json' %
+                                  ( os.getpid(), id( self ) ) )
+
+    @staticmethod
+    def resources( net ):
+        """Return dict of the resources currently used by net
+           net: Mininet object"""
+        nodes = net.controllers + net.switches + net.hosts
+        sessions, commands = [], {}
+        interfaces, bridges, cgroups, mounts = [], [], [], []
+        jails, tunnels = [], []
+        for node in nodes:
+            if node.shell:
+                sessions.append( node.shell.pid )
+                commands[ str( node.shell.pid ) ] = node.name
+            if not node.inNamespace:
+                # Protect against deleting hardware interfaces, as
+                # deleteIntfs() does
+                interfaces += [ intf.name for intf in node.intfList()
+                                if node.name in intf.name ]
+            if getattr( node, 'cgroup', None ):
+                cgroups += node.cgroup.paths()
+            if getattr( node, 'jid', None ):
+                jails.append( node.jid )
+            if plat == 'FreeBSD':
+                # Linux mounts are in the node's own mount namespace
+                for d in node.privateDirs:
+                    if isinstance( d, tuple ):
+                        # unionfs over nullfs
+                        mounts += [ d[ 1 ] % node.__dict__ ] * 2
+                    else:
+                        mounts.append( d + node.name )
+        for switch in net.switches:
+            # OVS switches are bridges, which outlive their shells
+            if hasattr( switch, 'vsctl' ) and switch.shell:
+                bridges.append( switch.name )
+        for link in net.links:
+            tunnel = getattr( link, 'tunnel', None )
+            if tunnel:
+                tunnels.append( tunnel.pid )
+        return { 'pid': os.getpid(), 'sessions': sessions,
+                 'commands': commands, 'interfaces': interfaces,
+                 'bridges': bridges, 'cgroups': cgroups, 'mounts': mounts,
+                 'jails': jails, 'tunnels': tunnels }
+
+    def write( self, net ):
+        """Write manifest for net; errors are not fatal, since the
+           heuristic cleanup still works without a manifest
+           net: Mininet object"""
+        tmp = self.path + '.tmp'
+        try:
+            if not os.path.isdir( self.stateDir ):
+                os.makedirs( self.stateDir )
+            with open( tmp, 'w' ) as f:
+                json.dump( self.resources( net ), f )
+            # Replace atomically, so cleanup never sees a partial file
+            os.rename( tmp, self.path )
+        except ( IOError, OSError ) as e:
+            debug( '*** Could not write manifest %s: %s\n' % ( self.path, e ) )
+
+    def remove( self ):
+        "Remove manifest, after a clean shutdown"
+        try:
+            os.unlink( self.path )
+        except OSError:
+            pass
@@ -92,7 +92,7 @@
 import signal
 import random
 
-from time import sleep
+from time import sleep, time
 from itertools import chain, groupby
 from math import ceil
 
@@ -101,7 +101,13 @@
 from mininet.node import ( Host, KernelSwitch, DefaultController,
                            Controller, RctlHost )
 from mininet.nodelib import NAT
-from mininet.link import Link
+from mininet.link import Link, TCIntf
+from mininet.profiler import Profiler
+from mininet.manifest import Manifest
+from mininet.sampler import CPUSampler
+from mininet.telemetry import Telemetry
+from mininet.timeline import Timeline
+from mininet.traffic import runTraffic, printFlows
 from mininet.util import ( quietRun, ensureRoot,
                            macColonHex, ipStr, ipParse, netParse, ipAdd,
                            waitListening )
@@ -120,6 +126,10 @@ def waitCount( ttype ):
     from mininet.linux.node import Node
     from mininet.linux.intf import Intf
     from mininet.linux.util import fixLimits, numCores
+
+    def waitCount( ttype ):
+        # waitListening() doesn't connect to node servers on Linux
+        return 1
 else:
     from mininet.openbsd.node import Node
     from mininet.openbsd.intf import Intf
@@ -140,7 +150,8 @@ def __init__( self, topo=None, switch=KernelSwitch, host=Host,
                   build=True, xterms=False, cleanup=False, ipBase='10.0.0.0/8',
                   inNamespace=False,
                   autoSetMacs=False, autoStaticArp=False, autoPinCpus=False,
-                  listenPort=None, waitConnected=False ):
+                  listenPort=None, waitConnected=False, parallel=False,
+                  batchLinks=False, fastStop=False ):
         """Create Mininet object.
            topo: Topo (topology) object or None
            switch: default Switch class
@@ -157,7 +168,15 @@ def __init__( self, topo=None, switch=KernelSwitch, host=Host,
            autoStaticArp: set all-pairs static MAC addrs?
            autoPinCpus: pin hosts to (real) cores (requires CPULimitedHost)?
            listenPort: base listening port to open; will be incremented for
-               each additional switch in the net if inNamespace=False"""
+               each additional switch in the net if inNamespace=False
+           parallel: when building from topo, spawn all node shells
+               before waiting for any of them?
+           batchLinks: when building from topo, create veth pairs and
+               configure tc shaping in bulk rather than one link at
+               a time?
+           fastStop: on stop(), leave veth pairs to be removed with
+               their namespaces, delete the rest in bulk, and wait for
+               all node shells to exit together?"""
         self.topo = topo
         self.switch = switch
         self.host = host
@@ -179,6 +198,9 @@ def __init__( self, topo=None, switch=KernelSwitch, host=Host,
         self.nextCore = 0  # next core for pinning hosts to CPUs
         self.listenPort = listenPort
         self.waitConn = waitConnected
+        self.parallel = parallel
+        self.batchLinks = batchLinks
+        self.fastStop = fastStop
 
         self.hosts = []
         self.switches = []
@@ -189,6 +211,15 @@ def __init__( self, topo=None, switch=KernelSwitch, host=Host,
 
         self.terms = []  # list of spawned xterm processes
 
+        # Time and counts for each phase of build/start/stop
+        self.profiler = Profiler()
+
+        # Resources we have created, for mn -c if we don't exit cleanly
+        self.manifest = Manifest()
+
+        self.telemetry = None  # interface counter sampler, if started
+        self.timeline = None  # scheduled link and node events, if started
+
         Mininet.init()  # Initialize Mininet if necessary
 
         self.built = False
@@ -196,27 +227,63 @@ def __init__( self, topo=None, switch=KernelSwitch, host=Host,
             self.build()
 
     def waitConnected( self, timeout=None, delay=.5 ):
-        """wait for each switch to connect to a controller,
-           up to 5 seconds
+        """wait for each switch to connect to a controller
            timeout: time to wait, or None to wait indefinitely
-           delay: seconds to sleep per iteration
-           returns: True if all switches are connected"""
+           delay: maximum seconds to sleep per polling iteration
+           returns: True if all switches are connected
+           Switch classes that provide a connectionMonitor() are
+           woken up by connection events; others are polled with
+           an interval that backs off up to delay. Each switch's
+           time to connect is saved in self.connectTimes."""
         info( '*** Waiting for switches to connect\n' )
-        time = 0
+        start = time()
+        self.connectTimes = {}
         remaining = list( self.switches )
-        while True:
-            for switch in tuple( remaining ):
-                if switch.connected():
-                    info( '%s ' % switch )
-                    remaining.remove( switch )
-            if not remaining:
-                info( '\n' )
-                return True
-            if time > timeout and timeout is not None:
-                break
-            sleep( delay )
-            time += delay
-        warn( 'Timed out after %d seconds\n' % time )
+        monitors = []
+        polled = False
+        for cls in set( type( switch ) for switch in remaining ):
+            # Not all switch classes are derived from Switch
+            connectionMonitor = getattr( cls, 'connectionMonitor', None )
+            monitor = connectionMonitor() if connectionMonitor else None
+            if monitor:
+                if monitor not in monitors:
+                    monitors.append( monitor )
+            else:
+                polled = True
+        interval = .01
+        try:
+            while True:
+                for switch in tuple( remaining ):
+                    if switch.connected():
+                        self.connectTimes[ switch.name ] = time() - start
+                        info( '%s ' % switch )
+                        remaining.remove( switch )
+                if not remaining:
+                    info( '\n*** All switches connected in %.3f seconds\n' %
+                          ( time() - start ) )
+                    debug( '*** Time to connect: %s\n' % ' '.join(
+                        '%s:%.3fs' % ( name, self.connectTimes[ name ] )
+                        for name in sorted( self.connectTimes ) ) )
+                    return True
+                elapsed = time() - start
+                if timeout is not None and elapsed > timeout:
+                    break
+                wait = interval if polled else delay
+                if timeout is not None:
+                    wait = min( wait, timeout - elapsed )
+                wait = max( wait, 0 )
+                if monitors:
+                    # Wait for events, or until we need to poll again
+                    monitors[ 0 ].poll( int( wait * 1000 ) )
+                    for monitor in monitors[ 1: ]:
+                        monitor.poll( 0 )
+                else:
+                    sleep( wait )
+                interval = min( interval * 2, delay )
+        finally:
+            for monitor in monitors:
+                monitor.close()
+        warn( 'Timed out after %d seconds\n' % ( time() - start ) )
         for switch in remaining:
             if not switch.connected():
                 warn( 'Warning: %s is not connected to a controller\n'
@@ -245,7 +312,8 @@ def addHost( self, name, cls=None, **params ):
         defaults.update( params )
         if not cls:
             cls = self.host
-        h = cls( name, **defaults )
+        with self.profiler.nodeClass( 'create', cls ):
+            h = cls( name, **defaults )
         self.hosts.append( h )
         self.nameToNode[ name ] = h
         return h
@@ -279,7 +347,8 @@ def addSwitch( self, name, cls=None, **params ):
         defaults.update( params )
         if not cls:
             cls = self.switch
-        sw = cls( name, **defaults )
+        with self.profiler.nodeClass( 'create', cls ):
+            sw = cls( name, **defaults )
         if not self.inNamespace and self.listenPort:
             self.listenPort += 1
         self.switches.append( sw )
@@ -304,7 +373,8 @@ def addController( self, name='c0', controller=None, **params ):
             name = controller_new.name
             # pylint: enable=maybe-no-member
         else:
-            controller_new = controller( name, **params )
+            with self.profiler.nodeClass( 'create', controller ):
+                controller_new = controller( name, **params )
         # Add new controller to net
         if controller_new:  # allow controller-less setups
             self.controllers.append( controller_new )
@@ -423,6 +493,36 @@ def addLink( self, node1, node2, port1=None, port2=None,
         self.links.append( link )
         return link
 
+    def makeIntfPairs( self, linkParams ):
+        """Create the interface pairs for a set of links in bulk,
+           ahead of addLink(); links whose class cannot be batched,
+           or which lack port numbers, are left for addLink().
+           linkParams: list of addLink() params (updated with the
+               interface names and MAC addresses used)"""
+        pairs = []
+        for params in linkParams:
+            cls = params.get( 'cls', self.link )
+            port1, port2 = params.get( 'port1' ), params.get( 'port2' )
+            if ( not isinstance( cls, type ) or not cls.canBatch() or
+                 not params.get( 'fast', True ) or
+                 port1 is None or port2 is None ):
+                continue
+            node1, node2 = params[ 'node1' ], params[ 'node2' ]
+            if isinstance( node1, basestring ):
+                node1 = self[ node1 ]
+            if isinstance( node2, basestring ):
+                node2 = self[ node2 ]
+            # Fix names and addresses now so that the link uses them
+            params.setdefault( 'intfName1', cls.batchIntfName( node1, port1 ) )
+            params.setdefault( 'intfName2', cls.batchIntfName( node2, port2 ) )
+            params.setdefault( 'addr1', self.randMac() )
+            params.setdefault( 'addr2', self.randMac() )
+            pairs.append( ( params[ 'intfName1' ], params[ 'intfName2' ],
+                            params[ 'addr1' ], params[ 'addr2' ],
+                            node1, node2 ) )
+        if pairs:
+            Link.makeIntfPairs( pairs )
+
     def delLink( self, link ):
         "Remove a link from this network"
         link.delete()
@@ -448,22 +548,38 @@ def delLinkBetween( self, node1, node2, index=0, allLinks=False ):
         return links
 
     def configHosts( self ):
-        "Configure a set of hosts."
+        """Configure a set of hosts. For hosts whose class allows it
+           (see BaseNode.deferConfig), configuration commands are queued
+           and sent as a single script, and the scripts for all such
+           hosts are run concurrently; other hosts run config() as usual.
+           returns: dict of host -> config() results"""
+        results, scripts = {}, []
         for host in self.hosts:
             info( host.name + ' ' )
-            intf = host.defaultIntf()
-            if intf:
-                host.configDefault()
-            else:
-                # Don't configure nonexistent intf
-                host.configDefault( ip=None, mac=None )
+            if host.shell and host.defersConfig():
+                host.deferCmds()
+            try:
+                intf = host.defaultIntf()
+                if intf:
+                    results[ host ] = host.configDefault()
+                else:
+                    # Don't configure nonexistent intf
+                    results[ host ] = host.configDefault( ip=None, mac=None )
+            finally:
+                script = host.deferredScript()
+            if script:
+                scripts.append( ( host, script ) )
             # You're low priority, dude!
             # BL: do we want to do this here or not?
             # May not make sense if we have CPU lmiting...
             # quietRun( 'renice +18 -p ' + repr( host.pid ) )
             # This may not be the right place to do this, but
             # it needs to be done somewhere.
+        outputs = self.gather( scripts, printPid=False )
+        for ( host, _script ), output in zip( scripts, outputs ):
+            host.resolveDeferred( results[ host ] or {}, output )
         info( '\n' )
+        return results
 
     def buildFromTopo( self, topo=None ):
         """Build mininet from a topology object
@@ -476,6 +592,7 @@ def buildFromTopo( self, topo=None ):
             pass
 
         info( '*** Creating network\n' )
+        phase = self.profiler.phase
 
         if not self.controllers and self.controller:
             # Add a default controller
@@ -483,36 +600,138 @@ def buildFromTopo( self, topo=None ):
             classes = self.controller
             if not isinstance( classes, list ):
                 classes = [ classes ]
-            for i, cls in enumerate( classes ):
-                # Allow Controller objects because nobody understands partial()
-                if isinstance( cls, Controller ):
-                    self.addController( cls )
-                else:
-                    self.addController( 'c%d' % i, cls )
+            with phase( 'addControllers' ):
+                for i, cls in enumerate( classes ):
+                    # Allow Controller objects because nobody understands
+                    # partial()
+                    if isinstance( cls, Controller ):
+                        self.addController( cls )
+                    else:
+                        self.addController( 'c%d' % i, cls )
 
         info( '*** Adding hosts:\n' )
-        for hostName in topo.hosts():
-            self.addHost( hostName, **topo.nodeInfo( hostName ) )
-            info( hostName + ' ' )
+        with phase( 'addHosts' ):
+            for hostName in topo.hosts():
+                params = topo.nodeInfo( hostName )
+                if self.parallel:
+                    params.setdefault( 'waitPrompt', False )
+                self.addHost( hostName, **params )
+                info( hostName + ' ' )
 
         info( '\n*** Adding switches:\n' )
-        for switchName in topo.switches():
-            # A bit ugly: add batch parameter if appropriate
-            params = topo.nodeInfo( switchName)
-            cls = params.get( 'cls', self.switch )
-            if hasattr( cls, 'batchStartup' ):
-                params.setdefault( 'batch', True )
-            self.addSwitch( switchName, **params )
-            info( switchName + ' ' )
+        with phase( 'addSwitches' ):
+            for switchName in topo.switches():
+                # A bit ugly: add batch parameter if appropriate
+                params = topo.nodeInfo( switchName)
+                cls = params.get( 'cls', self.switch )
+                if hasattr( cls, 'batchStartup' ):
+                    params.setdefault( 'batch', True )
+                if self.parallel:
+                    params.setdefault( 'waitPrompt', False )
+                self.addSwitch( switchName, **params )
+                info( switchName + ' ' )
+
+        if self.parallel:
+            info( '\n*** Waiting for node shells' )
+            with phase( 'waitPrompts' ):
+                self.waitPrompts( self.hosts + self.switches )
 
         info( '\n*** Adding links:\n' )
-        for srcName, dstName, params in topo.links(
-                sort=True, withInfo=True ):
-            self.addLink( **params )
-            info( '(%s, %s) ' % ( srcName, dstName ) )
+        with phase( 'addLinks' ):
+            # Copy link info, since makeIntfPairs() may add to it
+            links = [ ( srcName, dstName, dict( params ) )
+                      for srcName, dstName, params in topo.links(
+                          sort=True, withInfo=True ) ]
+            try:
+                if self.batchLinks:
+                    self.makeIntfPairs( [ params for _src, _dst, params
+                                          in links ] )
+                    TCIntf.startBatch()
+                for srcName, dstName, params in links:
+                    self.addLink( **params )
+                    info( '(%s, %s) ' % ( srcName, dstName ) )
+            finally:
+                if self.batchLinks:
+                    # Don't leave pairs we didn't use (e.g. after an
+                    # error) for a later network with the same names
+                    Link.batchedPairs.clear()
+                    with phase( 'shapeLinks' ):
+                        TCIntf.runBatch()
 
         info( '\n' )
 
+    @staticmethod
+    def waitPrompts( nodes ):
+        """Wait for the shells of nodes started with waitPrompt=False,
+           collecting their prompts with a single poll loop.
+           nodes: list of nodes"""
+        pending = { node.stdout.fileno(): node for node in nodes
+                    if node.promptPending }
+        started = list( pending.values() )
+        poller = select.poll()
+        for fd in pending:
+            poller.register( fd, select.POLLIN )
+        while pending:
+            for fd, _event in poller.poll():
+                node = pending[ fd ]
+                if node.readPrompt():
+                    poller.unregister( fd )
+                    del pending[ fd ]
+                    # Start setting up the shell while we wait for the rest
+                    node.initShell( wait=False )
+        for node in started:
+            node.waitOutput()
+
+    @staticmethod
+    def gather( cmds, printPid=True, maxNodes=None ):
+        """Run commands on many nodes concurrently with acmd(), using
+           a single poll loop rather than one blocking cmd() at a time
+           cmds: list of ( node, cmd ) pairs; commands for the same
+                 node run in order
+           printPid: as for sendCmd()
+           maxNodes: maximum number of nodes running commands at once
+                     (default: no limit)
+           returns: list of outputs, in the same order as cmds"""
+        queues = {}  # node -> [ ( index, cmd ) ]
+        order = []  # nodes in the order of their first commands
+        for index, ( node, cmd ) in enumerate( cmds ):
+            if node not in queues:
+                order.append( node )
+            queues.setdefault( node, [] ).append( ( index, cmd ) )
+        outputs = [ None ] * len( cmds )
+        running = {}  # fd -> ( index, PendingOutput )
+        poller = select.poll()
+
+        def start( node ):
+            "Send node's next command"
+            index, cmd = queues[ node ].pop( 0 )
+            pending = node.acmd( cmd, printPid=printPid )
+            running[ pending.fileno() ] = ( index, pending )
+            poller.register( pending, select.POLLIN )
+
+        # Nodes yet to start, beyond the first maxNodes
+        waiting = order[ maxNodes: ] if maxNodes else []
+        for node in order[ :maxNodes ] if maxNodes else order:
+            start( node )
+        while running:
+            # Don't block if output is already buffered
+            buffered = [ fd for fd, ( _i, pending ) in running.items()
+                         if pending.buffered() ]
+            ready = poller.poll( 0 if buffered else None )
+            for fd in set( buffered + [ fd for fd, _event in ready ] ):
+                index, pending = running[ fd ]
+                if not pending.done():
+                    continue
+                outputs[ index ] = pending.output
+                poller.unregister( fd )
+                del running[ fd ]
+                node = pending.node
+                if queues[ node ]:
+                    start( node )
+                elif waiting:
+                    start( waiting.pop( 0 ) )
+        return outputs
+
     def configureControlNetwork( self ):
         "Control net config hook: override in subclass"
         raise Exception( 'configureControlNetwork: '
@@ -520,16 +739,22 @@ def configureControlNetwork( self ):
 
     def build( self ):
         "Build mininet."
-        if self.topo:
-            self.buildFromTopo( self.topo )
-        if self.inNamespace:
-            self.configureControlNetwork()
-        info( '*** Configuring hosts\n' )
-        self.configHosts()
-        if self.xterms:
-            self.startTerms()
-        if self.autoStaticArp:
-            self.staticArp()
+        phase = self.profiler.phase
+        with phase( 'build' ):
+            if self.topo:
+                self.buildFromTopo( self.topo )
+            if self.inNamespace:
+                with phase( 'configureControlNetwork' ):
+                    self.configureControlNetwork()
+            info( '*** Configuring hosts\n' )
+            with phase( 'configHosts' ):
+                self.configHosts()
+            if self.xterms:
+                self.startTerms()
+            if self.autoStaticArp:
+                with phase( 'staticArp' ):
+                    self.staticArp()
+        self.manifest.write( self )
         self.built = True
 
     def startTerms( self ):
@@ -549,71 +774,213 @@ def stopXterms( self ):
             os.kill( term.pid, signal.SIGKILL )
         cleanUpScreens()
 
+    def startTelemetry( self, interval=.1, size=600 ):
+        """Start sampling the counters of every interface; stop() stops
+           interval: seconds between samples
+           size: number of samples to keep
+           returns: Telemetry object"""
+        if self.telemetry:
+            self.telemetry.stop()
+        self.telemetry = Telemetry( self, interval=interval, size=size )
+        self.telemetry.start()
+        return self.telemetry
+
+    def stopTelemetry( self ):
+        "Stop sampling interface counters; samples can still be read"
+        if self.telemetry:
+            self.telemetry.stop()
+
+    def startTimeline( self, events ):
+        """Start running scheduled link and node events; stop() stops
+           events: list of ( time, action, args... ) (see timeline.py)
+           returns: Timeline object"""
+        self.stopTimeline()
+        self.timeline = Timeline( self, events )
+        self.timeline.start()
+        return self.timeline
+
+    def stopTimeline( self ):
+        "Stop running scheduled events; the log can still be read"
+        if self.timeline:
+            self.timeline.stop()
+
     def staticArp( self ):
-        "Add all-pairs ARP entries to remove the need to handle broadcast."
+        """Add all-pairs ARP entries to remove the need to handle broadcast.
+           Each host's entries are written in one operation."""
+        entries = [ ( dst, dst.IP(), dst.MAC() ) for dst in self.hosts ]
         for src in self.hosts:
-            for dst in self.hosts:
-                if src != dst:
-                    src.setARP( ip=dst.IP(), mac=dst.MAC() )
+            src.setARPs( [ ( ip, mac ) for dst, ip, mac in entries
+                           if dst != src ] )
 
     def start( self ):
         "Start controller and switches."
         if not self.built:
             self.build()
-        info( '*** Starting controller\n' )
-        for controller in self.controllers:
-            info( controller.name + ' ')
-            controller.start()
-        info( '\n' )
-        info( '*** Starting %s switches\n' % len( self.switches ) )
-        for switch in self.switches:
-            info( switch.name + ' ')
-            switch.start( self.controllers )
-        started = {}
-        for swclass, switches in groupby(
-                sorted( self.switches, key=type ), type ):
-            switches = tuple( switches )
-            if hasattr( swclass, 'batchStartup' ):
-                success = swclass.batchStartup( switches )
-                started.update( { s: s for s in success } )
-        info( '\n' )
-        if self.waitConn:
-            self.waitConnected()
+        phase, nodeClass = self.profiler.phase, self.profiler.nodeClass
+        with phase( 'start' ):
+            info( '*** Starting controller\n' )
+            with phase( 'startControllers' ):
+                for controller in self.controllers:
+                    info( controller.name + ' ')
+                    with nodeClass( 'start', controller ):
+                        controller.start()
+            info( '\n' )
+            info( '*** Starting %s switches\n' % len( self.switches ) )
+            with phase( 'startSwitches' ):
+                for switch in self.switches:
+                    info( switch.name + ' ')
+                    with nodeClass( 'start', switch ):
+                        switch.start( self.controllers )
+            started = {}
+            with phase( 'batchStartup' ):
+                for swclass, switches in groupby(
+                        sorted( self.switches, key=type ), type ):
+                    switches = tuple( switches )
+                    if hasattr( swclass, 'batchStartup' ):
+                        with nodeClass( 'batchStartup', swclass ):
+                            success = swclass.batchStartup( switches )
+                        started.update( { s: s for s in success } )
+            info( '\n' )
+            if self.waitConn:
+                with phase( 'waitConnected' ):
+                    self.waitConnected()
+        self.manifest.write( self )
 
     def stop( self ):
         "Stop the controller(s), switches and hosts"
+        phase = self.profiler.phase
+        with phase( 'stop' ):
+            self._stop( phase )
+        self.manifest.remove()
+        info( '\n*** Done\n' )
+
+    def _stop( self, phase ):
+        "Stop the controller(s), switches and hosts, timing each phase"
+        self.stopTimeline()
+        self.stopTelemetry()
         info( '*** Stopping %i controllers\n' % len( self.controllers ) )
-        for controller in self.controllers:
-            info( controller.name + ' ' )
-            controller.stop()
+        with phase( 'stopControllers' ):
+            for controller in self.controllers:
+                info( controller.name + ' ' )
+                controller.stop()
         info( '\n' )
         if self.terms:
             info( '*** Stopping %i terms\n' % len( self.terms ) )
             self.stopXterms()
         info( '*** Stopping %i links\n' % len( self.links ) )
-        for link in self.links:
-            info( '.' )
-            link.stop()
+        with phase( 'stopLinks' ):
+            stopped, pending = set(), []
+            if self.fastStop:
+                links, pending = self.batchStopLinks( self.links )
+                stopped.update( links )
+            for link in self.links:
+                info( '.' )
+                if link not in stopped:
+                    link.stop()
         info( '\n' )
+        nodes = self.switches + self.hosts
+        shells = [ node.shell for node in nodes if node.shell ]
+        if self.fastStop:
+            with phase( 'unmountPrivateDirs' ):
+                self.unmountPrivateDirs( nodes )
         info( '*** Stopping %i switches\n' % len( self.switches ) )
-        stopped = {}
-        for swclass, switches in groupby(
-                sorted( self.switches, key=type ), type ):
-            switches = tuple( switches )
-            if hasattr( swclass, 'batchShutdown' ):
-                success = swclass.batchShutdown( switches )
-                stopped.update( { s: s for s in success } )
-        for switch in self.switches:
-            info( switch.name + ' ' )
-            if switch not in stopped:
-                switch.stop()
-            switch.terminate()
+        with phase( 'stopSwitches' ):
+            stopped = {}
+            for swclass, switches in groupby(
+                    sorted( self.switches, key=type ), type ):
+                switches = tuple( switches )
+                if hasattr( swclass, 'batchShutdown' ):
+                    success = swclass.batchShutdown( switches )
+                    stopped.update( { s: s for s in success } )
+            for switch in self.switches:
+                info( switch.name + ' ' )
+                if switch not in stopped:
+                    switch.stop()
+                switch.terminate()
         info( '\n' )
         info( '*** Stopping %i hosts\n' % len( self.hosts ) )
-        for host in self.hosts:
-            info( host.name + ' ' )
-            host.terminate()
-        info( '\n*** Done\n' )
+        with phase( 'stopHosts' ):
+            for host in self.hosts:
+                info( host.name + ' ' )
+                host.terminate()
+        if self.fastStop:
+            info( '\n*** Waiting for %i node shells to exit\n' %
+                  len( shells ) )
+            with phase( 'reapShells' ):
+                self.reapShells( shells )
+            if pending:
+                with phase( 'waitLinksRemoved' ):
+                    Link.waitRemoved( pending )
+
+    @staticmethod
+    def batchStopLinks( links ):
+        """Stop links in bulk, using batchStop() for each link class
+           that supports it
+           links: list of links
+           returns: list of links stopped, list of root namespace
+                    interfaces that will go away with their namespaces"""
+        classes = {}
+        for link in links:
+            classes.setdefault( type( link ), [] ).append( link )
+        stopped, pending = [], []
+        for cls, clsLinks in classes.items():
+            if hasattr( cls, 'canBatchStop' ) and cls.canBatchStop():
+                clsStopped, clsPending = cls.batchStop( clsLinks )
+                stopped += clsStopped
+                pending += clsPending
+        return stopped, pending
+
+    def unmountPrivateDirs( self, nodes ):
+        """Unmount the private directories of many nodes concurrently,
+           so that terminate() needn't unmount them one node at a time
+           nodes: list of nodes"""
+        scripts = []
+        for node in nodes:
+            if not node.privateDirs or not node.shell:
+                continue
+            node.deferCmds()
+            try:
+                node.unmountPrivateDirs()
+            finally:
+                script = node.deferredScript()
+            if script:
+                scripts.append( ( node, script ) )
+            # Already unmounted
+            node.privateDirs = []
+        self.gather( scripts, printPid=False )
+
+    @staticmethod
+    def reapShells( shells, timeout=2 ):
+        """Wait for node shells, which have all been signalled,
+           to exit, so that their namespaces are gone when we return;
+           kill the process groups of any still running after timeout
+           shells: list of shell Popen objects
+           timeout: seconds to wait before killing"""
+        for sig in None, signal.SIGKILL:
+            if sig:
+                shells = [ shell for shell in shells
+                           if shell.poll() is None ]
+                if not shells:
+                    return
+                warn( '*** Killing %d node shells\n' % len( shells ) )
+                for shell in shells:
+                    try:
+                        os.killpg( shell.pid, sig )
+                    except OSError:
+                        # Exited since we polled it
+                        pass
+            end = time() + timeout
+            delay = .001
+            while True:
+                shells = [ shell for shell in shells
+                           if shell.poll() is None ]
+                if not shells or time() > end:
+                    break
+                sleep( delay )
+                delay = min( delay * 2, .1 )
+            if not shells:
+                return
+        warn( '*** %d node shells have not exited\n' % len( shells ) )
 
     def run( self, test, *args, **kwargs ):
         "Perform a complete start/test/stop cycle."
@@ -665,6 +1032,40 @@ def _parsePing( pingOutput ):
         sent, received = int( m.group( 1 ) ), int( m.group( 2 ) )
         return sent, received
 
+    def pingResults( self, hosts, timeout=None, maxProbes=256 ):
+        """Ping from each host to every other host, concurrently.
+           Each source host runs its probes in parallel from a single
+           shell command, and up to maxProbes sources run at once via
+           gather().
+           hosts: list of hosts
+           timeout: time to wait for a response, as string
+           maxProbes: bound on the number of pings in flight
+           returns: dict of ( src, dest IP ) -> ping output"""
+        opts = '-W %s' % timeout if timeout else ''
+        # Sources running at once, and probes per source in each wave
+        sources = max( 1, min( len( hosts ), maxProbes ) )
+        width = max( 1, maxProbes // sources )
+        cmds = []
+        for node in hosts:
+            ips = sorted( set( str( dest.IP() ) for dest in hosts
+                               if dest != node and dest.intfs ) )
+            if not ips:
+                continue
+            # Each probe prints its output, quoted so that the shell
+            # doesn't expand it, with newlines folded into one line
+            script = ( 'i=0; for ip in %s; do '
+                       '( r=$(ping -c1 %s $ip 2>&1 | tr -s "\\n" " "); '
+                       'printf "@ping %%s %%s\\n" "$ip" "$r" ) & '
+                       'i=$((i+1)); [ $((i %% %d)) -eq 0 ] && wait; '
+                       'done; wait' % ( ' '.join( ips ), opts, width ) )
+            cmds.append( ( node, "sh -c '%s'" % script ) )
+        results = {}
+        outputs = self.gather( cmds, maxNodes=sources )
+        for ( node, _cmd ), out in zip( cmds, outputs ):
+            for ip, result in re.findall( r'@ping (\S+) ([^\r\n]*)', out ):
+                results[ node, ip ] = result.strip()
+        return results
+
     def ping( self, hosts=None, timeout=None ):
         """Ping between all specified hosts.
            hosts: list of hosts
@@ -677,16 +1078,13 @@ def ping( self, hosts=None, timeout=None ):
         if not hosts:
             hosts = self.hosts
             output( '*** Ping: testing ping reachability\n' )
+        results = self.pingResults( hosts, timeout )
         for node in hosts:
             output( '%s -> ' % node.name )
             for dest in hosts:
                 if node != dest:
-                    opts = ''
-                    if timeout:
-                        opts = '-W %s' % timeout
                     if dest.intfs:
-                        result = node.cmd( 'ping -c1 %s %s' %
-                                           (opts, dest.IP()) )
+                        result = results.get( ( node, str( dest.IP() ) ), '' )
                         sent, received = self._parsePing( result )
                     else:
                         sent, received = 0, 0
@@ -751,14 +1149,13 @@ def pingFull( self, hosts=None, timeout=None ):
         if not hosts:
             hosts = self.hosts
             output( '*** Ping: testing ping reachability\n' )
+        results = self.pingResults( hosts, timeout )
         for node in hosts:
             output( '%s -> ' % node.name )
             for dest in hosts:
                 if node != dest:
-                    opts = ''
-                    if timeout:
-                        opts = '-W %s' % timeout
-                    result = node.cmd( 'ping -c1 %s %s' % (opts, dest.IP()) )
+                    result = ( results.get( ( node, str( dest.IP() ) ), '' )
+                               if dest.intfs else '' )
                     outputs = self._parsePingFull( result )
                     sent, received, rttmin, rttavg, rttmax, rttdev = outputs
                     all_outputs.append( (node, dest, outputs) )
@@ -848,8 +1245,8 @@ def iperf( self, hosts=None, l4Type='TCP', udpBw='10M', fmt=None,
                              server.IP() + ' ' + bwArgs )
         debug( 'Client output: %s\n' % cliout )
         servout = ''
-        # We want the last *b/sec from the iperf server output
-        # for TCP, there are two fo them because of waitListening
+        # We want the last *b/sec from the iperf server output;
+        # there may be one for a waitListening connection first
         count = waitCount( l4Type )
         while len( re.findall( '/sec', servout ) ) < count:
             servout += server.monitor( timeoutms=5000 )
@@ -866,11 +1263,56 @@ def iperfUdp( self ):
         """Run iperf test in UDP mode"""
         self.iperf( l4Type='UDP' )
 
-    def runCpuLimitTest( self, cpu, duration=5 ):
+    def iperfMatrix( self, flows, basePort=5001, timeout=None ):
+        """Run many iperf flows concurrently, from a traffic matrix
+           flows: list of ( src, dst, protocol, rate, duration ), where
+                  src and dst are hosts or host names, protocol is TCP
+                  or UDP, and rate is an iperf bandwidth (e.g. '10M')
+                  or None for TCP
+           basePort: port of the first flow; each flow uses the next
+           timeout: seconds to wait for each TCP server to listen
+           returns: list of per-flow result dicts (see mininet.traffic)"""
+        output( '*** Iperf: running %d flows\n' % len( flows ) )
+        results = runTraffic( self, flows, basePort, timeout )
+        printFlows( results )
+        return results
+
+    @staticmethod
+    def cpuUsageLoop( hosts, pids, duration, rate, cores ):
+        """Sample CPU usage of each host in turn, for when CPUSampler
+           (which requires numpy) isn't available
+           hosts: CPU-limited hosts
+           pids: list of each host's process IDs (for RctlHost)
+           duration: seconds to sample for
+           rate: samples per second
+           cores: number of cores in the system
+           returns: list of each host's samples of the fraction of
+                    system CPU time used"""
+        def cpuTime( host, hpids ):
+            "Return CPU seconds used so far by host"
+            if isinstance( host, RctlHost ):
+                return host.getCPUTime( hpids )
+            return host.cgroup.cpuUsage()
+        interval = 1.0 / rate
+        usage = [ [] for _host in hosts ]
+        times = [ cpuTime( h, hpids ) for h, hpids in zip( hosts, pids ) ]
+        for _ in range( max( 1, int( round( duration * rate ) ) ) ):
+            sleep( interval )
+            for i, ( host, hpids ) in enumerate( zip( hosts, pids ) ):
+                readTime = cpuTime( host, hpids )
+                usage[ i ].append( ( readTime - times[ i ] ) /
+                                   interval / cores )
+                times[ i ] = readTime
+        return usage
+
+    def runCpuLimitTest( self, cpu, duration=5, rate=1 ):
         """run CPU limit test with 'while true' processes.
         cpu: desired CPU fraction of each host
-        duration: test duration in seconds (integer)
-        returns a single list of measured CPU fractions as floats.
+        duration: test duration in seconds
+        rate: CPU usage samples per second
+        returns a single list of measured CPU fractions as floats,
+        grouped by host in the order of hosts: all of the first host's
+        samples, then all of the second host's, and so on.
         """
         pct = cpu * 100
         info( '*** Testing CPU %.0f%% bandwidth limit\n' % pct )
@@ -878,50 +1320,28 @@ def runCpuLimitTest( self, cpu, duration=5 ):
         cores = numCores()
         # number of processes to run a while loop on per host
         num_procs = int( ceil( cores * cpu ) )
-        pids = {}
-        for h in hosts:
-            pids[ h ] = []
-            for _core in range( num_procs ):
-                h.cmd( 'while true; do a=1; done &' )
-                pids[ h ].append( h.cmd( 'echo $!' ).strip() )
-        outputs = {}
-        time = {}
-        # get the initial cpu time for each host
-        for host in hosts:
-            outputs[ host ] = []
-            if isinstance( host, RctlHost ):
-                time[ host ] = host.getCPUTime( pids[ host ] )
+        spin = '; '.join( [ 'while true; do a=1; done & echo $!' ] *
+                          num_procs )
+        outputs = self.gather( [ ( h, spin ) for h in hosts ],
+                               printPid=False )
+        pids = [ re.findall( r'^(\d+)\r?$', out, re.M ) for out in outputs ]
+        try:
+            if CPUSampler.available():
+                sampler = CPUSampler( hosts, cores )
+                try:
+                    usage = sampler.sample( duration, rate ).tolist()
+                finally:
+                    sampler.close()
             else:
-                with open( '/sys/fs/cgroup/cpuacct/%s/cpuacct.usage' %
-                           host, 'r' ) as f:
-                    time[ host ] = float( f.read() )
-        for _ in range( duration ):
-            sleep( 1 )
-            for host in hosts:
-                if isinstance( host, RctlHost ):
-                    readTime = host.getCPUTime( pids[ host ] )
-                    # is procstat output per-core?
-                    outputs[ host ].append( ( readTime - time[ host ] )
-                                            / cores * 100 )
-                else:
-                    with open( '/sys/fs/cgroup/cpuacct/%s/cpuacct.usage' %
-                               host, 'r' ) as f:
-                        readTime = float( f.read() )
-                    outputs[ host ].append( ( ( readTime - time[ host ] )
-                                            / 1000000000 ) / cores * 100 )
-                time[ host ] = readTime
-        for h, pids in pids.items():
-            for pid in pids:
-                h.cmd( 'kill -9 %s' % pid )
-        cpu_fractions = []
-        for _host, outputs in outputs.items():
-            for pct in outputs:
-                cpu_fractions.append( pct )
+                usage = self.cpuUsageLoop( hosts, pids, duration, rate,
+                                           cores )
+        finally:
+            self.gather( [ ( h, 'kill -9 %s' % ' '.join( hpids ) )
+                           for h, hpids in zip( hosts, pids ) if hpids ] )
+        cpu_fractions = [ frac * 100 for fracs in usage for frac in fracs ]
         output( '*** Results: %s\n' % cpu_fractions )
         return cpu_fractions
 
-    # BL: I think this can be rewritten now that we have
-    # a real link class.
     def configLinkStatus( self, src, dst, status ):
         """Change status of src <-> dst links.
            src: node name
@@ -932,18 +1352,39 @@ def configLinkStatus( self, src, dst, status ):
         elif dst not in self.nameToNode:
             error( 'dst node not in network: %s\n' % dst )
         else:
-            src = self.nameToNode[ src ]
-            dst = self.nameToNode[ dst ]
-            connections = src.connectionsTo( dst )
-            if len( connections ) == 0:
-                error( 'src and dst not connected: %s %s\n' % ( src, dst) )
-            for srcIntf, dstIntf in connections:
-                result = srcIntf.ifconfig( status )
-                if result:
-                    error( 'link src status change failed: %s\n' % result )
-                result = dstIntf.ifconfig( status )
-                if result:
-                    error( 'link dst status change failed: %s\n' % result )
+            links = self.linksBetween( self.nameToNode[ src ],
+                                       self.nameToNode[ dst ] )
+            if not links:
+                error( 'src and dst not connected: %s %s\n' % ( src, dst ) )
+            self.configLinksStatus( links, status )
+
+    def configLinksStatus( self, links, status ):
+        """Change status of many links at once, e.g. to flap a set of
+           links; returns once every change has been made.
+           links: list of links
+           status: string {up, down}
+           returns: dict of intf -> error message, for failed changes"""
+        errors = Link.batchStatus( [ ( link, status ) for link in links ] )
+        for intf, err in errors.items():
+            error( 'link %s status change failed: %s\n' % ( intf, err ) )
+        return errors
+
+    def configLinkParams( self, src, dst, **params ):
+        """Change shaping parameters of src <-> dst links in place.
+           src: node name
+           dst: node name
+           params: parameters for Link.update(), e.g. bw, delay, loss"""
+        if src not in self.nameToNode:
+            error( 'src node not in network: %s\n' % src )
+        elif dst not in self.nameToNode:
+            error( 'dst node not in network: %s\n' % dst )
+        else:
+            links = self.linksBetween( self.nameToNode[ src ],
+                                       self.nameToNode[ dst ] )
+            if not links:
+                error( 'src and dst not connected: %s %s\n' % ( src, dst ) )
+            for link in links:
+                link.update( **params )
 
     def interact( self ):
         "Start network and run our simple CLI."
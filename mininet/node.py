@@ -54,6 +54,7 @@
 
 import os
 import re
+import socket
 from subprocess import Popen
 from time import sleep
 
@@ -69,6 +70,7 @@
     from mininet.linux.intf import Intf
     from mininet.linux.util import ( LO, DP_MODE, numCores, moveIntf,
                                      mountCgroups )
+    from mininet.linux.cgroup import Cgroup
     OVS_RCSTR = 'service openvswitch-switch start\n'
 else:
     from mininet.openbsd.node import Node
@@ -77,16 +79,20 @@
 
 
 from mininet.log import info, error, warn, debug
-from mininet.util import ( quietRun, errRun, errFail, retry )
+from mininet.util import ( quietRun, errRun, retry )
 from mininet.moduledeps import moduleDeps, pathCheck, TUN
 from mininet.link import Link, TCIntf, OVSIntf
+from mininet.ovsdb import ( ovsdbClient, oset, omap, BridgeMonitor,
+                            OVSDBError )
 from re import findall
 from distutils.version import StrictVersion
 
 
 class Host( Node ):
     "A host is simply a Node"
-    pass
+
+    # Node.config() doesn't look at command output
+    deferConfig = True
 
 
 class CgroupHost( Host ):
@@ -99,11 +105,11 @@ def __init__( self, name, sched='cfs', **kwargs ):
         if not CPULimitedHost.inited:
             CPULimitedHost.init()
         # Create a cgroup and move shell into it
-        self.cgroup = 'cpu,cpuacct,cpuset:/' + self.name
-        errFail( 'cgcreate -g ' + self.cgroup )
+        self.cgroup = Cgroup( self.name )
+        self.cgroup.create()
         # We don't add ourselves to a cpuset because you must
         # specify the cpu and memory placement first
-        errFail( 'cgclassify -g cpu,cpuacct:/%s %s' % ( self.name, self.pid ) )
+        self.cgroup.addPid( self.pid, resources=( 'cpu', 'cpuacct' ) )
         # BL: Setting the correct period/quota is tricky, particularly
         # for RT. RT allows very small quotas, but the overhead
         # seems to be high. CFS has a mininimum quota of 1 ms, but
@@ -113,31 +119,31 @@ def __init__( self, name, sched='cfs', **kwargs ):
         if sched == 'rt':
             self.checkRtGroupSched()
             self.rtprio = 20
+            # rt_runtime_us, remembered by cgroupSet() so that popen()
+            # doesn't have to read it
+            self.rtRuntime = 0
 
     def cgroupSet( self, param, value, resource='cpu' ):
         "Set a cgroup parameter and return its value"
-        cmd = 'cgset -r %s.%s=%s /%s' % (
-            resource, param, value, self.name )
-        quietRun( cmd )
-        nvalue = int( self.cgroupGet( param, resource ) )
-        if nvalue != value:
-            error( '*** error: cgroupSet: %s set to %s instead of %s\n'
-                   % ( param, nvalue, value ) )
+        self.cgroup.set( resource, param, value )
+        nvalue = self.cgroup.get( resource, param )
+        # The kernel may reformat lists, e.g. cpuset.cpus 0,1 -> 0-1
+        if isinstance( value, int ):
+            nvalue = int( nvalue )
+            if nvalue != value:
+                error( '*** error: cgroupSet: %s set to %s instead of %s\n'
+                       % ( param, nvalue, value ) )
+        if ( resource, param ) == ( 'cpu', 'rt_runtime_us' ):
+            self.rtRuntime = nvalue
         return nvalue
 
     def cgroupGet( self, param, resource='cpu' ):
         "Return value of cgroup parameter"
-        cmd = 'cgget -r %s.%s /%s' % (
-            resource, param, self.name )
-        return int( quietRun( cmd ).split()[ -1 ] )
+        return int( self.cgroup.get( resource, param ) )
 
     def cgroupDel( self ):
         "Clean up our cgroup"
-        # info( '*** deleting cgroup', self.cgroup, '\n' )
-        _out, _err, exitcode = errRun( 'cgdelete -r ' + self.cgroup )
-        # Sometimes cgdelete returns a resource busy error but still
-        # deletes the group; next attempt will give "no such file"
-        return exitcode == 0 or ( 'no such file' in _err.lower() )
+        return self.cgroup.delete()
 
     def popen( self, *args, **kwargs ):
         """Return a Popen() object in node's namespace
@@ -149,7 +155,7 @@ def popen( self, *args, **kwargs ):
         # if our cgroup is not given any cpu time,
         # we cannot assign the RR Scheduler.
         if self.sched == 'rt':
-            if int( self.cgroupGet( 'rt_runtime_us', 'cpu' ) ) <= 0:
+            if self.rtRuntime <= 0:
                 mncmd += [ '-r', str( self.rtprio ) ]
             else:
                 debug( '*** error: not enough cpu time available for %s.' %
@@ -240,7 +246,7 @@ def setCPUFrac( self, f, sched=None ):
         if sched == 'rt':
             # Set RT priority if necessary
             sched = self.chrt()
-        info( '(%s %d/%dus) ' % ( sched, setQuota, setPeriod ) )
+        info( '(%s %s/%sus) ' % ( sched, setQuota, setPeriod ) )
 
     def setCPUs( self, cores, mems=0 ):
         "Specify (real) cores that our cgroup can run on"
@@ -256,8 +262,7 @@ def setCPUs( self, cores, mems=0 ):
                         value=mems)
         # We have to do this here after we've specified
         # cpus and mems
-        errFail( 'cgclassify -g cpuset:/%s %s' % (
-                 self.name, self.pid ) )
+        self.cgroup.addPid( self.pid, resources=( 'cpuset', ) )
 
     def config( self, cpu=-1, cores=None, **params ):
         """cpu: desired overall system CPU fraction
@@ -458,6 +463,14 @@ def connected( self ):
         debug( 'Assuming', repr( self ), 'is connected to a controller\n' )
         return True
 
+    @classmethod
+    def connectionMonitor( cls ):
+        """Return an event source for connection changes, whose
+           poll( timeoutms ) waits for connected() to change and whose
+           close() stops monitoring, or None if connected() must be polled
+           (override this method)"""
+        return None
+
     def stop( self, deleteIntfs=True ):
         """Stop switch
            deleteIntfs: delete interfaces? (True)"""
@@ -576,7 +589,8 @@ class OVSSwitch( Switch ):
 
     def __init__( self, name, failMode='secure', datapath=DP_MODE,
                   inband=False, protocols=None,
-                  reconnectms=1000, stp=False, batch=False, **params ):
+                  reconnectms=1000, stp=False, batch=False, ovsdb=False,
+                  **params ):
         """name: name for switch
            failMode: controller loss behavior (secure|standalone)
            datapath: userspace or kernel mode (kernel|user)
@@ -585,7 +599,9 @@ def __init__( self, name, failMode='secure', datapath=DP_MODE,
                       Unspecified (or old OVS version) uses OVS default
            reconnectms: max reconnect timeout in ms (0/None for default)
            stp: enable STP (False, requires failMode=standalone)
-           batch: enable batch startup (False)"""
+           batch: enable batch startup (False)
+           ovsdb: talk to ovsdb-server directly instead of via
+                  ovs-vsctl (False)"""
         Switch.__init__( self, name, **params )
         self.failMode = failMode
         self.datapath = datapath
@@ -596,6 +612,8 @@ def __init__( self, name, failMode='secure', datapath=DP_MODE,
         self._uuids = []  # controller UUIDs
         self.batch = batch
         self.commands = []  # saved commands for batch startup
+        self.ovsdb = ovsdb
+        self.ops = []  # saved OVSDB operations for batch startup
 
     @classmethod
     def setup( cls ):
@@ -638,26 +656,49 @@ def vsctl( self, *args, **kwargs ):
             return self.cmd( 'ovs-vsctl', *args, **kwargs )
 
     @staticmethod
-    def TCReapply( intf ):
+    def TCReapply( *intfs ):
         """Unfortunately OVS and Mininet are fighting
            over tc queuing disciplines. As a quick hack/
-           workaround, we clear OVS's and reapply our own."""
-        if isinstance( intf, TCIntf ):
-            intf.config( **intf.params )
+           workaround, we clear OVS's and reapply our own,
+           but only where OVS replaced our root qdisc."""
+        TCIntf.reapply( intfs )
+
+    @staticmethod
+    def transact( ops, delete=() ):
+        """Perform OVSDB operations and wait for ovs-vswitchd to apply
+           them, as ovs-vsctl does
+           ops: OVSDB operations
+           delete: names of bridges to delete first, if they exist"""
+        db = ovsdbClient()
+        if delete:
+            uuids = db.bridgeUUIDs( [ str( name ) for name in delete ] )
+            ops = db.delBridgesOps( uuids.values() ) + ops
+        db.waitCfg( db.transact( *( ops + db.nextCfgOps() ) ) )
 
     def attach( self, intf ):
         "Connect a data port"
-        self.vsctl( 'add-port', self, intf )
+        if self.ovsdb:
+            self.transact( ovsdbClient().addPortOps(
+                self.name, **self.portRow( intf ) ) )
+        else:
+            self.vsctl( 'add-port', self, intf )
         self.cmd( 'ifconfig', intf, 'up' )
         self.TCReapply( intf )
 
     def detach( self, intf ):
         "Disconnect a data port"
-        self.vsctl( 'del-port', self, intf )
+        if self.ovsdb:
+            self.transact( ovsdbClient().delPortOps( self.name, str( intf ) ) )
+        else:
+            self.vsctl( 'del-port', self, intf )
 
     def controllerUUIDs( self, update=False ):
         """Return ovsdb UUIDs for our controllers
            update: update cached value"""
+        if self.ovsdb:
+            if not self._uuids or update:
+                self._uuids = ovsdbClient().controllerUUIDs( self.name )
+            return self._uuids
         if not self._uuids or update:
             controllers = self.cmd( 'ovs-vsctl -- get Bridge', self,
                                     'Controller' ).strip()
@@ -668,8 +709,32 @@ def controllerUUIDs( self, update=False ):
                                     for c in controllers.split( ',' ) ]
         return self._uuids
 
+    # Most recent BridgeMonitor, if any
+    bridgeMonitor = None
+
+    @classmethod
+    def connectionMonitor( cls ):
+        """Monitor ovsdb for controller connection changes
+           returns: BridgeMonitor, or None if ovsdb-server is unreachable"""
+        monitor = OVSSwitch.bridgeMonitor
+        if monitor is None or not monitor.active():
+            try:
+                monitor = BridgeMonitor( ovsdbClient() )
+            except ( socket.error, OVSDBError ) as e:
+                debug( '*** Cannot monitor ovsdb: %s\n' % e )
+                return None
+            OVSSwitch.bridgeMonitor = monitor
+        return monitor
+
     def connected( self ):
         "Are we connected to at least one of our controllers?"
+        monitor = self.bridgeMonitor
+        if monitor and monitor.active():
+            return ( monitor.connected( self.name ) or
+                     self.failMode == 'standalone' )
+        if self.ovsdb:
+            return ( ovsdbClient().bridgeConnected( self.name ) or
+                     self.failMode == 'standalone' )
         for uuid in self.controllerUUIDs():
             if 'true' in self.vsctl( '-- get Controller',
                                      uuid, 'is_connected' ):
@@ -703,12 +768,55 @@ def bridgeOpts( self ):
             opts += ' stp_enable=true'
         return opts
 
+    def portRow( self, intf ):
+        "Return OVSDB port description (for OVSDB.portOps()) for intf"
+        port = { 'name': str( intf ), 'ofport': self.ports[ intf ] }
+        if isinstance( intf, OVSIntf ):
+            intf1, intf2 = intf.link.intf1, intf.link.intf2
+            peer = intf1 if intf1 != intf else intf2
+            port.update( itype='patch', options={ 'peer': str( peer ) } )
+        return port
+
+    def bridgeOps( self, controllers ):
+        "Return OVSDB operations that create our bridge"
+        ports = [ self.portRow( intf ) for intf in self.intfList()
+                  if self.ports[ intf ] and not intf.IP() ]
+        targets = [ '%s:%s:%d' % ( c.protocol, c.IP(), c.port )
+                    for c in controllers ]
+        if self.listenPort:
+            targets.append( 'ptcp:%s' % self.listenPort )
+        ctls = [ { 'target': target } for target in targets ]
+        if self.reconnectms:
+            for ctl in ctls:
+                ctl[ 'max_backoff' ] = self.reconnectms
+        config = { 'datapath-id': self.dpid }
+        if not self.inband:
+            config[ 'disable-in-band' ] = 'true'
+        columns = { 'other_config': omap( config ),
+                    'fail_mode': self.failMode }
+        if self.datapath == 'user':
+            columns[ 'datapath_type' ] = 'netdev'
+        if self.protocols:
+            columns[ 'protocols' ] = oset( self.protocols.split( ',' ) )
+        if self.stp and self.failMode == 'standalone':
+            columns[ 'stp_enable' ] = True
+        return ovsdbClient().addBridgeOps( self.name, ports, ctls,
+                                           **columns )
+
     def start( self, controllers ):
         "Start up a new OVS OpenFlow switch using ovs-vsctl"
         if self.inNamespace:
             raise Exception(
                 'OVS kernel switch does not work in a namespace' )
         int( self.dpid, 16 )  # DPID must be a hex string
+        if self.ovsdb:
+            # One transaction, over our persistent ovsdb connection
+            self.ops = self.bridgeOps( controllers )
+            if not self.batch:
+                self.transact( self.ops, delete=[ self ] )
+                self.ops = []
+                self.TCReapply( *self.intfList() )
+            return
         # Command to add interfaces
         intfs = ''.join( ' -- add-port %s %s' % ( self, intf ) +
                          self.intfOpts( intf )
@@ -739,8 +847,7 @@ def start( self, controllers ):
                     intfs )
         # If necessary, restore TC config overwritten by OVS
         if not self.batch:
-            for intf in self.intfList():
-                self.TCReapply( intf )
+            self.TCReapply( *self.intfList() )
 
     # This should be ~ int( quietRun( 'getconf ARG_MAX' ) ),
     # but the real limit seems to be much lower
@@ -752,8 +859,18 @@ def batchStartup( cls, switches, run=errRun ):
            switches: switches to start up
            run: function to run commands (errRun)"""
         info( '...' )
+        # Switches using ovsdb are created in a single transaction
+        dbswitches = [ s for s in switches if s.ovsdb ]
+        if dbswitches:
+            cls.transact( sum( ( s.ops for s in dbswitches ), [] ),
+                          delete=dbswitches )
+            for switch in dbswitches:
+                switch.ops = []
+                switch.batch = False
         cmds = 'ovs-vsctl'
         for switch in switches:
+            if switch.ovsdb:
+                continue
             if switch.isOldOVS():
                 # Ideally we'd optimize this also
                 run( 'ovs-vsctl del-br %s' % switch )
@@ -769,16 +886,16 @@ def batchStartup( cls, switches, run=errRun ):
         if cmds:
             run( cmds, shell=True )
         # Reapply link config if necessary...
-        for switch in switches:
-            for intf in switch.intfs.itervalues():
-                if isinstance( intf, TCIntf ):
-                    intf.config( **intf.params )
+        cls.TCReapply( *sum( ( s.intfList() for s in switches ), [] ) )
         return switches
 
     def stop( self, deleteIntfs=True ):
         """Terminate OVS switch.
            deleteIntfs: delete interfaces? (True)"""
-        self.cmd( 'ovs-vsctl del-br', self )
+        if self.ovsdb:
+            self.transact( [], delete=[ self ] )
+        else:
+            self.cmd( 'ovs-vsctl del-br', self )
         if self.datapath == 'user':
             self.cmd( deleteCmd( self ) )
         super( OVSSwitch, self ).stop( deleteIntfs )
@@ -790,8 +907,13 @@ def batchShutdown( cls, switches, run=errRun ):
         if switches and not switches[ 0 ].isOldOVS():
             delcmd = '--if-exists ' + delcmd
         # First, delete them all from ovsdb
-        run( 'ovs-vsctl ' +
-             ' -- '.join( delcmd % s for s in switches ) )
+        dbswitches = [ s for s in switches if s.ovsdb ]
+        if dbswitches:
+            cls.transact( [], delete=dbswitches )
+        vsswitches = [ s for s in switches if not s.ovsdb ]
+        if vsswitches:
+            run( 'ovs-vsctl ' +
+                 ' -- '.join( delcmd % s for s in vsswitches ) )
         # Next, shut down all of the processes
         pids = ' '.join( str( switch.pid ) for switch in switches )
         run( 'kill -HUP ' + pids )
@@ -28,6 +28,7 @@ def ifconfig( self, *args ):
 
     def setMAC( self, macstr ):
         self.mac = macstr
+        self.staleAddrs.discard( 'mac' )
         return self.ifconfig( 'lladdr', macstr )
 
     def rename( self, newname ):
@@ -0,0 +1,397 @@
+"""
+ovsdb.py: a minimal OVSDB (RFC 7047) JSON-RPC client for Open vSwitch
+
+ovs-vsctl opens a new connection to ovsdb-server, downloads the parts
+of the database it needs, and commits a transaction every time it runs.
+For large networks, it is much faster to keep a single connection open
+and send transactions directly, which is what OVSDB does:
+
+  db = OVSDB()
+  db.transact( *db.addBridgeOps( 's1', ports=[ 's1-eth1' ] ) )
+  db.bridgeConnected( 's1' )
+
+OVSDB also supports monitors, which call a function whenever the rows
+of a table change, so that we can wait for events such as switches
+connecting to controllers rather than polling for them.
+
+Only the parts of the protocol Mininet needs are implemented: transact,
+monitor, monitor_cancel and replying to echo requests.
+"""
+
+import json
+import os
+import socket
+from select import poll, POLLIN
+from time import time
+
+from mininet.log import debug
+
+OVSDB_SOCK = '/var/run/openvswitch/db.sock'
+DB = 'Open_vSwitch'
+
+
+class OVSDBError( Exception ):
+    "Error returned by ovsdb-server"
+    pass
+
+
+# Encoding of OVSDB values
+
+def oset( values ):
+    "Return OVSDB set of values"
+    return [ 'set', list( values ) ]
+
+def omap( pairs ):
+    "Return OVSDB map from dict or list of ( key, value )"
+    if isinstance( pairs, dict ):
+        pairs = sorted( pairs.items() )
+    return [ 'map', [ [ k, v ] for k, v in pairs ] ]
+
+def uuid( value ):
+    "Return OVSDB reference to row with given UUID"
+    return [ 'uuid', value ]
+
+def namedUuid( name ):
+    "Return OVSDB reference to a row inserted in the same transaction"
+    return [ 'named-uuid', name ]
+
+def atoms( value ):
+    "Return list of atoms in an OVSDB value (which may be a set)"
+    if isinstance( value, list ) and value and value[ 0 ] == 'set':
+        return value[ 1 ]
+    return [ value ]
+
+def rowName( prefix, name ):
+    "Return a legal uuid-name for a row based on name"
+    return prefix + ''.join( c if c.isalnum() else '_' for c in str( name ) )
+
+
+class OVSDB( object ):
+    "Persistent JSON-RPC connection to ovsdb-server"
+
+    def __init__( self, path=OVSDB_SOCK, db=DB ):
+        """path: unix socket of ovsdb-server
+           db: database name"""
+        self.path = path
+        self.db = db
+        self.sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        self.sock.connect( path )
+        self.poller = poll()
+        self.poller.register( self.sock.fileno(), POLLIN )
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.nextId = 0
+        self.replies = {}  # id -> reply message
+        self.monitors = {}  # monitor id -> callback
+        self.curCfg = None  # last cur_cfg seen by our cfg monitor
+
+    def close( self ):
+        "Close our connection"
+        self.sock.close()
+
+    # JSON-RPC
+
+    def send( self, msg ):
+        "Send a JSON-RPC message"
+        self.sock.sendall( json.dumps( msg ).encode() )
+
+    def receive( self, timeoutms=None ):
+        """Receive and handle one message
+           timeoutms: timeout in ms or None to wait indefinitely
+           returns: True if a message was handled"""
+        while True:
+            buf = self.buf.lstrip()
+            if buf:
+                try:
+                    msg, end = self.decoder.raw_decode( buf )
+                except ValueError:
+                    # Incomplete message
+                    pass
+                else:
+                    self.buf = buf[ end: ]
+                    self.handle( msg )
+                    return True
+            if not self.poller.poll( timeoutms ):
+                return False
+            data = self.sock.recv( 65536 )
+            if not data:
+                raise OVSDBError( 'ovsdb-server closed connection' )
+            self.buf = buf + data.decode()
+
+    def handle( self, msg ):
+        "Handle a reply, notification or request from the server"
+        method = msg.get( 'method' )
+        if method == 'echo':
+            self.send( { 'id': msg[ 'id' ], 'result': msg[ 'params' ],
+                         'error': None } )
+        elif method == 'update':
+            monitorId, updates = msg[ 'params' ]
+            callback = self.monitors.get( monitorId )
+            if callback:
+                callback( updates )
+        elif method is None:
+            self.replies[ msg[ 'id' ] ] = msg
+
+    def call( self, method, *params ):
+        """Make a JSON-RPC call and wait for its result
+           raises OVSDBError if the call fails"""
+        self.nextId += 1
+        msgId = self.nextId
+        self.send( { 'method': method, 'params': list( params ),
+                     'id': msgId } )
+        while msgId not in self.replies:
+            self.receive()
+        reply = self.replies.pop( msgId )
+        if reply.get( 'error' ):
+            raise OVSDBError( '%s: %s' % ( method, reply[ 'error' ] ) )
+        return reply[ 'result' ]
+
+    def poll( self, timeoutms=0 ):
+        """Handle any notifications that arrive within timeoutms
+           returns: True if any messages were handled"""
+        handled = False
+        while self.receive( timeoutms ):
+            handled = True
+            timeoutms = 0
+        return handled
+
+    # Transactions and monitors
+
+    def transact( self, *ops ):
+        """Perform a transaction
+           ops: OVSDB operations
+           returns: list of operation results
+           raises OVSDBError if any operation fails"""
+        debug( '*** OVSDB transact: %s\n' % ( ops, ) )
+        results = self.call( 'transact', self.db, *ops )
+        errors = [ r for r in results if r and 'error' in r ]
+        if errors:
+            raise OVSDBError( 'transact: %s' % errors )
+        return results
+
+    def monitor( self, tables, callback ):
+        """Monitor tables and call callback( updates ) with their initial
+           contents and whenever they change
+           tables: dict of table name -> list of columns
+           returns: monitor id, for cancel()"""
+        self.nextId += 1
+        monitorId = 'mn-monitor-%d' % self.nextId
+        requests = { table: { 'columns': columns }
+                     for table, columns in tables.items() }
+        self.monitors[ monitorId ] = callback
+        callback( self.call( 'monitor', self.db, monitorId, requests ) )
+        return monitorId
+
+    def cancel( self, monitorId ):
+        "Cancel a monitor"
+        self.monitors.pop( monitorId, None )
+        self.call( 'monitor_cancel', monitorId )
+
+    def select( self, table, columns, where=None ):
+        "Return rows of table (as dicts of the given columns)"
+        return self.transact( { 'op': 'select', 'table': table,
+                                'where': where or [],
+                                'columns': columns } )[ 0 ][ 'rows' ]
+
+    # Waiting for ovs-vswitchd, as ovs-vsctl does
+
+    @staticmethod
+    def nextCfgOps():
+        """Operations that ask ovs-vswitchd to acknowledge a transaction
+           by bumping next_cfg, and return its new value last"""
+        return [ { 'op': 'mutate', 'table': 'Open_vSwitch', 'where': [],
+                   'mutations': [ [ 'next_cfg', '+=', 1 ] ] },
+                 { 'op': 'select', 'table': 'Open_vSwitch', 'where': [],
+                   'columns': [ 'next_cfg' ] } ]
+
+    def _cfgUpdate( self, updates ):
+        "Monitor callback: track cur_cfg"
+        for row in updates.get( 'Open_vSwitch', {} ).values():
+            new = row.get( 'new' )
+            if new and 'cur_cfg' in new:
+                self.curCfg = new[ 'cur_cfg' ]
+
+    def waitCfg( self, results, timeout=None ):
+        """Wait until ovs-vswitchd has applied a transaction that
+           included nextCfgOps()
+           results: transaction results
+           timeout: seconds to wait, or None to wait indefinitely
+           returns: True if the transaction was applied in time"""
+        nextCfg = results[ -1 ][ 'rows' ][ 0 ][ 'next_cfg' ]
+        if self.curCfg is None:
+            self.monitor( { 'Open_vSwitch': [ 'cur_cfg' ] }, self._cfgUpdate )
+        end = None if timeout is None else time() + timeout
+        while self.curCfg < nextCfg:
+            remaining = None if end is None else int( ( end - time() ) * 1000 )
+            if remaining is not None and remaining <= 0:
+                return False
+            self.receive( remaining )
+        return True
+
+    # Bridges, ports and controllers
+
+    def bridgeUUIDs( self, names=None ):
+        """Return dict of bridge name -> UUID
+           names: bridge names to look up, or None for all bridges"""
+        rows = self.select( 'Bridge', [ 'name', '_uuid' ] )
+        return { row[ 'name' ]: row[ '_uuid' ][ 1 ] for row in rows
+                 if names is None or row[ 'name' ] in names }
+
+    @staticmethod
+    def delBridgesOps( uuids ):
+        "Return operations that delete bridges with the given UUIDs"
+        if not uuids:
+            return []
+        # Ports, interfaces and controllers are garbage collected
+        return [ { 'op': 'mutate', 'table': 'Open_vSwitch', 'where': [],
+                   'mutations': [ [ 'bridges', 'delete',
+                                    oset( uuid( u ) for u in uuids ) ] ] } ]
+
+    @staticmethod
+    def portOps( bridge, name, ofport=None, itype=None, options=None ):
+        """Return ( operations, port reference ) to create a port
+           bridge: bridge name (for unique row names)
+           name: port/interface name
+           ofport: requested OpenFlow port number (optional)
+           itype: interface type (optional)
+           options: dict of interface options (optional)"""
+        irow = { 'name': name }
+        if ofport is not None:
+            irow[ 'ofport_request' ] = ofport
+        if itype:
+            irow[ 'type' ] = itype
+        if options:
+            irow[ 'options' ] = omap( options )
+        iname, pname = rowName( 'i_', name ), rowName( 'p_', name )
+        ops = [ { 'op': 'insert', 'table': 'Interface', 'row': irow,
+                  'uuid-name': iname },
+                { 'op': 'insert', 'table': 'Port',
+                  'row': { 'name': name, 'interfaces': namedUuid( iname ) },
+                  'uuid-name': pname } ]
+        return ops, namedUuid( pname )
+
+    @classmethod
+    def addBridgeOps( cls, name, ports=(), controllers=(), **columns ):
+        """Return operations that create a bridge
+           name: bridge name
+           ports: list of port names or dicts of portOps() arguments
+           controllers: list of dicts of Controller columns
+           columns: additional Bridge columns (already encoded)"""
+        ops, portRefs = cls.portOps( name, name, itype='internal' )
+        portRefs = [ portRefs ]
+        for port in ports:
+            if not isinstance( port, dict ):
+                port = { 'name': port }
+            portops, ref = cls.portOps( name, **port )
+            ops += portops
+            portRefs.append( ref )
+        ctlRefs = []
+        for i, controller in enumerate( controllers ):
+            cname = rowName( 'c%d_' % i, name )
+            ops.append( { 'op': 'insert', 'table': 'Controller',
+                          'row': controller, 'uuid-name': cname } )
+            ctlRefs.append( namedUuid( cname ) )
+        row = dict( columns, name=name, ports=oset( portRefs ),
+                    controller=oset( ctlRefs ) )
+        bname = rowName( 'b_', name )
+        ops += [ { 'op': 'insert', 'table': 'Bridge', 'row': row,
+                   'uuid-name': bname },
+                 { 'op': 'mutate', 'table': 'Open_vSwitch', 'where': [],
+                   'mutations': [ [ 'bridges', 'insert',
+                                    oset( [ namedUuid( bname ) ] ) ] ] } ]
+        return ops
+
+    def addPortOps( self, bridge, **port ):
+        "Return operations that add a port (see portOps()) to a bridge"
+        ops, ref = self.portOps( bridge, **port )
+        ops.append( { 'op': 'mutate', 'table': 'Bridge',
+                      'where': [ [ 'name', '==', bridge ] ],
+                      'mutations': [ [ 'ports', 'insert',
+                                       oset( [ ref ] ) ] ] } )
+        return ops
+
+    def delPortOps( self, bridge, name ):
+        "Return operations that remove a port from a bridge"
+        rows = self.select( 'Port', [ '_uuid' ], [ [ 'name', '==', name ] ] )
+        return [ { 'op': 'mutate', 'table': 'Bridge',
+                   'where': [ [ 'name', '==', bridge ] ],
+                   'mutations': [ [ 'ports', 'delete',
+                                    oset( row[ '_uuid' ] for row in rows ) ]
+                                  ] } ]
+
+    def controllerUUIDs( self, bridge ):
+        "Return UUIDs of a bridge's controllers"
+        rows = self.select( 'Bridge', [ 'controller' ],
+                            [ [ 'name', '==', bridge ] ] )
+        return [ ref[ 1 ] for row in rows
+                 for ref in atoms( row[ 'controller' ] ) ]
+
+    def bridgeConnected( self, bridge ):
+        "Is bridge connected to at least one of its controllers?"
+        uuids = self.controllerUUIDs( bridge )
+        if not uuids:
+            return False
+        rows = self.select( 'Controller', [ '_uuid', 'is_connected' ] )
+        return any( row[ 'is_connected' ] is True for row in rows
+                    if row[ '_uuid' ][ 1 ] in uuids )
+
+
+class BridgeMonitor( object ):
+    """Track which bridges are connected to a controller using an OVSDB
+       monitor on Bridge.controller and Controller.is_connected, so that
+       we can wait for connections without polling"""
+
+    def __init__( self, db ):
+        "db: OVSDB connection"
+        self.db = db
+        self.bridges = {}  # Bridge UUID -> row
+        self.controllers = {}  # Controller UUID -> row
+        self.monitorId = db.monitor(
+            { 'Bridge': [ 'name', 'controller' ],
+              'Controller': [ 'is_connected' ] }, self.update )
+
+    def update( self, updates ):
+        "Monitor callback: apply row updates"
+        for table, rows in ( ( 'Bridge', self.bridges ),
+                             ( 'Controller', self.controllers ) ):
+            for rowId, change in updates.get( table, {} ).items():
+                new = change.get( 'new' )
+                if new is None:
+                    rows.pop( rowId, None )
+                else:
+                    rows.setdefault( rowId, {} ).update( new )
+
+    def connected( self, bridge ):
+        "Is bridge connected to at least one of its controllers?"
+        for row in self.bridges.values():
+            if row.get( 'name' ) == bridge:
+                return any( self.controllers.get( ref[ 1 ], {} ).get(
+                    'is_connected' ) is True
+                    for ref in atoms( row.get( 'controller' ) ) )
+        return False
+
+    def poll( self, timeoutms=0 ):
+        """Wait up to timeoutms for updates
+           returns: True if any updates arrived"""
+        return self.db.poll( timeoutms )
+
+    def active( self ):
+        "Is our monitor still running?"
+        return self.monitorId is not None
+
+    def close( self ):
+        "Cancel our monitor"
+        if self.monitorId:
+            self.db.cancel( self.monitorId )
+            self.monitorId = None
+
+
+_client = None
+
+def ovsdbClient( path=None ):
+    "Return shared OVSDB connection, connecting if necessary"
+    global _client  # pylint: disable=global-statement
+    path = path or os.environ.get( 'OVSDB_SOCK', OVSDB_SOCK )
+    if _client is None or _client.path != path:
+        _client = OVSDB( path )
+    return _client
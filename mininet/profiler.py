@@ -0,0 +1,127 @@
+"""
+profiler.py: startup and shutdown phase profiling for Mininet
+
+Mininet records how long each phase of building, starting and
+stopping a network takes, how long each node class takes to create
+and start its nodes, and how many processes were spawned and shell
+round trips (commands sent to node shells) were made in each phase:
+
+  net = Mininet( topo )
+  net.start()
+  net.profiler.printReport()
+  report = net.profiler.report()  # or net.profiler.json()
+
+Processes and round trips are counted globally by count(), which is
+called from the places in Mininet that spawn processes or send
+commands to shells; phases record the difference in counts.
+"""
+
+import json
+from contextlib import contextmanager
+from time import time
+
+from mininet.log import output
+
+# Global counters of processes spawned and shell round trips
+counters = { 'processes': 0, 'roundtrips': 0 }
+
+def count( name, n=1 ):
+    "Increment global counter name by n"
+    counters[ name ] = counters.get( name, 0 ) + n
+
+def className( cls ):
+    "Return name of a node class, which may be a partial() or instance"
+    cls = getattr( cls, 'func', cls )
+    if not isinstance( cls, type ):
+        cls = type( cls )
+    return cls.__name__
+
+
+class Profiler( object ):
+    "Record wall time and counts per phase and per node class"
+
+    def __init__( self ):
+        self.order = []  # phase names, in order of first use
+        self.phases = {}  # phase name -> stats
+        self.classes = {}  # action -> class name -> stats
+        self.depth = 0  # nesting depth of current phase
+
+    @staticmethod
+    def newStats():
+        "Return empty stats dict"
+        stats = { 'time': 0.0, 'calls': 0 }
+        stats.update( ( key, 0 ) for key in counters )
+        return stats
+
+    @staticmethod
+    def addStats( stats, start, before ):
+        "Add time since start and counts since before to stats"
+        stats[ 'time' ] += time() - start
+        stats[ 'calls' ] += 1
+        for key, value in counters.items():
+            stats[ key ] = stats.get( key, 0 ) + value - before.get( key, 0 )
+
+    @contextmanager
+    def phase( self, name ):
+        """Context manager: record time and counts for phase name.
+           Phases may be nested, and are accumulated if repeated."""
+        if name not in self.phases:
+            self.phases[ name ] = self.newStats()
+            self.phases[ name ][ 'depth' ] = self.depth
+            self.order.append( name )
+        before, start = dict( counters ), time()
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            self.addStats( self.phases[ name ], start, before )
+
+    @contextmanager
+    def nodeClass( self, action, cls ):
+        """Context manager: record time and counts for action
+           (e.g. 'create' or 'start') on a node of class cls"""
+        stats = self.classes.setdefault( action, {} )
+        name = className( cls )
+        if name not in stats:
+            stats[ name ] = self.newStats()
+        before, start = dict( counters ), time()
+        try:
+            yield
+        finally:
+            self.addStats( stats[ name ], start, before )
+
+    def report( self ):
+        """Return profile as a dict:
+           phases: list of per-phase stats (with name), in order
+           classes: dict of action -> class name -> stats
+           counters: current global counters"""
+        phases = [ dict( self.phases[ name ], name=name )
+                   for name in self.order ]
+        return { 'phases': phases,
+                 'classes': self.classes,
+                 'counters': dict( counters ) }
+
+    def json( self, **kwargs ):
+        "Return profile report as JSON"
+        kwargs.setdefault( 'indent', 2 )
+        kwargs.setdefault( 'sort_keys', True )
+        return json.dumps( self.report(), **kwargs )
+
+    def printReport( self ):
+        "Print profile report as a table"
+        fmt = '%-28s %10s %6s %10s %10s\n'
+        output( '*** Profile:\n' )
+        output( fmt % ( 'phase', 'seconds', 'calls', 'processes',
+                        'roundtrips' ) )
+        for name in self.order:
+            stats = self.phases[ name ]
+            output( fmt % ( '  ' * stats[ 'depth' ] + name,
+                            '%.3f' % stats[ 'time' ], stats[ 'calls' ],
+                            stats[ 'processes' ], stats[ 'roundtrips' ] ) )
+        for action in sorted( self.classes ):
+            for name, stats in sorted( self.classes[ action ].items() ):
+                output( fmt % ( '%s %s' % ( action, name ),
+                                '%.3f' % stats[ 'time' ], stats[ 'calls' ],
+                                stats[ 'processes' ],
+                                stats[ 'roundtrips' ] ) )
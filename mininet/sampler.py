@@ -0,0 +1,131 @@
+"""
+sampler.py: sample the CPU time used by hosts
+
+CPUSampler reads the CPU time counters of many hosts in a single pass,
+at a fixed rate, into a NumPy array of hosts x samples:
+
+  sampler = CPUSampler( net.hosts )
+  usage = sampler.sample( duration=5, rate=10 )
+  summary = sampler.summary( usage )
+  sampler.close()
+
+Each sample is the fraction of the whole system's CPU time that a host
+used during the sampling interval, as for setCPUFrac().
+
+On Linux, the cgroup accounting file of each CPULimitedHost is opened
+once and re-read for each sample. On FreeBSD, a single ps(1) lists the
+CPU time of the processes in every jail.
+"""
+
+import os
+from time import sleep, time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+plat = os.uname()[ 0 ]
+if plat == 'FreeBSD':
+    from mininet.freebsd.util import numCores
+elif plat == 'Linux':
+    from mininet.linux.util import numCores
+else:
+    from mininet.openbsd.util import numCores
+
+from mininet.util import quietRun
+
+
+def cpuSeconds( cputime ):
+    "Return seconds from ps CPU time, e.g. 1:02:03.45 or 3:02.10"
+    seconds = 0.0
+    for field in cputime.split( ':' ):
+        seconds = seconds * 60 + float( field )
+    return seconds
+
+def jailCPUTimes():
+    "Return dict of jail ID -> total CPU seconds of its processes"
+    times = {}
+    for line in quietRun( 'ps -ax -o jid= -o time=' ).splitlines():
+        fields = line.split()
+        if len( fields ) == 2:
+            times[ fields[ 0 ] ] = ( times.get( fields[ 0 ], 0.0 ) +
+                                     cpuSeconds( fields[ 1 ] ) )
+    return times
+
+
+class CPUSampler( object ):
+    "Sample the CPU usage of many hosts into a NumPy array"
+
+    def __init__( self, hosts, cores=None ):
+        """hosts: CPU-limited hosts to sample
+           cores: number of cores in the system (default: all)"""
+        if not self.available():
+            raise Exception( 'CPUSampler requires numpy' )
+        self.hosts = list( hosts )
+        self.cores = cores or numCores()
+        self.files = None
+        self.times = None
+
+    @staticmethod
+    def available():
+        "Is numpy, which we require, installed?"
+        return np is not None
+
+    def open( self ):
+        "Open the CPU time counters of our hosts"
+        if plat == 'Linux' and self.files is None:
+            self.files = [ open( host.cgroup.usagePath() )
+                           for host in self.hosts ]
+
+    def close( self ):
+        "Close the CPU time counters of our hosts"
+        for f in self.files or []:
+            f.close()
+        self.files = None
+
+    def read( self ):
+        "Return array of CPU seconds used so far by each host"
+        values = np.zeros( len( self.hosts ) )
+        if plat == 'Linux':
+            self.open()
+            for i, f in enumerate( self.files ):
+                f.seek( 0 )
+                values[ i ] = self.hosts[ i ].cgroup.parseUsage( f.read() )
+        else:
+            times = jailCPUTimes()
+            for i, host in enumerate( self.hosts ):
+                values[ i ] = times.get( getattr( host, 'jid', None ), 0.0 )
+        return values
+
+    def sample( self, duration, rate=1.0 ):
+        """Sample CPU usage of each host at a fixed rate
+           duration: seconds to sample for
+           rate: samples per second
+           returns: hosts x samples array of the fraction of system
+                    CPU time used; sample times are in self.times"""
+        samples = max( 1, int( round( duration * rate ) ) )
+        interval = 1.0 / rate
+        times = np.zeros( samples + 1 )
+        usage = np.zeros( ( len( self.hosts ), samples + 1 ) )
+        start = time()
+        for i in range( samples + 1 ):
+            # Keep to the schedule, however long each read takes
+            delay = start + i * interval - time()
+            if delay > 0:
+                sleep( delay )
+            before = time()
+            usage[ :, i ] = self.read()
+            times[ i ] = ( before + time() ) / 2
+        self.times = times[ 1: ]
+        return np.diff( usage, axis=1 ) / np.diff( times ) / self.cores
+
+    def summary( self, usage ):
+        """Return per-host utilization statistics
+           usage: array returned by sample()
+           returns: dict of host -> dict of mean, min, max and std"""
+        stats = { 'mean': usage.mean( axis=1 ), 'min': usage.min( axis=1 ),
+                  'max': usage.max( axis=1 ), 'std': usage.std( axis=1 ) }
+        return { host: { key: float( values[ i ] )
+                         for key, values in stats.items() }
+                 for i, host in enumerate( self.hosts ) }
@@ -0,0 +1,217 @@
+"""
+telemetry.py: sample interface counters while a network runs
+
+Telemetry reads the receive and transmit byte, packet and drop
+counters of every interface in a network, at a fixed interval, from a
+background thread, into a NumPy ring buffer of the most recent
+samples:
+
+  net.start()
+  telemetry = net.startTelemetry( interval=.1, size=600 )
+  ...
+  times, rates = telemetry.linkRates( net.links[ 0 ] )
+  net.stop()
+
+Counters are read in bulk, one read per network namespace rather than
+one per interface: on Linux, /proc/<pid>/net/dev of a process in each
+namespace, which is opened once and re-read for each sample; on
+FreeBSD, one netstat(1) per jail; on OpenBSD, where every interface is
+visible from the host, a single netstat(1).
+"""
+
+import os
+from threading import Thread, Event, Lock
+from time import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from mininet.log import debug
+from mininet.util import quietRun
+
+plat = os.uname()[ 0 ]
+
+# Counters, in the order they are stored
+FIELDS = ( 'rx_bytes', 'rx_packets', 'rx_dropped',
+           'tx_bytes', 'tx_packets', 'tx_dropped' )
+
+# Columns of /proc/net/dev for each of FIELDS
+PROC_COLUMNS = ( 0, 1, 3, 8, 9, 11 )
+
+# netstat -i columns for each of FIELDS
+NETSTAT_COLUMNS = ( 'Ibytes', 'Ipkts', 'Idrop', 'Obytes', 'Opkts', 'Drop' )
+
+
+def parseProcNetDev( text ):
+    """Parse /proc/net/dev
+       returns: dict of interface name -> list of counters (see FIELDS)"""
+    counters = {}
+    for line in text.splitlines()[ 2: ]:
+        name, values = line.split( ':', 1 )
+        values = values.split()
+        counters[ name.strip() ] = [ int( values[ c ] )
+                                     for c in PROC_COLUMNS ]
+    return counters
+
+def parseNetstat( text ):
+    """Parse link-level rows of netstat -ibdn (BSD); counters that
+       this netstat doesn't report are 0
+       returns: dict of interface name -> list of counters"""
+    lines = text.splitlines()
+    if not lines:
+        return {}
+    header = lines[ 0 ].split()
+    counters = {}
+    for line in lines[ 1: ]:
+        fields = line.split()
+        if len( fields ) < 3 or not fields[ 2 ].startswith( '<Link' ):
+            continue
+        # Address may be missing, so match counters from the right
+        values = dict( zip( reversed( header ), reversed( fields ) ) )
+        counters[ fields[ 0 ] ] = [ int( values.get( c, 0 ) )
+                                    if values.get( c, '-' ) != '-' else 0
+                                    for c in NETSTAT_COLUMNS ]
+    return counters
+
+
+class Telemetry( object ):
+    "Sample the counters of every interface in a network"
+
+    def __init__( self, net, interval=.1, size=600 ):
+        """net: Mininet object
+           interval: seconds between samples
+           size: number of samples to keep"""
+        if np is None:
+            raise Exception( 'Telemetry requires numpy' )
+        self.net = net
+        self.interval = interval
+        self.size = size
+        self.intfs = []
+        self.index = {}  # intf -> row
+        self.namespaces = {}  # namespace -> ( source, { name: row } )
+        for node in net.controllers + net.switches + net.hosts:
+            key = self.namespace( node )
+            rows = self.namespaces.setdefault( key, ( node, {} ) )[ 1 ]
+            for intf in node.intfList():
+                if intf.name == 'lo' or intf in self.index:
+                    continue
+                self.index[ intf ] = len( self.intfs )
+                rows[ intf.name ] = len( self.intfs )
+                self.intfs.append( intf )
+        self.times = np.zeros( size )
+        self.samples = np.zeros( ( size, len( self.intfs ), len( FIELDS ) ) )
+        self.count = 0  # samples taken so far
+        self.files = {}  # namespace -> open /proc/<pid>/net/dev
+        self.lock = Lock()
+        self.stopped = Event()
+        self.thread = None
+
+    @staticmethod
+    def namespace( node ):
+        "Return key for node's network namespace"
+        if plat == 'OpenBSD' or not node.inNamespace:
+            return None
+        return node.pid
+
+    def readCounters( self, key, node ):
+        """Return counters of the interfaces in a namespace
+           key: namespace key
+           node: a node in the namespace"""
+        if plat == 'Linux':
+            f = self.files.get( key )
+            if f is None:
+                path = ( '/proc/%d/net/dev' % node.pid if key
+                         else '/proc/net/dev' )
+                f = self.files[ key ] = open( path )
+            f.seek( 0 )
+            return parseProcNetDev( f.read() )
+        jail = getattr( node, 'jid', None ) if key else None
+        cmd = 'netstat -ibdn' + ( ' -j %s' % jail if jail else '' )
+        return parseNetstat( quietRun( cmd ) )
+
+    def sample( self ):
+        "Read every interface's counters into the ring buffer"
+        values = np.zeros( ( len( self.intfs ), len( FIELDS ) ) )
+        start = time()
+        for key, ( node, rows ) in self.namespaces.items():
+            if not rows:
+                continue
+            try:
+                counters = self.readCounters( key, node )
+            except ( IOError, OSError ) as e:
+                debug( '*** telemetry: could not read counters for %s: %s\n'
+                       % ( node, e ) )
+                continue
+            for name, row in rows.items():
+                if name in counters:
+                    values[ row ] = counters[ name ]
+        with self.lock:
+            slot = self.count % self.size
+            self.times[ slot ] = ( start + time() ) / 2
+            self.samples[ slot ] = values
+            self.count += 1
+
+    def run( self ):
+        "Sample every interval until stopped"
+        start = time()
+        while not self.stopped.is_set():
+            self.sample()
+            # Keep to the schedule, however long each sample takes
+            delay = self.interval - ( time() - start ) % self.interval
+            self.stopped.wait( delay )
+
+    def start( self ):
+        "Start sampling in a background thread"
+        if self.thread:
+            return
+        self.stopped.clear()
+        self.thread = Thread( target=self.run, name='telemetry' )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop( self ):
+        "Stop sampling and close counter files"
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def history( self, samples=None ):
+        """Return stored samples, oldest first
+           samples: number of most recent samples (default: all)
+           returns: times array, samples x intfs x FIELDS array"""
+        with self.lock:
+            n = min( self.count, self.size )
+            if samples is not None:
+                n = min( n, samples )
+            order = np.arange( self.count - n, self.count ) % self.size
+            return self.times[ order ], self.samples[ order ]
+
+    def rates( self, samples=None ):
+        """Return counter rates per second between successive samples
+           samples: number of most recent samples (default: all)
+           returns: times array, ( samples - 1 ) x intfs x FIELDS array"""
+        times, counters = self.history( samples )
+        dt = np.diff( times )[ :, None, None ]
+        return times[ 1: ], np.diff( counters, axis=0 ) / dt
+
+    def intfRates( self, intf, samples=None ):
+        """Return counter rates of intf
+           returns: times array, samples x FIELDS array"""
+        times, rates = self.rates( samples )
+        return times, rates[ :, self.index[ intf ] ]
+
+    def linkRates( self, link, field='bytes', samples=None ):
+        """Return rates in each direction of link, as transmitted by
+           each end, e.g. field='bytes' gives bytes per second
+           returns: times array, samples x 2 array of rates from
+                    intf1 to intf2 and from intf2 to intf1"""
+        times, rates = self.rates( samples )
+        column = FIELDS.index( 'tx_' + field )
+        rows = [ self.index[ link.intf1 ], self.index[ link.intf2 ] ]
+        return times, rates[ :, rows, column ]
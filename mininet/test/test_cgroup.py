@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test the mapping of cgroup parameters to files, on a fake
+   cgroup v1 or v2 hierarchy in a temporary directory."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mininet.linux.cgroup import Cgroup, enableControllers, readFile
+from mininet.log import setLogLevel
+
+
+class testCgroupCommon( object ):
+    "Fake cgroup hierarchy in a temporary directory (common code)"
+
+    def setUp( self ):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown( self ):
+        "Remove fake hierarchy"
+        shutil.rmtree( self.root )
+
+    def file( self, *path ):
+        "Return contents of a file under our root"
+        return readFile( os.path.join( self.root, *path ) )
+
+    def write( self, text, *path ):
+        "Write text to a file under our root"
+        with open( os.path.join( self.root, *path ), 'w' ) as f:
+            f.write( text )
+
+# Tell pylint not to complain about calls to other class
+# pylint: disable=E1101
+
+class testCgroupV1( testCgroupCommon, unittest.TestCase ):
+    "Test cgroup v1: a hierarchy per controller"
+
+    def setUp( self ):
+        testCgroupCommon.setUp( self )
+        # cpu and cpuacct share a hierarchy, as on most systems
+        os.mkdir( os.path.join( self.root, 'cpu,cpuacct' ) )
+        os.mkdir( os.path.join( self.root, 'cpuset' ) )
+        for name in 'cpu', 'cpuacct':
+            os.symlink( 'cpu,cpuacct', os.path.join( self.root, name ) )
+
+    def testFiles( self ):
+        "Parameters are files in each controller's hierarchy"
+        cgroup = Cgroup( 'h1', root=self.root )
+        self.assertEqual( cgroup.version, 1 )
+        cgroup.create()
+        self.assertEqual( cgroup.paths(), [
+            os.path.join( os.path.realpath( self.root ), d, 'h1' )
+            for d in ( 'cpu,cpuacct', 'cpuset' ) ] )
+        cgroup.set( 'cpu', 'cfs_quota_us', 5000 )
+        cgroup.set( 'cpuset', 'cpus', '0-1' )
+        self.assertEqual( self.file( 'cpu,cpuacct', 'h1',
+                                     'cpu.cfs_quota_us' ), '5000' )
+        self.assertEqual( cgroup.get( 'cpu', 'cfs_quota_us' ), '5000' )
+        self.assertEqual( self.file( 'cpuset', 'h1', 'cpuset.cpus' ), '0-1' )
+        cgroup.set( 'cpu', 'rt_runtime_us', 1000 )
+        self.assertEqual( cgroup.get( 'cpu', 'rt_runtime_us' ), '1000' )
+        cgroup.addPid( 42, resources=( 'cpuset', ) )
+        self.assertEqual( self.file( 'cpuset', 'h1', 'tasks' ), '42' )
+        self.write( '2500000000\n', 'cpuacct', 'h1', 'cpuacct.usage' )
+        self.assertEqual( cgroup.cpuUsage(), 2.5 )
+
+    def testDelete( self ):
+        "All of our directories are removed"
+        cgroup = Cgroup( 'h1', root=self.root )
+        cgroup.create()
+        self.assertTrue( cgroup.delete() )
+        self.assertFalse( [ p for p in cgroup.paths()
+                            if os.path.exists( p ) ] )
+
+
+class testCgroupV2( testCgroupCommon, unittest.TestCase ):
+    "Test cgroup v2: a single unified hierarchy"
+
+    def setUp( self ):
+        testCgroupCommon.setUp( self )
+        self.write( 'cpuset cpu io memory\n', 'cgroup.controllers' )
+        self.write( 'memory\n', 'cgroup.subtree_control' )
+
+    def testEnable( self ):
+        "Missing controllers are enabled for child cgroups"
+        enableControllers( root=self.root )
+        self.assertEqual( self.file( 'cgroup.subtree_control' ),
+                          '+cpu +cpuset' )
+
+    def testFiles( self ):
+        "v1 parameters are translated to v2 files"
+        cgroup = Cgroup( 'h1', root=self.root )
+        self.assertEqual( cgroup.version, 2 )
+        cgroup.create()
+        self.assertEqual( cgroup.paths(), [ os.path.join( self.root,
+                                                          'h1' ) ] )
+        cgroup.set( 'cpu', 'cfs_quota_us', 5000 )
+        self.assertEqual( self.file( 'h1', 'cpu.max' ), '5000 100000' )
+        cgroup.set( 'cpu', 'cfs_period_us', 200000 )
+        self.assertEqual( self.file( 'h1', 'cpu.max' ), '5000 200000' )
+        self.assertEqual( cgroup.get( 'cpu', 'cfs_period_us' ), '200000' )
+        cgroup.set( 'cpu', 'cfs_quota_us', -1 )
+        self.assertEqual( self.file( 'h1', 'cpu.max' ), 'max 200000' )
+        self.assertEqual( cgroup.get( 'cpu', 'cfs_quota_us' ), '-1' )
+        cgroup.set( 'cpuset', 'mems', '0' )
+        self.assertEqual( self.file( 'h1', 'cpuset.mems' ), '0' )
+        self.assertRaises( Exception, cgroup.set, 'cpu', 'rt_runtime_us',
+                           1000 )
+        cgroup.addPid( 42 )
+        self.assertEqual( self.file( 'h1', 'cgroup.procs' ), '42' )
+        self.write( 'usage_usec 1500000\nuser_usec 1000000\n',
+                    'h1', 'cpu.stat' )
+        self.assertEqual( cgroup.usagePath(),
+                          os.path.join( self.root, 'h1', 'cpu.stat' ) )
+        self.assertEqual( cgroup.cpuUsage(), 1.5 )
+
+# pylint: enable=E1101
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
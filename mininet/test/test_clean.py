@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test manifest-driven cleanup against a fake state directory."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from subprocess import Popen
+from threading import Thread
+
+from mininet.clean import cleanManifests
+from mininet.linux.util import ipAddrs
+from mininet.log import setLogLevel
+from mininet.util import quietRun
+
+
+class testCleanManifests( unittest.TestCase ):
+    "Test cleanManifests()"
+
+    def setUp( self ):
+        self.stateDir = tempfile.mkdtemp()
+        self.procs = []
+
+    def tearDown( self ):
+        "Kill any processes we started, and remove our resources"
+        for proc, reaper in self.procs:
+            if reaper.is_alive():
+                proc.kill()
+                reaper.join()
+        quietRun( 'ip link del mntest-eth0' )
+        shutil.rmtree( self.stateDir )
+
+    def spawn( self, cmd ):
+        """Start cmd as the leader of a new session, reaping it when it
+           exits as init would for a dead Mininet's nodes
+           returns: PID"""
+        proc = Popen( cmd, preexec_fn=os.setsid )
+        reaper = Thread( target=proc.wait )
+        reaper.daemon = True
+        reaper.start()
+        self.procs.append( ( proc, reaper ) )
+        return proc.pid
+
+    def manifest( self, name, **resources ):
+        "Write manifest to the state directory; return its path"
+        path = os.path.join( self.stateDir, name + '.json' )
+        with open( path, 'w' ) as f:
+            json.dump( resources, f )
+        return path
+
+    @staticmethod
+    def deadPid():
+        "Return the PID of a process that has exited"
+        proc = Popen( [ 'true' ] )
+        proc.wait()
+        return proc.pid
+
+    def testClean( self ):
+        "Only what the manifests of dead runs list is removed"
+        # A node shell, and PIDs that have been reused since, one by
+        # a node of a later run whose name starts with the old one's
+        shell = self.spawn( [ 'bash', '-c', 'exec -a mininet:h1 sleep 60' ] )
+        reused = self.spawn( [ 'sleep', '60' ] )
+        similar = self.spawn( [ 'bash', '-c',
+                                'exec -a mininet:h10 sleep 60' ] )
+        quietRun( 'ip link add mntest-eth0 type dummy' )
+        cgroup = tempfile.mkdtemp( dir=self.stateDir )
+        dead = self.manifest(
+            'dead', pid=self.deadPid(), sessions=[ shell, reused, similar ],
+            commands={ str( shell ): 'h1', str( reused ): 'h2',
+                       str( similar ): 'h1' },
+            interfaces=[ 'mntest-eth0' ], cgroups=[ cgroup ] )
+        # A run that is still going, and an unreadable manifest
+        live = self.manifest( 'live', pid=reused, sessions=[ reused ] )
+        bad = os.path.join( self.stateDir, 'bad.json' )
+        with open( bad, 'w' ) as f:
+            f.write( '{' )
+        # We can't know what the unreadable manifest's run left behind
+        self.assertEqual( cleanManifests( self.stateDir ), ( 2, False ) )
+        ( shellProc, shellReaper ), ( _proc, reusedReaper ), (
+            _proc, similarReaper ) = self.procs
+        shellReaper.join( 5 )
+        self.assertEqual( shellProc.returncode, -9 )
+        self.assertTrue( reusedReaper.is_alive() )
+        self.assertTrue( similarReaper.is_alive() )
+        self.assertNotIn( 'mntest-eth0', ipAddrs() )
+        self.assertFalse( os.path.exists( cgroup ) )
+        self.assertFalse( os.path.exists( dead ) )
+        self.assertFalse( os.path.exists( bad ) )
+        self.assertTrue( os.path.exists( live ) )
+        # Nothing left to do
+        os.unlink( live )
+        self.assertEqual( cleanManifests( self.stateDir ), ( 0, False ) )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
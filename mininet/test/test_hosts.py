@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test host configuration on a small network of directly linked hosts."""
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+import sys
+from select import select
+from subprocess import Popen
+from time import time
+
+from mininet.net import Mininet
+from mininet.node import Host
+from mininet.basenode import DeferredOutput
+from mininet.baseintf import BaseIntf
+from mininet.linux.util import ipAddrs
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+# Ping whose output has glob characters and several lines
+FAKE_PING = """#!/bin/sh
+echo "1 packets transmitted, 1 received"
+echo "* ?"
+"""
+
+
+class EchoHost( Host ):
+    "Host whose config() looks at command output"
+
+    def config( self, **params ):
+        r = Host.config( self, **params )
+        r[ 'echo' ] = self.cmd( 'echo hello' )
+        return r
+
+
+class DeferredEchoHost( EchoHost ):
+    "EchoHost that allows its config() commands to be deferred"
+    deferConfig = True
+
+
+class testHostsCommon( object ):
+    "Build a network of a chain of directly linked hosts (common code)"
+
+    n = 2  # number of hosts
+
+    def setUp( self ):
+        self.net = Mininet( controller=None )
+        hosts = [ self.net.addHost( 'h%d' % i )
+                  for i in range( 1, self.n + 1 ) ]
+        for h1, h2 in zip( hosts, hosts[ 1: ] ):
+            self.net.addLink( h1, h2 )
+        self.net.build()
+
+    def tearDown( self ):
+        "Stop network, and clean up if necessary"
+        self.net.stop()
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+# Tell pylint not to complain about calls to other class
+# pylint: disable=E1101
+
+class testConfigHosts( testHostsCommon, unittest.TestCase ):
+    "Test Mininet.configHosts()"
+
+    def testDeferred( self ):
+        "Deferred config() results are replaced with command output"
+        h1 = self.net[ 'h1' ]
+        self.assertTrue( Host.defersConfig() )
+        results = self.net.configHosts()
+        self.assertFalse( [ v for r in results.values() for v in r.values()
+                            if isinstance( v, DeferredOutput ) ] )
+        self.assertEqual( results[ h1 ][ 'ip' ], '' )
+
+    def testOverridden( self ):
+        "config() overrides see real output unless they allow deferral"
+        h1 = self.net[ 'h1' ]
+        for cls, defers in ( EchoHost, False ), ( DeferredEchoHost, True ):
+            h1.__class__ = cls
+            self.assertEqual( h1.defersConfig(), defers )
+            results = self.net.configHosts()
+            self.assertEqual( results[ h1 ][ 'echo' ].strip(), 'hello' )
+            self.assertEqual( h1.IP(), '10.0.0.1' )
+
+
+class testGather( testHostsCommon, unittest.TestCase ):
+    "Test Mininet.gather()"
+
+    n = 5
+
+    def testMaxNodes( self ):
+        "No more than maxNodes nodes run commands at once"
+        tmpdir = self.net.hosts[ 0 ].cmd( 'mktemp -d' ).strip()
+        # Each command counts the commands running when it starts
+        cmds = [ ( h, 'mkdir %s/%s; ls %s | wc -l; sleep .2; rmdir %s/%s'
+                   % ( tmpdir, h, tmpdir, tmpdir, h ) )
+                 for h in self.net.hosts * 2 ]
+        try:
+            for maxNodes, most in ( None, 5 ), ( 2, 2 ):
+                outputs = self.net.gather( cmds, maxNodes=maxNodes )
+                counts = [ int( out.strip() ) for out in outputs ]
+                self.assertEqual( len( counts ), 10 )
+                self.assertTrue( max( counts ) <= most )
+            self.assertTrue( max( counts ) > 1 )
+        finally:
+            self.net.hosts[ 0 ].cmd( 'rmdir', tmpdir )
+
+    def testAcmd( self ):
+        "Commands sent with acmd() run concurrently without blocking"
+        h1, h2 = self.net.hosts[ :2 ]
+        start = time()
+        slow = h1.acmd( 'sleep .5; echo slow' )
+        fast = h2.acmd( 'echo fast' )
+        self.assertFalse( slow.done() )
+        self.assertEqual( slow.result( timeoutms=10 ), None )
+        # Output can be waited for with select()
+        select( [ slow, fast ], [], [], 5 )
+        self.assertEqual( fast.result().strip(), 'fast' )
+        self.assertEqual( slow.result().strip(), 'slow' )
+        self.assertTrue( time() - start < 1 )
+        self.assertEqual( h1.cmd( 'echo again' ).strip(), 'again' )
+
+    def testPingResults( self ):
+        "Ping output reaches pingResults() unexpanded, as one line"
+        h1, h2 = self.net.hosts[ :2 ]
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup( shutil.rmtree, tmpdir )
+        with open( os.path.join( tmpdir, 'ping' ), 'w' ) as f:
+            f.write( FAKE_PING )
+        os.chmod( os.path.join( tmpdir, 'ping' ), 0o755 )
+        h1.cmd( 'PATH=%s:$PATH' % tmpdir, printPid=False )
+        results = self.net.pingResults( [ h1, h2 ] )
+        self.assertEqual( results[ h1, h2.IP() ],
+                          '1 packets transmitted, 1 received * ?' )
+
+
+class testStaticArp( testHostsCommon, unittest.TestCase ):
+    "Test Mininet.staticArp()"
+
+    n = 3
+
+    @staticmethod
+    def neighbors( host ):
+        "Return set of ( ip, mac, state ) of host's ARP entries"
+        return set( re.findall( r'(\S+) dev \S+ lladdr (\S+) (\w+)',
+                                host.cmd( 'ip neigh show' ) ) )
+
+    def testPermanent( self ):
+        "Entries installed in bulk are PERMANENT, as with arp -s"
+        self.net.staticArp()
+        h1 = self.net[ 'h1' ]
+        entries = self.neighbors( h1 )
+        self.assertEqual( entries, set( ( h.IP(), h.MAC(), 'PERMANENT' )
+                                        for h in self.net.hosts[ 1: ] ) )
+        h1.cmd( 'ip neigh flush all nud permanent' )
+        self.assertEqual( self.neighbors( h1 ), set() )
+        for h in self.net.hosts[ 1: ]:
+            h1.setARP( h.IP(), h.MAC() )
+        self.assertEqual( self.neighbors( h1 ), entries )
+
+    def testMultiHomed( self ):
+        "Entries go on the interface whose subnet holds their IP"
+        h1, h2, h3 = self.net.hosts
+        h2.intf( 'h2-eth1' ).setIP( '192.168.1.2/24' )
+        h3.setIP( '192.168.1.3/24' )
+        errors = h2.setARPs( [ ( h1.IP(), h1.MAC() ), ( h3.IP(), h3.MAC() ),
+                               ( '172.16.0.9', h3.MAC() ) ] )
+        devices = dict( re.findall( r'(\S+) dev (\S+) lladdr',
+                                    h2.cmd( 'ip neigh show' ) ) )
+        self.assertEqual( devices, { h1.IP(): 'h2-eth0',
+                                     '192.168.1.3': 'h2-eth1' } )
+        # With no route, arp -s fails as it always did
+        self.assertEqual( list( errors ), [ 2 ] )
+
+
+class testAddrCache( testHostsCommon, unittest.TestCase ):
+    "Test cached interface addresses"
+
+    def testSetIP( self ):
+        "The cache follows setIP(), and is refreshed once invalidated"
+        h1 = self.net[ 'h1' ]
+        intf = h1.defaultIntf()
+        intf.setIP( '10.0.0.7/8' )
+        self.assertNotIn( 'ip', intf.staleAddrs )
+        self.assertEqual( intf.cachedIP(), '10.0.0.7' )
+        # Compare with ifconfig, which the cache replaces
+        self.assertEqual( BaseIntf.updateIP( intf ), '10.0.0.7' )
+        # Change the address behind our back
+        h1.cmd( 'ip addr flush dev %s; ip addr add 10.0.0.9/8 dev %s'
+                % ( intf, intf ) )
+        self.assertEqual( intf.cachedIP(), '10.0.0.7' )
+        h1.invalidateAddrs()
+        self.assertEqual( intf.cachedIP(), '10.0.0.9' )
+        self.assertEqual( intf.cachedMAC(), BaseIntf.updateMAC( intf ) )
+        self.assertEqual( intf.staleAddrs, set() )
+
+
+class testStop( unittest.TestCase ):
+    "Test Mininet.stop()"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testFastStop( self ):
+        "fastStop leaves no interfaces behind, as a regular stop doesn't"
+        for fastStop in False, True:
+            net = Mininet( controller=None, fastStop=fastStop )
+            h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+            # A node in the root namespace, whose interface is left
+            # to go away with its peer's namespace
+            r1 = net.addHost( 'r1', inNamespace=False, ip=None )
+            net.addLink( h1, h2 )
+            net.addLink( h1, r1 )
+            net.build()
+            names = [ intf.name for h in net.hosts for intf in h.intfList() ]
+            self.assertIn( 'r1-eth0', ipAddrs() )
+            net.stop()
+            self.assertFalse( set( names ) & set( ipAddrs() ) )
+            self.assertFalse( [ h for h in net.hosts if h.shell ] )
+
+    def testReapGone( self ):
+        "Shells that exit just before they would be killed are skipped"
+
+        class GoneShell( object ):
+            "Shell that still looks alive after it has exited"
+
+            def __init__( self ):
+                proc = Popen( [ 'true' ] )
+                proc.wait()
+                self.pid = proc.pid
+
+            @staticmethod
+            def poll():
+                "Pretend to be running"
+                return None
+
+        Mininet.reapShells( [ GoneShell() ], timeout=.05 )
+
+# pylint: enable=E1101
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
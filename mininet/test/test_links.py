@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test link creation and configuration on directly linked hosts."""
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+import sys
+from threading import Thread
+
+from mininet.net import Mininet
+from mininet.link import Link, TCLink, TCIntf, NetlinkLink
+from mininet.linux.util import ipAddrs
+from mininet.linux.netlink import available as netlinkAvailable
+from mininet.topo import Topo
+from mininet.util import quietRun
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+
+class ChainTopo( Topo ):
+    "Chain of n directly linked hosts"
+
+    def build( self, n=2, **_opts ):
+        "n: number of hosts"
+        hosts = [ self.addHost( 'h%d' % i ) for i in range( 1, n + 1 ) ]
+        for h1, h2 in zip( hosts, hosts[ 1: ] ):
+            self.addLink( h1, h2 )
+
+
+FAKE_ETHTOOL = """#!/bin/sh
+case "$*" in
+    *bogus*) echo "ethtool: bad command line argument(s)" >&2; exit 1;;
+esac
+"""
+
+
+class RenamedLink( Link ):
+    "Link whose interfaces are named node-pN"
+
+    def intfName( self, node, n ):
+        return '%s-p%d' % ( node, n )
+
+
+class testLinksCommon( object ):
+    "Build networks of directly linked hosts (common code)"
+
+    net = None
+
+    def build( self, n=2, **opts ):
+        """Build a network with a chain of n hosts
+           opts: options for Mininet(), and link options"""
+        netopts = { key: opts.pop( key ) for key in list( opts )
+                    if key in ( 'link', 'intf', 'batchLinks' ) }
+        self.net = Mininet( topo=ChainTopo( n, lopts=opts ),
+                            controller=None, **netopts )
+        return self.net
+
+    def tearDown( self ):
+        "Stop network, and clean up if necessary"
+        if self.net:
+            self.net.stop()
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    @staticmethod
+    def tcErrors( errors ):
+        """Return runBatch() errors without ethtool's, since ethtool
+           may not be installed"""
+        errors = { intf: [ e for e in errs if not e.startswith( 'ethtool' ) ]
+                   for intf, errs in errors.items() }
+        return { intf: errs for intf, errs in errors.items() if errs }
+
+    @staticmethod
+    def qdiscs( intf ):
+        "Return kinds of qdiscs on intf, root first"
+        output = intf.node.cmd( 'tc qdisc show dev', intf )
+        return [ line.split()[ 1 ] for line in output.splitlines()
+                 if line.startswith( 'qdisc' ) ]
+
+# Tell pylint not to complain about calls to other class
+# pylint: disable=E1101
+
+class testBatchLinks( testLinksCommon, unittest.TestCase ):
+    "Test creating links in bulk with batchLinks=True"
+
+    def testBatched( self ):
+        "Batched veth pairs exist, as they do when made one at a time"
+        names = {}
+        for batchLinks in False, True:
+            net = self.build( n=3, batchLinks=batchLinks )
+            names[ batchLinks ] = [ sorted( ipAddrs( node=h ) )
+                                    for h in net.hosts ]
+            for link in net.links:
+                self.assertEqual( link.status(), '(OK OK)' )
+            self.assertEqual( Link.batchedPairs, {} )
+            net.stop()
+            self.net = None
+        self.assertEqual( names[ True ], names[ False ] )
+        self.assertEqual( names[ True ][ 1 ], [ 'h2-eth0', 'h2-eth1', 'lo' ] )
+
+    def testFailed( self ):
+        "Pairs aren't left behind for another network if a build fails"
+        self.assertRaises( TypeError, self.build, batchLinks=True,
+                           bogus=True )
+        self.assertEqual( Link.batchedPairs, {} )
+
+    def testStale( self ):
+        "Old interfaces with the names of batched ones are replaced"
+        topo = Topo()
+        h1 = topo.addHost( 'h1' )
+        r1 = topo.addHost( 'r1', inNamespace=False, ip=None )
+        topo.addLink( h1, r1 )
+        quietRun( 'ip link add r1-eth0 type veth peer name mntest-eth0' )
+        self.net = Mininet( topo=topo, controller=None, batchLinks=True )
+        self.assertEqual( self.net.links[ 0 ].status(), '(OK OK)' )
+        self.net.stop()
+        self.net = None
+        self.assertFalse( set( [ 'r1-eth0', 'mntest-eth0' ] ) & set( ipAddrs() ) )
+
+    def testIntfName( self ):
+        "Links that name their interfaces themselves aren't batched"
+        net = self.build( batchLinks=True, link=RenamedLink )
+        self.assertEqual( [ ( link.intf1.name, link.intf2.name )
+                            for link in net.links ], [ ( 'h1-p0', 'h2-p0' ) ] )
+        self.assertEqual( net.links[ 0 ].status(), '(OK OK)' )
+
+class testTCBatch( testLinksCommon, unittest.TestCase ):
+    "Test shaping links with one tc -batch per namespace"
+
+    @staticmethod
+    def tcConfig( net ):
+        "Return qdiscs and classes of each host's interfaces"
+        return [ re.sub( r'direct_packets_stat \d+', '',
+                         h.cmd( 'tc qdisc show dev %s; tc class show dev %s'
+                                % ( intf, intf ) ) )
+                 for h in net.hosts for intf in h.intfList() ]
+
+    def testEqual( self ):
+        "Batched tc config is the same as that made one link at a time"
+        config = {}
+        for batchLinks in False, True:
+            net = self.build( n=3, batchLinks=batchLinks, link=TCLink,
+                              bw=10 )
+            config[ batchLinks ] = self.tcConfig( net )
+            net.stop()
+            self.net = None
+        self.assertEqual( config[ True ], config[ False ] )
+        self.assertIn( 'htb', config[ True ][ 0 ] )
+
+    def testErrors( self ):
+        "Lots of error output doesn't stall runBatch()"
+        net = self.build( n=3, link=TCLink )
+        bogus = [ '%s qdisc add dev %s root handle 5: bogus' ] * 10000
+        TCIntf.startBatch()
+        for link in net.links:
+            TCIntf.batch.append( ( link.intf1, 'gro off', bogus,
+                                   [ '' ] * len( bogus ) ) )
+        results = []
+        thread = Thread( target=lambda: results.append( TCIntf.runBatch() ) )
+        thread.daemon = True
+        thread.start()
+        thread.join( 30 )
+        self.assertFalse( thread.is_alive() )
+        errors = self.tcErrors( results[ 0 ] )
+        self.assertEqual( set( errors ), set( link.intf1
+                                              for link in net.links ) )
+        self.assertEqual( [ len( e ) for e in errors.values() ],
+                          [ len( bogus ) ] * len( net.links ) )
+
+    def testEthtoolErrors( self ):
+        "ethtool errors are reported for their interfaces, as tc's are"
+        # An ethtool that rejects bogus features, whether or not
+        # there is a real one
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup( shutil.rmtree, tmpdir )
+        with open( os.path.join( tmpdir, 'ethtool' ), 'w' ) as f:
+            f.write( FAKE_ETHTOOL )
+        os.chmod( os.path.join( tmpdir, 'ethtool' ), 0o755 )
+        self.addCleanup( os.environ.__setitem__, 'PATH',
+                         os.environ[ 'PATH' ] )
+        os.environ[ 'PATH' ] = tmpdir + ':' + os.environ[ 'PATH' ]
+        net = self.build( link=TCLink )
+        link = net.links[ 0 ]
+        TCIntf.startBatch()
+        outputs = [ '' ]
+        TCIntf.batch += [
+            ( link.intf1, 'bogus on',
+              [ '%s qdisc add dev %s root handle 5: bogus' ], outputs ),
+            ( link.intf2, 'gro off', None, [] ) ]
+        errors = TCIntf.runBatch()
+        self.assertEqual( list( errors ), [ link.intf1 ] )
+        ethtool, tc = errors[ link.intf1 ]
+        self.assertTrue( ethtool.startswith( 'ethtool: ' ) )
+        self.assertEqual( outputs, [ tc ] )
+        self.assertIn( 'qdisc kind is unknown', tc )
+
+
+class testUpdate( testLinksCommon, unittest.TestCase ):
+    "Test TCLink.update()"
+
+    def testAddRemove( self ):
+        "Add and remove shaping parameters in place"
+        net = self.build( link=TCLink, bw=10 )
+        link = net.links[ 0 ]
+        intf = link.intf1
+        self.assertEqual( self.qdiscs( intf ), [ 'htb' ] )
+        # Change within the same qdiscs
+        link.update( bw=5 )
+        self.assertIn( '5Mbit', intf.cmd( 'tc class show dev', intf ) )
+        # Replace the qdiscs
+        link.update( use_tbf=True )
+        self.assertEqual( self.qdiscs( intf ), [ 'tbf' ] )
+        # Remove the last shaping parameter
+        link.update( bw=None )
+        self.assertFalse( [ kind for kind in self.qdiscs( intf )
+                            if kind in ( 'htb', 'tbf' ) ] )
+        self.assertEqual( ( intf.rootQdisc, intf.tcCmds ), ( None, None ) )
+
+    def testErrors( self ):
+        "tc errors are returned when update() falls back to config()"
+        net = self.build( link=TCLink, bw=10 )
+        link = net.links[ 0 ]
+        self.assertEqual( link.update( bw=5 ), [ '', '' ] )
+        # Adding a delay adds a netem qdisc, so config() is re-run
+        outputs = link.update( delay='bogus' )
+        self.assertEqual( len( outputs ), 2 )
+        self.assertTrue( all( outputs ) )
+        self.assertEqual( link.update( delay=None ), [ '', '' ] )
+
+    def testRemoveBatched( self ):
+        "Batched config() without shaping removes earlier shaping"
+        net = self.build( link=TCLink, bw=10 )
+        intf = net.links[ 0 ].intf1
+        TCIntf.startBatch()
+        intf.config( **dict( intf.params, bw=None ) )
+        self.assertEqual( self.tcErrors( TCIntf.runBatch() ), {} )
+        self.assertNotIn( 'htb', self.qdiscs( intf ) )
+
+
+class testReapply( testLinksCommon, unittest.TestCase ):
+    "Test TCIntf.reapply()"
+
+    def testReapply( self ):
+        "Only interfaces whose root qdisc was replaced are reconfigured"
+        net = self.build( n=3, link=TCLink, bw=10 )
+        intfs = [ intf for h in net.hosts for intf in h.intfList()
+                  if intf.name != 'lo' ]
+        configured = []
+
+        def recordConfig( intf ):
+            "Record calls to intf.config()"
+            config = intf.config
+
+            def wrapper( **params ):
+                "Record intf, and configure it"
+                configured.append( intf )
+                return config( **params )
+
+            intf.config = wrapper
+
+        for intf in intfs:
+            recordConfig( intf )
+        self.assertEqual( TCIntf.reapply( intfs ), [] )
+        self.assertEqual( configured, [] )
+        # Replace one interface's root qdisc behind our back
+        intf = net[ 'h2' ].intf( 'h2-eth1' )
+        intf.cmd( 'tc qdisc replace dev %s root tbf rate 1mbit burst 10kb '
+                  'latency 50ms' % intf )
+        self.assertEqual( self.qdiscs( intf ), [ 'tbf' ] )
+        self.assertEqual( TCIntf.reapply( intfs ), [ intf ] )
+        self.assertEqual( configured, [ intf ] )
+        self.assertEqual( self.qdiscs( intf )[ 0 ], 'htb' )
+        self.assertEqual( TCIntf.reapply( intfs ), [] )
+        self.assertEqual( configured, [ intf ] )
+
+
+@unittest.skipUnless( netlinkAvailable(), 'rtnetlink is not usable here' )
+class testNetlinkIntf( testLinksCommon, unittest.TestCase ):
+    "Test NetlinkIntf against ip(8)"
+
+    def testAddr( self ):
+        "Addresses set over netlink are those ip reports"
+        net = self.build( link=NetlinkLink )
+        intf = net.links[ 0 ].intf1
+        self.assertEqual( ( intf.IP(), intf.prefixLen ), ( '10.0.0.1', 8 ) )
+        addrs = ipAddrs( node=intf.node )[ intf.name ]
+        self.assertEqual( ( addrs[ 'ip' ], addrs[ 'mac' ] ),
+                          intf.updateAddr() )
+        self.assertEqual( intf.prefixLen, addrs[ 'prefixLen' ] )
+        # Setting the same address again mustn't delete it first
+        deleted = []
+        nl = intf.nl()
+        nl.delAddr = lambda *args: deleted.append( args )
+        try:
+            self.assertEqual( intf.setIP( '10.0.0.1/8' ), '' )
+            self.assertEqual( deleted, [] )
+            self.assertEqual( intf.setIP( '10.0.0.5', '8' ), '' )
+            self.assertEqual( deleted, [ ( nl.linkIndex( intf.name ),
+                                           '10.0.0.1', 8 ) ] )
+        finally:
+            del nl.delAddr
+
+    def testStatus( self ):
+        "Link status set over netlink is what ip reports"
+        net = self.build( link=NetlinkLink )
+        intf = net.links[ 0 ].intf1
+        self.assertEqual( intf.status(), 'OK' )
+        for status in 'down', 'up':
+            self.assertEqual( intf.ifconfig( status ), '' )
+            self.assertEqual( intf.isUp(), status == 'up' )
+            self.assertEqual( ipAddrs( node=intf.node )[ intf.name ][ 'up' ],
+                              status == 'up' )
+
+    def testGone( self ):
+        "Errors are returned, not raised, if our namespace is gone"
+        net = self.build( link=NetlinkLink )
+        intf = net.links[ 0 ].intf1
+        pid, intf.node.pid = intf.node.pid, 0x7fffffff
+        try:
+            self.assertTrue( intf.ifconfig( 'up' ) )
+            self.assertTrue( intf.setIP( '10.0.0.1/8' ) )
+            self.assertFalse( intf.isUp() )
+            self.assertEqual( intf.status(), 'MISSING' )
+        finally:
+            intf.node.pid = pid
+
+    def testPairGone( self ):
+        "Deleting stale interfaces in a vanished namespace isn't fatal"
+        class Gone( object ):
+            "Node whose namespace has exited"
+            pid = 0x7fffffff
+        with self.assertRaisesRegexp( Exception, 'Error creating' ):
+            NetlinkLink.makeIntfPair( 'mntest-eth0', 'mntest-eth1',
+                                      node1=Gone() )
+
+
+class testBatchStatus( testLinksCommon, unittest.TestCase ):
+    "Test Link.batchStatus()"
+
+    def testErrors( self ):
+        "Failed changes are reported for just the interfaces that failed"
+        net = self.build( n=3 )
+        link1, link2 = net.links
+        # Remove link2's veth pair behind Mininet's back
+        net[ 'h3' ].cmd( 'ip link del h3-eth0' )
+        errors = Link.batchStatus( [ ( link1, 'down' ), ( link2, 'down' ) ] )
+        self.assertEqual( set( errors ), set( [ link2.intf1, link2.intf2 ] ) )
+        self.assertIn( 'h3-eth0', errors[ link2.intf2 ] )
+        for intf in link1.intf1, link1.intf2:
+            self.assertFalse( intf.isUp() )
+        self.assertEqual( Link.batchStatus( [ ( link1, 'up' ) ] ), {} )
+        for intf in link1.intf1, link1.intf2:
+            self.assertTrue( intf.isUp() )
+
+    def testGone( self ):
+        "Changes in a namespace that is gone fail without raising"
+        net = self.build()
+        link = net.links[ 0 ]
+        h2 = net[ 'h2' ]
+        pid, h2.pid = h2.pid, 0x7fffffff
+        try:
+            errors = Link.batchStatus( [ ( link, 'down' ) ] )
+        finally:
+            h2.pid = pid
+        self.assertEqual( list( errors ), [ link.intf2 ] )
+        self.assertFalse( link.intf1.isUp() )
+
+# pylint: enable=E1101
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test the rtnetlink client's namespace handling with real nodes."""
+
+import os
+import threading
+import unittest
+import sys
+
+from mininet.net import Mininet
+from mininet.linux.netlink import nsCall, nlSocket, available
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+
+def threadNamespace():
+    "Return the network namespace of the calling thread"
+    return os.readlink( '/proc/thread-self/ns/net' )
+
+
+@unittest.skipUnless( available(), 'rtnetlink is not usable here' )
+class testNamespaces( unittest.TestCase ):
+    "Test netlink calls from several threads"
+
+    def setUp( self ):
+        self.net = Mininet( controller=None )
+        self.h1, self.h2 = self.net.addHost( 'h1' ), self.net.addHost( 'h2' )
+        self.net.addLink( self.h1, self.h2 )
+        self.net.build()
+
+    def tearDown( self ):
+        "Stop network, and clean up if necessary"
+        self.net.stop()
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testThreads( self ):
+        "A thread's nsCall() returns it to its own namespace"
+        root = threadNamespace()
+        inside, done = threading.Event(), threading.Event()
+        results = {}
+
+        def wait():
+            "Hold the main thread in h1's namespace"
+            inside.set()
+            done.wait( 5 )
+            return threadNamespace()
+
+        def other():
+            "Call into h2's namespace while the main thread is in h1's"
+            inside.wait( 5 )
+            results[ 'h2' ] = nsCall( self.h2.pid, threadNamespace )
+            results[ 'after' ] = threadNamespace()
+            done.set()
+
+        thread = threading.Thread( target=other )
+        thread.start()
+        results[ 'h1' ] = nsCall( self.h1.pid, wait )
+        thread.join()
+        self.assertEqual( threadNamespace(), root )
+        self.assertEqual( results[ 'after' ], root )
+        self.assertEqual( len( set( [ root, results[ 'h1' ],
+                                      results[ 'h2' ] ] ) ), 3 )
+
+    def testSharedSocket( self ):
+        "Threads may send batches of requests on one socket at once"
+        nl = nlSocket( self.h1.pid )
+        states = [ ( 'h1-eth0', up ) for up in ( False, True ) * 100 ]
+        results = []
+
+        def toggle():
+            "Toggle h1-eth0 many times"
+            for _ in range( 10 ):
+                results.append( nl.setLinkStates( states ) )
+
+        threads = [ threading.Thread( target=toggle ) for _ in range( 4 ) ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join( 10 )
+            self.assertFalse( thread.is_alive() )
+        self.assertEqual( results, [ {} ] * 40 )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -43,6 +43,22 @@ def testSingle5( self ):
         dropped = mn.run( mn.ping )
         self.assertEqual( dropped, 0 )
 
+    def testSingle5Parallel( self ):
+        "Ping test on 5-host single-switch topology with parallel build"
+        mn = Mininet( SingleSwitchTopo( k=5 ), self.switchClass, Host,
+                      Controller, waitConnected=True, parallel=True )
+        dropped = mn.run( mn.ping )
+        self.assertEqual( dropped, 0 )
+
+    def testGather( self ):
+        "Run commands on all hosts concurrently"
+        mn = Mininet( SingleSwitchTopo( k=5 ), self.switchClass, Host,
+                      Controller )
+        cmds = [ ( h, 'echo %s' % h ) for h in mn.hosts ]
+        outputs = mn.run( mn.gather, cmds )
+        self.assertEqual( [ o.strip() for o in outputs ],
+                          [ h.name for h in mn.hosts ] )
+
 # pylint: enable=E1101
 
 class testSingleSwitchOVSKernel( testSingleSwitchCommon, unittest.TestCase ):
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test the OVSDB JSON-RPC client against a small local ovsdb stand-in."""
+
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from mininet.ovsdb import OVSDB, OVSDBError, BridgeMonitor
+from mininet.log import setLogLevel
+
+
+class FakeOVSDBServer( object ):
+    """Just enough of ovsdb-server to exercise the client: it records
+       transactions, bumps cur_cfg to next_cfg after each one, and sends
+       monitor updates for the Open_vSwitch table"""
+
+    def __init__( self ):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join( self.dir, 'db.sock' )
+        self.listener = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        self.listener.bind( self.path )
+        self.listener.listen( 1 )
+        self.transactions = []
+        self.cfg = 0
+        self.monitorId = None
+        self.rows = {}  # table -> uuid -> row, for monitor requests
+        self.conn = None
+        self.thread = threading.Thread( target=self.serve )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close( self ):
+        "Shut down and remove socket"
+        self.listener.close()
+        os.unlink( self.path )
+        os.rmdir( self.dir )
+
+    def serve( self ):
+        "Handle a single client connection"
+        conn, _addr = self.listener.accept()
+        self.conn = conn
+        decoder = json.JSONDecoder()
+        buf = ''
+        # Send an echo request first, which the client must answer
+        conn.sendall( b'{"method": "echo", "params": [], "id": "echo"}' )
+        while True:
+            data = conn.recv( 4096 )
+            if not data:
+                break
+            buf += data.decode()
+            while buf.strip():
+                buf = buf.lstrip()
+                try:
+                    msg, end = decoder.raw_decode( buf )
+                except ValueError:
+                    break
+                buf = buf[ end: ]
+                for reply in self.handle( msg ):
+                    # Split replies to test reassembly
+                    out = json.dumps( reply ).encode()
+                    conn.sendall( out[ :5 ] )
+                    conn.sendall( out[ 5: ] )
+        conn.close()
+
+    def handle( self, msg ):
+        "Return list of messages to send in response to msg"
+        method, params = msg.get( 'method' ), msg.get( 'params' )
+        if method is None:
+            # Reply to our echo request
+            return []
+        if method == 'monitor':
+            self.monitorId = params[ 1 ]
+            self.rows[ 'Open_vSwitch' ] = { 'root': { 'cur_cfg': self.cfg } }
+            result = { table: { rowId: { 'new': row }
+                                for rowId, row in self.rows[ table ].items() }
+                       for table in params[ 2 ] if table in self.rows }
+            return [ { 'id': msg[ 'id' ], 'error': None, 'result': result } ]
+        if method == 'monitor_cancel':
+            self.monitorId = None
+            return [ { 'id': msg[ 'id' ], 'error': None, 'result': {} } ]
+        if method == 'transact':
+            ops = params[ 1: ]
+            self.transactions.append( ops )
+            results = []
+            for op in ops:
+                if op[ 'table' ] == 'Bogus':
+                    results.append( { 'error': 'unknown table' } )
+                elif op[ 'op' ] == 'insert':
+                    results.append( { 'uuid': [ 'uuid', op[ 'uuid-name' ] ] } )
+                elif op[ 'op' ] == 'mutate':
+                    if op[ 'mutations' ][ 0 ][ 0 ] == 'next_cfg':
+                        self.cfg += 1
+                    results.append( { 'count': 1 } )
+                elif op[ 'table' ] == 'Open_vSwitch':
+                    results.append( { 'rows': [ { 'next_cfg': self.cfg } ] } )
+                else:
+                    results.append( { 'rows': [] } )
+            replies = [ { 'id': msg[ 'id' ], 'error': None,
+                          'result': results } ]
+            if self.monitorId:
+                # ovs-vswitchd has caught up
+                replies.append( { 'id': None, 'method': 'update', 'params': [
+                    self.monitorId, { 'Open_vSwitch': { 'root': { 'new': {
+                        'cur_cfg': self.cfg } } } } ] } )
+            return replies
+        return [ { 'id': msg[ 'id' ], 'error': 'unknown method',
+                   'result': None } ]
+
+    def update( self, table, rowId, row ):
+        "Send a monitor update for a row"
+        self.conn.sendall( json.dumps( {
+            'id': None, 'method': 'update', 'params': [
+                self.monitorId, { table: { rowId: { 'new': row } } } ]
+        } ).encode() )
+
+
+class testOVSDB( unittest.TestCase ):
+    "Test OVSDB client"
+
+    def setUp( self ):
+        self.server = FakeOVSDBServer()
+        self.db = OVSDB( self.server.path )
+
+    def tearDown( self ):
+        self.db.close()
+        self.server.close()
+
+    def testAddBridge( self ):
+        "Create a bridge and wait for ovs-vswitchd"
+        ops = self.db.addBridgeOps( 's1', [ 's1-eth1' ],
+                                    [ { 'target': 'tcp:127.0.0.1:6653' } ],
+                                    fail_mode='secure' )
+        results = self.db.transact( *( ops + self.db.nextCfgOps() ) )
+        self.assertTrue( self.db.waitCfg( results, timeout=5 ) )
+        tables = [ op[ 'table' ] for op in self.server.transactions[ 0 ] ]
+        self.assertEqual( tables.count( 'Interface' ), 2 )
+        self.assertEqual( tables.count( 'Controller' ), 1 )
+        self.assertEqual( tables.count( 'Bridge' ), 1 )
+
+    def testBridgeMonitor( self ):
+        "Connection events are delivered by the monitor"
+        self.server.rows[ 'Bridge' ] = { 'b1': {
+            'name': 's1', 'controller': [ 'uuid', 'c1' ] } }
+        self.server.rows[ 'Controller' ] = { 'c1': { 'is_connected': False } }
+        monitor = BridgeMonitor( self.db )
+        self.assertFalse( monitor.connected( 's1' ) )
+        self.server.update( 'Controller', 'c1', { 'is_connected': True } )
+        self.assertTrue( monitor.poll( 5000 ) )
+        self.assertTrue( monitor.connected( 's1' ) )
+        monitor.close()
+        self.assertFalse( monitor.active() )
+
+    def testErrors( self ):
+        "Failed operations and calls raise OVSDBError"
+        self.assertRaises( OVSDBError, self.db.select, 'Bogus', [ 'name' ] )
+        self.assertRaises( OVSDBError, self.db.call, 'bogus' )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
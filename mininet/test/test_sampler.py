@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test CPU usage sampling with stub hosts, and with cgroup v1 and v2
+   accounting files in a temporary directory."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mininet.net import Mininet
+from mininet.sampler import CPUSampler, np, plat
+from mininet.linux.cgroup import Cgroup, writeFile
+from mininet.log import setLogLevel
+
+
+class FakeCgroup( object ):
+    "Cgroup whose CPU time goes up by step each time it is read"
+
+    def __init__( self, step ):
+        self.step = step
+        self.usage = 0.0
+
+    def cpuUsage( self ):
+        "Return CPU seconds used so far"
+        self.usage += self.step
+        return self.usage
+
+
+class FakeHost( object ):
+    "Just enough of a CPU-limited host for sampling"
+
+    def __init__( self, name, step ):
+        self.name = name
+        self.cgroup = FakeCgroup( step )
+
+
+class CgroupHost( object ):
+    "Host with a real Cgroup, under a fake root"
+
+    def __init__( self, name, root ):
+        self.name = name
+        self.cgroup = Cgroup( name, root=root )
+        self.cgroup.create()
+
+
+class testSampler( unittest.TestCase ):
+    "Test CPU usage sampling"
+
+    # Each host's CPU seconds per sample, at 10 samples a second, on
+    # 2 cores: they use 20% and 40% of the system
+    steps = [ .04, .08 ]
+    expected = [ .2, .4 ]
+
+    def setUp( self ):
+        self.hosts = [ FakeHost( 'h%d' % i, step )
+                       for i, step in enumerate( self.steps, 1 ) ]
+
+    @unittest.skipUnless( CPUSampler.available(), 'numpy is not installed' )
+    def testSample( self ):
+        "CPUSampler reads all hosts at once into a hosts x samples array"
+        sampler = CPUSampler( self.hosts, cores=2 )
+        sampler.read = lambda: np.array( [ h.cgroup.cpuUsage()
+                                           for h in self.hosts ] )
+        usage = sampler.sample( duration=.5, rate=10 )
+        self.assertEqual( usage.shape, ( 2, 5 ) )
+        self.assertEqual( len( sampler.times ), 5 )
+        summary = sampler.summary( usage )
+        for host, expected in zip( self.hosts, self.expected ):
+            self.assertAlmostEqual( summary[ host ][ 'mean' ], expected,
+                                    delta=.1 )
+            self.assertTrue( summary[ host ][ 'min' ] <=
+                             summary[ host ][ 'max' ] )
+
+    def testLoop( self ):
+        "Without numpy, hosts are read in turn into a list per host"
+        usage = Mininet.cpuUsageLoop( self.hosts, [ [], [] ], duration=.5,
+                                      rate=10, cores=2 )
+        self.assertEqual( [ len( samples ) for samples in usage ], [ 5, 5 ] )
+        for samples, expected in zip( usage, self.expected ):
+            for sample in samples:
+                self.assertAlmostEqual( sample, expected )
+
+
+@unittest.skipUnless( CPUSampler.available() and plat == 'Linux',
+                      'numpy is not installed, or not Linux' )
+class testCgroupFiles( unittest.TestCase ):
+    "Test reading cgroup accounting files, in a fake hierarchy"
+
+    def setUp( self ):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown( self ):
+        "Remove fake hierarchy"
+        shutil.rmtree( self.root )
+
+    def check( self, usage ):
+        """Check that files are parsed, and re-read while open
+           usage: function of CPU seconds -> accounting file contents"""
+        hosts = [ CgroupHost( 'h%d' % i, self.root ) for i in ( 1, 2 ) ]
+        sampler = CPUSampler( hosts, cores=2 )
+        files = None
+        for values in ( 1.5, .25 ), ( 2.75, .5 ):
+            # Counters are rewritten in place, as the kernel does
+            for host, seconds in zip( hosts, values ):
+                writeFile( host.cgroup.usagePath(), usage( seconds ) )
+            self.assertEqual( list( sampler.read() ), list( values ) )
+            # The files opened by the first read are kept open
+            files = files or list( sampler.files )
+            self.assertEqual( sampler.files, files )
+        sampler.close()
+        self.assertTrue( all( f.closed for f in files ) )
+        self.assertEqual( sampler.files, None )
+
+    def testV1( self ):
+        "cgroup v1: cpuacct.usage holds nanoseconds"
+        os.mkdir( os.path.join( self.root, 'cpu,cpuacct' ) )
+        for name in 'cpu', 'cpuacct', 'cpuset':
+            os.symlink( 'cpu,cpuacct', os.path.join( self.root, name ) )
+        self.check( lambda seconds: '%d' % ( seconds * 1e9 ) )
+
+    def testV2( self ):
+        "cgroup v2: cpu.stat holds usage_usec among other counters"
+        writeFile( os.path.join( self.root, 'cgroup.controllers' ),
+                   'cpuset cpu' )
+        self.check( lambda seconds: 'usage_usec %d\nuser_usec %d\n'
+                    'system_usec 0' % ( seconds * 1e6, seconds * 1e6 ) )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test parsing of interface counters, and sampling them into a ring
+   buffer with stub nodes."""
+
+import unittest
+from time import sleep
+
+from mininet import telemetry
+from mininet.telemetry import ( Telemetry, FIELDS, np, parseProcNetDev,
+                                parseNetstat )
+from mininet.log import setLogLevel
+
+PROC_NET_DEV = """\
+Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo:     120       2    0    0    0     0          0         0      120       2    0    0    0     0       0          0
+h1-eth0: 5000      50    0    3    0     0          0         0     7000      70    0    4    0     0       0          0
+"""
+
+NETSTAT = """\
+Name    Mtu Network       Address              Ipkts Ierrs Idrop     Ibytes    Opkts Oerrs     Obytes  Coll  Drop
+lo0   16384 <Link#1>      lo0                     10     0     0       1200       10     0       1200     0     0
+lo0       - 127.0.0.0/8   127.0.0.1               10     -     -       1200       10     -       1200     -     -
+epair0b  1500 <Link#2>    02:ff:60:4f:59:0b       50     0     3       5000       70     0       7000     0     4
+tun0   1500 <Link#3>                               1     0     0        100        2     0        200     0     0
+"""
+
+
+class testParseCounters( unittest.TestCase ):
+    "Parse interface counters from /proc/net/dev and netstat"
+
+    def testProcNetDev( self ):
+        "Counters from /proc/net/dev"
+        counters = parseProcNetDev( PROC_NET_DEV )
+        self.assertEqual( counters[ 'h1-eth0' ], [ 5000, 50, 3, 7000, 70, 4 ] )
+        self.assertEqual( sorted( counters ), [ 'h1-eth0', 'lo' ] )
+
+    def testNetstat( self ):
+        "Link-level counters from netstat -ibdn, with or without address"
+        counters = parseNetstat( NETSTAT )
+        self.assertEqual( counters[ 'epair0b' ], [ 5000, 50, 3, 7000, 70, 4 ] )
+        self.assertEqual( counters[ 'tun0' ], [ 100, 1, 0, 200, 2, 0 ] )
+        self.assertEqual( sorted( counters ), [ 'epair0b', 'lo0', 'tun0' ] )
+
+
+class FakeIntf( object ):
+    "Interface with just a name and node"
+
+    def __init__( self, name, node ):
+        self.name = name
+        self.node = node
+
+
+class FakeNode( object ):
+    "Node with interfaces, in its own namespace if it has a pid"
+
+    def __init__( self, name, pid=None ):
+        self.name = name
+        self.pid = pid
+        self.inNamespace = pid is not None
+        self.intfs = []
+
+    def intfList( self ):
+        "Return our interfaces"
+        return self.intfs
+
+    def newIntf( self ):
+        "Add and return an interface named like Mininet's"
+        port = len( [ intf for intf in self.intfs if intf.name != 'lo' ] )
+        intf = FakeIntf( '%s-eth%d' % ( self.name, port ), self )
+        self.intfs.append( intf )
+        return intf
+
+    def __str__( self ):
+        return self.name
+
+
+class FakeLink( object ):
+    "Link between two nodes"
+
+    def __init__( self, node1, node2 ):
+        self.intf1, self.intf2 = node1.newIntf(), node2.newIntf()
+
+
+class FakeNet( object ):
+    "Two hosts in their own namespaces, linked to a switch in the root"
+
+    def __init__( self ):
+        self.s1 = FakeNode( 's1' )
+        self.hosts = [ FakeNode( 'h1', pid=101 ), FakeNode( 'h2', pid=102 ) ]
+        self.switches, self.controllers = [ self.s1 ], []
+        for node in self.hosts:
+            node.intfs.append( FakeIntf( 'lo', node ) )
+        self.links = [ FakeLink( h, self.s1 ) for h in self.hosts ]
+
+
+class FakeClock( object ):
+    "Clock that goes forward by step seconds each time it is read"
+
+    def __init__( self, step=.5 ):
+        self.step = step
+        self.now = 0.0
+
+    def __call__( self ):
+        self.now += self.step
+        return self.now
+
+
+@unittest.skipUnless( np is not None, 'numpy is not installed' )
+class testTelemetry( unittest.TestCase ):
+    "Test sampling counters into the ring buffer"
+
+    size = 4
+
+    def setUp( self ):
+        self.net = FakeNet()
+        self.telemetry = Telemetry( self.net, interval=.01, size=self.size )
+        self.reads = {}  # namespace -> number of reads
+        self.telemetry.readCounters = self.readCounters
+        self.time, telemetry.time = telemetry.time, FakeClock()
+
+    def tearDown( self ):
+        "Restore the clock, and stop sampling"
+        telemetry.time = self.time
+        self.telemetry.stop()
+
+    def readCounters( self, key, node ):
+        """Return counters that go up by ( 1, 2, ... ) x the position of
+           each interface in node.intfList(), once per read"""
+        n = self.reads[ key ] = self.reads.get( key, 0 ) + 1
+        return dict( ( intf.name, [ n * i * ( f + 1 )
+                                    for f in range( len( FIELDS ) ) ] )
+                     for i, intf in enumerate( node.intfList(), 1 ) )
+
+    def testIndex( self ):
+        "Every interface but lo has a row, read once per namespace"
+        self.assertEqual( sorted( intf.name for intf in self.telemetry.intfs ),
+                          [ 'h1-eth0', 'h2-eth0', 's1-eth0', 's1-eth1' ] )
+        self.assertEqual( sorted( self.telemetry.namespaces,
+                                  key=lambda k: k or 0 ),
+                          [ None, 101, 102 ] )
+        self.telemetry.sample()
+        self.assertEqual( self.reads, { None: 1, 101: 1, 102: 1 } )
+
+    def testWrap( self ):
+        "The oldest samples are overwritten, and history stays in order"
+        for _ in range( self.size + 2 ):
+            self.telemetry.sample()
+        self.assertEqual( self.telemetry.count, self.size + 2 )
+        times, samples = self.telemetry.history()
+        self.assertEqual( samples.shape, ( self.size, 4, len( FIELDS ) ) )
+        # Each sample is timed at the middle of its two clock reads
+        self.assertEqual( list( times ), [ 2.75, 3.75, 4.75, 5.75 ] )
+        row = self.telemetry.index[ self.net.links[ 0 ].intf2 ]
+        self.assertEqual( list( samples[ :, row, 0 ] ), [ 3, 4, 5, 6 ] )
+        times, samples = self.telemetry.history( samples=2 )
+        self.assertEqual( list( times ), [ 4.75, 5.75 ] )
+        self.assertEqual( list( samples[ :, row, 0 ] ), [ 5, 6 ] )
+
+    def testRates( self ):
+        "Rates are counter differences over time differences"
+        for _ in range( self.size + 1 ):
+            self.telemetry.sample()
+        link = self.net.links[ 1 ]
+        times, rates = self.telemetry.linkRates( link, field='packets' )
+        self.assertEqual( rates.shape, ( self.size - 1, 2 ) )
+        self.assertEqual( len( times ), self.size - 1 )
+        # h2-eth0 comes after lo, and s1-eth1 after s1-eth0
+        column = FIELDS.index( 'tx_packets' ) + 1
+        for direction in rates:
+            self.assertEqual( list( direction ), [ 2 * column, 2 * column ] )
+        times, rates = self.telemetry.intfRates( link.intf1 )
+        self.assertEqual( rates.shape, ( self.size - 1, len( FIELDS ) ) )
+
+    def testThread( self ):
+        "The background thread keeps sampling until stopped"
+        self.telemetry.start()
+        for _ in range( 100 ):
+            if self.telemetry.count > self.size:
+                break
+            sleep( .01 )
+        self.telemetry.stop()
+        count = self.telemetry.count
+        self.assertTrue( count > self.size )
+        sleep( .05 )
+        self.assertEqual( self.telemetry.count, count )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
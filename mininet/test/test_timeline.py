@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test grouping of scheduled timeline events, and running them on stub
+   nodes and links."""
+
+import unittest
+from time import time
+
+from mininet import timeline
+from mininet.timeline import Timeline, groupEvents
+from mininet.log import setLogLevel
+
+
+class testGroupEvents( unittest.TestCase ):
+    "Sort and group events due at the same time"
+
+    def testGroups( self ):
+        "Events are sorted by time, keeping order among equal times"
+        events = [ ( 2, 'up', 's1', 's2' ),
+                   ( 1, 'down', 's1', 's2' ),
+                   ( 2, 'stop', 's3' ),
+                   ( 1, 'down', 's2', 's3' ) ]
+        groups = groupEvents( events )
+        self.assertEqual( [ t for t, _events in groups ], [ 1, 2 ] )
+        self.assertEqual( groups[ 0 ][ 1 ], [ events[ 1 ], events[ 3 ] ] )
+        self.assertEqual( groups[ 1 ][ 1 ], [ events[ 0 ], events[ 2 ] ] )
+
+
+class FakeIntf( object ):
+    "Interface with just a name"
+
+    def __init__( self, name ):
+        self.name = name
+
+    def __repr__( self ):
+        return '<FakeIntf %s>' % self.name
+
+
+class FakeLink( object ):
+    """Link whose changes are recorded; batchStatus() fails for the
+       interfaces of broken links"""
+
+    batches = []  # list of changes per batchStatus() call
+
+    def __init__( self, node1, node2, broken=False ):
+        self.node1, self.node2 = node1, node2
+        self.intf1 = FakeIntf( '%s-%s' % ( node1, node2 ) )
+        self.intf2 = FakeIntf( '%s-%s' % ( node2, node1 ) )
+        self.broken = broken
+        self.updates = []
+
+    def update( self, **params ):
+        "Record new shaping parameters"
+        self.updates.append( params )
+        return []
+
+    @classmethod
+    def batchStatus( cls, changes ):
+        "Record a batch of ( link, status ) changes"
+        cls.batches.append( [ ( link.node1.name, link.node2.name, status )
+                              for link, status in changes ] )
+        return { link.intf2: 'failed' for link, _status in changes
+                 if link.broken }
+
+
+class FakeNode( object ):
+    "Switch or host whose stops and starts are recorded"
+
+    def __init__( self, name, failStart=False ):
+        self.name = name
+        self.failStart = failStart
+        self.calls = []
+
+    def stop( self, deleteIntfs=True ):
+        "Record stop"
+        self.calls.append( ( 'stop', deleteIntfs ) )
+
+    def start( self, controllers ):
+        "Record start, or fail"
+        if self.failStart:
+            raise Exception( 'could not start %s' % self.name )
+        self.calls.append( ( 'start', controllers ) )
+
+    def __str__( self ):
+        return self.name
+
+
+class FakeNet( object ):
+    "Three switches in a chain (s2-s3 is broken), and a host"
+
+    def __init__( self ):
+        self.switches = [ FakeNode( 's1' ), FakeNode( 's2' ),
+                          FakeNode( 's3', failStart=True ) ]
+        self.hosts = [ FakeNode( 'h1' ) ]
+        self.controllers = []
+        s1, s2, s3 = self.switches
+        self.links = [ FakeLink( s1, s2 ), FakeLink( s2, s3, broken=True ) ]
+
+    def __getitem__( self, name ):
+        return [ node for node in self.switches + self.hosts
+                 if node.name == name ][ 0 ]
+
+    def linksBetween( self, node1, node2 ):
+        "Return links between node1 and node2"
+        return [ link for link in self.links
+                 if set( [ link.node1, link.node2 ] ) ==
+                 set( [ node1, node2 ] ) ]
+
+
+class testTimeline( unittest.TestCase ):
+    "Test dispatching events with stub nodes and links"
+
+    def setUp( self ):
+        self.net = FakeNet()
+        FakeLink.batches = []
+        self.Link, timeline.Link = timeline.Link, FakeLink
+
+    def tearDown( self ):
+        "Restore Link"
+        timeline.Link = self.Link
+
+    def testResolve( self ):
+        "Bad events are rejected before the timeline starts"
+        for event in [ ( 1, 'bogus', 's1' ),
+                       ( 1, 'down', 's1' ),
+                       ( 1, 'down', 's1', 's3' ),
+                       ( 1, 'stop', 'h1' ) ]:
+            self.assertRaises( Exception, Timeline, self.net, [ event ] )
+
+    def testSetStatus( self ):
+        "Link changes are made in one batch; errors go to their event"
+        events = Timeline( self.net, [ ( 0, 'down', 's1', 's2' ),
+                                       ( 0, 'down', 's3', 's2' ) ] ).groups
+        events = events[ 0 ][ 1 ]
+        errors = Timeline.setStatus( events )
+        self.assertEqual( FakeLink.batches, [ [ ( 's1', 's2', 'down' ),
+                                                ( 's2', 's3', 'down' ) ] ] )
+        self.assertEqual( errors, { 1: 'failed' } )
+
+    def testSharedLink( self ):
+        "An error on a link is charged to every event that touched it"
+        events = Timeline( self.net, [ ( 0, 'down', 's2', 's3' ),
+                                       ( 0, 'down', 's1', 's2' ),
+                                       ( 0, 'up', 's3', 's2' ) ] ).groups
+        errors = Timeline.setStatus( events[ 0 ][ 1 ] )
+        self.assertEqual( errors, { 0: 'failed', 2: 'failed' } )
+
+    def testDispatch( self ):
+        "Events due together run as one status batch, then in order"
+        s1, s2, s3 = self.net.switches
+        tl = Timeline( self.net, [ ( 0, 'start', 's3' ),
+                                   ( 0, 'update', 's1', 's2', { 'bw': 5 } ),
+                                   ( 0, 'down', 's2', 's3' ),
+                                   ( 0, 'stop', 's1' ),
+                                   ( 0, 'up', 's1', 's2' ) ] )
+        tl.startTime = time()
+        tl.dispatch( tl.groups[ 0 ][ 1 ] )
+        self.assertEqual( FakeLink.batches, [ [ ( 's2', 's3', 'down' ),
+                                                ( 's1', 's2', 'up' ) ] ] )
+        self.assertEqual( self.net.links[ 0 ].updates, [ { 'bw': 5 } ] )
+        self.assertEqual( s1.calls, [ ( 'stop', False ) ] )
+        self.assertEqual( ( s2.calls, s3.calls ), ( [], [] ) )
+        self.assertEqual( [ ( e[ 'action' ], e[ 'args' ], e[ 'error' ] )
+                            for e in tl.log ],
+                          [ ( 'down', 's2 s3', 'failed' ),
+                            ( 'up', 's1 s2', None ),
+                            ( 'start', 's3', 'could not start s3' ),
+                            ( 'update', 's1 s2', None ),
+                            ( 'stop', 's1', None ) ] )
+        for e in tl.log:
+            self.assertTrue( 0 <= e[ 'start' ] <= e[ 'end' ] )
+
+    def testRun( self ):
+        "Each batch runs when it is due, from a background thread"
+        tl = Timeline( self.net, [ ( .2, 'up', 's1', 's2' ),
+                                   ( .1, 'down', 's1', 's2' ),
+                                   ( .1, 'stop', 's2' ) ] )
+        tl.start()
+        self.assertTrue( tl.wait( 5 ) )
+        self.assertEqual( FakeLink.batches, [ [ ( 's1', 's2', 'down' ) ],
+                                              [ ( 's1', 's2', 'up' ) ] ] )
+        self.assertEqual( [ ( e[ 'time' ], e[ 'action' ] ) for e in tl.log ],
+                          [ ( .1, 'down' ), ( .1, 'stop' ), ( .2, 'up' ) ] )
+        for e in tl.log:
+            self.assertTrue( e[ 'time' ] <= e[ 'start' ] < e[ 'time' ] + .1 )
+
+    def testStop( self ):
+        "Events not yet due don't run once the timeline is stopped"
+        tl = Timeline( self.net, [ ( 5, 'down', 's1', 's2' ) ] )
+        tl.start()
+        start = time()
+        tl.stop()
+        self.assertTrue( time() - start < 1 )
+        self.assertEqual( ( tl.log, FakeLink.batches ), ( [], [] ) )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test parsing of iperf CSV reports, and running traffic matrices
+   with stub hosts and a fake iperf."""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from subprocess import Popen, PIPE
+
+from mininet import traffic
+from mininet.traffic import parseIperfCSV, runTraffic
+from mininet.log import setLogLevel
+
+CLIENT_UDP = """\
+------------------------------------------------------------
+20240101120000,10.0.0.1,40001,10.0.0.2,5001,3,0.0-5.0,6250000,10000000
+20240101120005,10.0.0.2,5001,10.0.0.1,40001,3,0.0-5.0,6125000,9800000,0.012,10,4260,0.235,0
+"""
+
+
+class testParseIperfCSV( unittest.TestCase ):
+    "Parse iperf -y C reports"
+
+    def testUdpClient( self ):
+        "UDP client report followed by the server's report"
+        reports = parseIperfCSV( CLIENT_UDP )
+        self.assertEqual( len( reports ), 2 )
+        self.assertEqual( reports[ 0 ][ 'localPort' ], 40001 )
+        self.assertEqual( reports[ 0 ][ 'bps' ], 10000000 )
+        self.assertFalse( 'jitter' in reports[ 0 ] )
+        self.assertEqual( reports[ 1 ][ 'remotePort' ], 40001 )
+        self.assertAlmostEqual( reports[ 1 ][ 'lossPct' ], 0.235 )
+
+
+# Fake iperf: a client reports on its flow and tells the server which
+# port it came from, in a file named for the server's port; the server
+# reports on that flow, then runs until it is stopped
+FAKE_IPERF = """
+import os, sys, time
+args = sys.argv[ 1: ]
+port = args[ args.index( '-p' ) + 1 ]
+path = os.path.join( os.path.dirname( sys.argv[ 0 ] ), port )
+udp = ',0.010,1,100,1.000,0' if '-u' in args else ''
+if '-s' in args:
+    while not os.path.exists( path ):
+        time.sleep( .01 )
+    client = open( path ).read()
+    print( '1,10.0.0.2,%s,10.0.0.1,%s,3,0.0-1.0,1000,8000%s'
+           % ( port, client, udp ) )
+    sys.stdout.flush()
+    time.sleep( 60 )
+elif args[ args.index( '-t' ) + 1 ] == '0':
+    sys.stderr.write( 'connect failed\\n' )
+    sys.exit( 1 )
+else:
+    client = str( int( port ) + 30000 )
+    print( '1,10.0.0.1,%s,10.0.0.2,%s,3,0.0-1.0,2000,16000'
+           % ( client, port ) )
+    with open( path + '.tmp', 'w' ) as f:
+        f.write( client )
+    os.rename( path + '.tmp', path )
+"""
+
+
+class FakeHost( object ):
+    "Host that runs the fake iperf, and records what it runs"
+
+    def __init__( self, name, ip, iperf, log ):
+        self.name = name
+        self.ip = ip
+        self.iperf = iperf
+        self.log = log
+
+    def IP( self ):
+        "Return our IP address"
+        return self.ip
+
+    def popen( self, args ):
+        "Run the fake iperf with args"
+        self.log.append( ( self.name, args ) )
+        proc = Popen( [ sys.executable, self.iperf ] + args[ 1: ],
+                      stdout=PIPE, stderr=PIPE )
+        self.log.procs.append( proc )
+        return proc
+
+
+class Log( list ):
+    "List of ( host name, args ), and of processes started"
+
+    def __init__( self ):
+        list.__init__( self )
+        self.procs = []
+
+
+class testRunTraffic( unittest.TestCase ):
+    "Test runTraffic() with stub hosts"
+
+    def setUp( self ):
+        self.tmpdir = tempfile.mkdtemp()
+        iperf = os.path.join( self.tmpdir, 'iperf.py' )
+        with open( iperf, 'w' ) as f:
+            f.write( FAKE_IPERF )
+        self.log = Log()
+        self.net = { 'h%d' % i: FakeHost( 'h%d' % i, '10.0.0.%d' % i, iperf,
+                                          self.log ) for i in ( 1, 2, 3 ) }
+        self.waitListening = traffic.waitListening
+        traffic.waitListening = self.fakeWaitListening
+
+    def tearDown( self ):
+        "Restore waitListening(), and stop anything left running"
+        traffic.waitListening = self.waitListening
+        for proc in self.log.procs:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        shutil.rmtree( self.tmpdir )
+
+    @staticmethod
+    def fakeWaitListening( _client, _server, port, timeout=None ):
+        "Every server is listening but the one on port 5003"
+        return port != 5003
+
+    def testFlows( self ):
+        "Flows run concurrently, and each reports its own result"
+        flows = [ ( 'h1', 'h2', 'TCP', None, 1 ),
+                  ( self.net[ 'h2' ], 'h3', 'udp', '10M', 1 ),
+                  ( 'h3', 'h1', 'TCP', None, 1 ),
+                  ( 'h1', 'h3', 'TCP', None, 0 ) ]
+        results = runTraffic( self.net, flows )
+        # All servers start before any client, one port per flow
+        self.assertEqual( [ args[ -1 ] for _name, args in self.log[ :4 ] ],
+                          [ '-s' ] * 4 )
+        self.assertEqual( [ ( name, args[ 4 ] ) for name, args in self.log ],
+                          [ ( 'h2', '5001' ), ( 'h3', '5002' ),
+                            ( 'h1', '5003' ), ( 'h3', '5004' ),
+                            ( 'h1', '5001' ), ( 'h2', '5002' ),
+                            ( 'h1', '5004' ) ] )
+        udpArgs = self.log[ 5 ][ 1 ]
+        self.assertEqual( udpArgs[ -4: ], [ '-t', '1', '-b', '10M' ] )
+        self.assertIn( '-u', udpArgs )
+        tcp, udp, notListening, failed = results
+        self.assertEqual( ( tcp[ 'src' ], tcp[ 'dst' ], tcp[ 'port' ] ),
+                          ( 'h1', 'h2', 5001 ) )
+        self.assertEqual( ( tcp[ 'clientBps' ], tcp[ 'serverBps' ],
+                            tcp[ 'bytes' ], tcp[ 'jitter' ], tcp[ 'error' ] ),
+                          ( 16000, 8000, 1000, None, None ) )
+        self.assertEqual( ( udp[ 'protocol' ], udp[ 'serverBps' ],
+                            udp[ 'jitter' ], udp[ 'lossPct' ] ),
+                          ( 'UDP', 8000, .01, 1.0 ) )
+        self.assertEqual( ( notListening[ 'error' ],
+                            notListening[ 'clientBps' ] ),
+                          ( 'server not listening', None ) )
+        self.assertEqual( failed[ 'error' ], 'connect failed' )
+        # Every server is stopped
+        for proc in self.log.procs:
+            self.assertNotEqual( proc.poll(), None )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
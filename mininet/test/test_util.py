@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test waiting for servers to listen, on directly linked hosts."""
+
+import sys
+import unittest
+from time import time
+
+from mininet.net import Mininet
+from mininet.linux.util import tcpListening, waitListening
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+# Listen after a delay, then report whether anyone connected
+SERVER = """
+import socket, time
+time.sleep( .5 )
+s = socket.socket()
+s.bind( ( '', %d ) )
+s.listen( 1 )
+s.settimeout( 2 )
+try:
+    s.accept()
+    print( 'connected' )
+except socket.timeout:
+    print( 'none' )
+"""
+
+
+class testWaitListening( unittest.TestCase ):
+    "Test waitListening() and tcpListening()"
+
+    port = 5001
+
+    def setUp( self ):
+        self.net = Mininet( controller=None )
+        self.h1, self.h2 = self.net.addHost( 'h1' ), self.net.addHost( 'h2' )
+        self.net.addLink( self.h1, self.h2 )
+        self.net.build()
+
+    def tearDown( self ):
+        "Stop network, and clean up if necessary"
+        self.net.stop()
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def serve( self ):
+        "Start a server on h2 that listens after a delay"
+        return self.h2.popen( [ sys.executable, '-c', SERVER % self.port ] )
+
+    def testNode( self ):
+        "A node server is found in its namespace, without connecting"
+        self.assertFalse( tcpListening( self.h2, self.port ) )
+        server = self.serve()
+        self.assertTrue( waitListening( self.h1, self.h2, self.port,
+                                        timeout=5 ) )
+        self.assertTrue( tcpListening( self.h2, self.port ) )
+        self.assertFalse( tcpListening( self.h1, self.port ) )
+        self.assertFalse( tcpListening( self.h2, self.port + 1 ) )
+        self.assertEqual( server.communicate()[ 0 ].strip(), 'none' )
+
+    def testAddress( self ):
+        "A server given by address is found by connecting to it"
+        server = self.serve()
+        self.assertTrue( waitListening( self.h1, self.h2.IP(), self.port,
+                                        timeout=5 ) )
+        self.assertEqual( server.communicate()[ 0 ].strip(), 'connected' )
+
+    def testTimeout( self ):
+        "Nothing listening, or no route, fails without waiting forever"
+        start = time()
+        self.assertFalse( waitListening( self.h1, self.h2.IP(), self.port,
+                                         timeout=.5 ) )
+        self.assertFalse( waitListening( self.h1, self.h2, self.port,
+                                         timeout=.5 ) )
+        self.assertFalse( waitListening( self.h1, '192.0.2.1', self.port ) )
+        self.assertTrue( time() - start < 3 )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,224 @@
+"""
+timeline.py: run a schedule of link and node events
+
+A schedule is a list of events, each a time in seconds from the start
+of the timeline, an action, and its arguments:
+
+  ( 1.0, 'down', 's1', 's2' )       take the s1 <-> s2 link(s) down
+  ( 1.5, 'up', 's1', 's2' )         bring them back up
+  ( 2.0, 'update', 's2', 's3', { 'bw': 5, 'delay': '10ms' } )
+                                    change link shaping (Link.update())
+  ( 3.0, 'stop', 's3' )             stop a switch or controller
+  ( 4.0, 'start', 's3' )            start it again
+
+Events are run from a single background thread, which sleeps until
+shortly before each event is due and spins the rest of the way.
+Events due at the same time are dispatched together: their link
+status changes are made at once with Link.batchStatus().
+
+  timeline = net.startTimeline( events )
+  ...
+  timeline.wait()
+  timeline.printLog()
+
+Each event's scheduled, start and end times, relative to the start of
+the timeline, are kept in timeline.log, so that e.g. routing
+convergence can be measured from when a failure actually happened.
+Nodes with scheduled events shouldn't be sent commands from other
+threads while the timeline runs.
+"""
+
+from threading import Thread, Event
+from time import time
+
+from mininet.link import Link
+from mininet.log import info, output, error, debug
+
+# Actions and their number of node arguments
+ACTIONS = { 'down': 2, 'up': 2, 'update': 2, 'stop': 1, 'start': 1 }
+
+# Fields of each log entry
+LOG_FIELDS = ( 'time', 'action', 'args', 'start', 'end', 'error' )
+
+
+def groupEvents( events ):
+    """Sort events by time and group those due at the same time
+       events: list of ( time, action, args... ), in any order
+       returns: list of ( time, list of events )"""
+    groups = []
+    for event in sorted( events, key=lambda event: event[ 0 ] ):
+        if groups and groups[ -1 ][ 0 ] == event[ 0 ]:
+            groups[ -1 ][ 1 ].append( event )
+        else:
+            groups.append( ( event[ 0 ], [ event ] ) )
+    return groups
+
+
+class Timeline( object ):
+    "Run scheduled link and node events in a network"
+
+    # Seconds before an event's time to stop sleeping and spin
+    spin = .002
+
+    def __init__( self, net, events ):
+        """net: Mininet object
+           events: list of ( time, action, args... )"""
+        self.net = net
+        self.groups = [ ( t, [ self.resolve( event ) for event in group ] )
+                        for t, group in groupEvents( events ) ]
+        self.log = []
+        self.stopped = Event()
+        self.thread = None
+        self.startTime = None
+
+    def resolve( self, event ):
+        """Check an event and look up its nodes and links
+           returns: dict of time, action, args, nodes, links, params"""
+        t, action, args = event[ 0 ], event[ 1 ], list( event[ 2: ] )
+        if action not in ACTIONS:
+            raise Exception( 'Unknown timeline action: %s' % action )
+        count = ACTIONS[ action ]
+        params = {}
+        if action == 'update':
+            params = args.pop() if len( args ) == count + 1 else {}
+        if len( args ) != count:
+            raise Exception( 'Timeline action %s needs %d nodes: %s' %
+                             ( action, count, event ) )
+        nodes = [ self.net[ name ] if isinstance( name, basestring )
+                  else name for name in args ]
+        links = []
+        if count == 2:
+            links = self.net.linksBetween( *nodes )
+            if not links:
+                raise Exception( 'No links between %s and %s' %
+                                 tuple( nodes ) )
+        elif nodes[ 0 ] not in self.net.switches + self.net.controllers:
+            raise Exception( 'Can only stop and start switches and '
+                             'controllers: %s' % nodes[ 0 ] )
+        return { 'time': t, 'action': action,
+                 'args': ' '.join( node.name for node in nodes ),
+                 'nodes': nodes, 'links': links, 'params': params }
+
+    def waitUntil( self, due ):
+        """Wait until due, a time() value, unless stopped; we sleep
+           until shortly before, since sleeps may overshoot, and spin
+           the rest of the way
+           returns: True if not stopped"""
+        while due - time() > self.spin:
+            if self.stopped.wait( due - time() - self.spin ):
+                return False
+        while time() < due:
+            pass
+        return not self.stopped.is_set()
+
+    @staticmethod
+    def setStatus( events ):
+        """Change link status for events with Link.batchStatus()
+           returns: dict of event index -> error message"""
+        changes, owners = [], {}  # ( link, status ), intf -> event indices
+        for index, event in enumerate( events ):
+            for link in event[ 'links' ]:
+                changes.append( ( link, event[ 'action' ] ) )
+                for intf in link.intf1, link.intf2:
+                    owners.setdefault( intf, [] ).append( index )
+        errors = {}
+        for intf, err in Link.batchStatus( changes ).items():
+            # We can't tell which of the events touching intf failed
+            for index in owners[ intf ]:
+                errors.setdefault( index, [] ).append( err )
+        return { index: '; '.join( errs ) for index, errs in errors.items() }
+
+    def runEvent( self, event ):
+        """Run an update, stop or start event
+           returns: error message or None"""
+        action, node = event[ 'action' ], event[ 'nodes' ][ 0 ]
+        try:
+            if action == 'update':
+                outputs = sum( ( link.update( **event[ 'params' ] )
+                                 for link in event[ 'links' ] ), [] )
+                return ''.join( outputs ).strip() or None
+            elif action == 'stop' and node in self.net.switches:
+                node.stop( deleteIntfs=False )
+            elif action == 'stop':
+                node.stop()
+            elif node in self.net.switches:
+                node.start( self.net.controllers )
+            else:
+                node.start()
+        except Exception as e:  # pylint: disable=broad-except
+            return str( e )
+        return None
+
+    def dispatch( self, events ):
+        "Run a batch of events that are due together"
+        status = [ event for event in events
+                   if event[ 'action' ] in ( 'up', 'down' ) ]
+        if status:
+            start = time() - self.startTime
+            errors = self.setStatus( status )
+            end = time() - self.startTime
+            for index, event in enumerate( status ):
+                self.record( event, start, end, errors.get( index ) )
+        for event in events:
+            if event[ 'action' ] in ( 'up', 'down' ):
+                continue
+            start = time() - self.startTime
+            err = self.runEvent( event )
+            self.record( event, start, time() - self.startTime, err )
+
+    def record( self, event, start, end, err ):
+        "Add an event to the log"
+        entry = dict( time=event[ 'time' ], action=event[ 'action' ],
+                      args=event[ 'args' ], start=start, end=end,
+                      error=err )
+        self.log.append( entry )
+        debug( '*** timeline %.6f: %s %s at %.6f (%.3fms)\n' % (
+            entry[ 'time' ], entry[ 'action' ], entry[ 'args' ],
+            start, ( end - start ) * 1000 ) )
+        if err:
+            error( '*** timeline %s %s: %s\n' % ( entry[ 'action' ],
+                                                  entry[ 'args' ], err ) )
+
+    def run( self ):
+        "Dispatch each batch of events when it is due"
+        for t, events in self.groups:
+            if not self.waitUntil( self.startTime + t ):
+                break
+            self.dispatch( events )
+        info( '*** Timeline done: %d events\n' % len( self.log ) )
+
+    def start( self ):
+        "Start the timeline in a background thread; times start now"
+        if self.thread:
+            return
+        self.stopped.clear()
+        self.log = []
+        self.startTime = time()
+        self.thread = Thread( target=self.run, name='timeline' )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def wait( self, timeout=None ):
+        """Wait for the timeline to finish
+           timeout: maximum seconds to wait
+           returns: True if finished"""
+        if self.thread:
+            self.thread.join( timeout )
+            if self.thread.is_alive():
+                return False
+            self.thread = None
+        return True
+
+    def stop( self ):
+        "Stop the timeline, after any batch being dispatched"
+        self.stopped.set()
+        self.wait()
+
+    def printLog( self ):
+        "Print a table of events run, with times in seconds"
+        fmt = '%10s %10s %9s %-7s %-16s %s\n'
+        output( fmt % ( 'time', 'start', 'ms', 'action', 'args', 'error' ) )
+        for e in self.log:
+            output( fmt % ( '%.6f' % e[ 'time' ], '%.6f' % e[ 'start' ],
+                            '%.3f' % ( ( e[ 'end' ] - e[ 'start' ] ) * 1000 ),
+                            e[ 'action' ], e[ 'args' ], e[ 'error' ] or '' ) )
@@ -0,0 +1,213 @@
+"""
+traffic.py: run many iperf flows at once from a traffic matrix
+
+A traffic matrix is a list of flows, each ( src, dst, protocol, rate,
+duration ), where src and dst are hosts or host names, protocol is
+'TCP' or 'UDP', rate is an iperf bandwidth (e.g. '10M', required for
+UDP) or None, and duration is in seconds:
+
+  flows = [ ( 'h1', 'h4', 'TCP', None, 10 ),
+            ( 'h2', 'h3', 'UDP', '20M', 10 ) ]
+  results = net.iperfMatrix( flows )
+
+Every flow gets its own server on its own port, so flows between the
+same hosts don't interfere, and no other iperf on the server is
+killed. All servers are started, then all clients, so that the flows
+run concurrently. Results are parsed from iperf's CSV reports (-y C)
+and returned as one dict per flow (see FLOW_FIELDS).
+"""
+
+import os
+import select
+from time import time
+
+from mininet.log import info, output, error
+
+plat = os.uname()[ 0 ]
+if plat == 'OpenBSD':
+    from mininet.openbsd.util import waitListening
+else:
+    from mininet.util import waitListening
+
+# Fields of an iperf CSV report, then extra fields for UDP servers
+CSV_FIELDS = ( 'timestamp', 'localIP', 'localPort', 'remoteIP', 'remotePort',
+               'id', 'interval', 'bytes', 'bps' )
+UDP_FIELDS = ( 'jitter', 'lost', 'total', 'lossPct', 'outOfOrder' )
+
+# Fields of each flow result
+FLOW_FIELDS = ( 'src', 'dst', 'protocol', 'rate', 'duration', 'port',
+                'bytes', 'clientBps', 'serverBps', 'jitter', 'lossPct',
+                'error' )
+
+
+def parseIperfCSV( text ):
+    """Parse iperf -y C output
+       returns: list of report dicts (see CSV_FIELDS, UDP_FIELDS)"""
+    reports = []
+    for line in text.splitlines():
+        values = line.strip().split( ',' )
+        if len( values ) not in ( len( CSV_FIELDS ),
+                                  len( CSV_FIELDS ) + len( UDP_FIELDS ) ):
+            continue
+        report = dict( zip( CSV_FIELDS + UDP_FIELDS, values ) )
+        try:
+            for key in report:
+                if key in ( 'jitter', 'lossPct' ):
+                    report[ key ] = float( report[ key ] )
+                elif key not in ( 'timestamp', 'localIP', 'remoteIP',
+                                  'interval' ):
+                    report[ key ] = int( report[ key ] )
+        except ValueError:
+            continue
+        reports.append( report )
+    return reports
+
+def normalizeFlows( net, flows, basePort=5001 ):
+    """Return list of flow dicts, with hosts and a unique port
+       net: Mininet object, to look up host names
+       flows: list of ( src, dst, protocol, rate, duration )"""
+    result = []
+    for index, ( src, dst, protocol, rate, duration ) in enumerate( flows ):
+        protocol = protocol.upper()
+        if protocol not in ( 'TCP', 'UDP' ):
+            raise Exception( 'Unexpected l4 type: %s' % protocol )
+        if protocol == 'UDP' and not rate:
+            raise Exception( 'UDP flow %s -> %s needs a rate' % ( src, dst ) )
+        if isinstance( src, basestring ):
+            src = net[ src ]
+        if isinstance( dst, basestring ):
+            dst = net[ dst ]
+        result.append( { 'src': src, 'dst': dst,
+                         'protocol': protocol, 'rate': rate,
+                         'duration': duration, 'port': basePort + index } )
+    return result
+
+def iperfArgs( flow, server=False ):
+    "Return iperf command for a flow's server or client"
+    args = [ 'iperf', '-y', 'C', '-p', str( flow[ 'port' ] ) ]
+    if flow[ 'protocol' ] == 'UDP':
+        args.append( '-u' )
+    if server:
+        return args + [ '-s' ]
+    args += [ '-c', flow[ 'dst' ].IP(), '-t', str( flow[ 'duration' ] ) ]
+    if flow[ 'rate' ]:
+        args += [ '-b', str( flow[ 'rate' ] ) ]
+    return args
+
+def readReports( servers, ports, timeout=2 ):
+    """Read server output until each server has reported on its flow
+       servers: list of server Popen objects
+       ports: client port whose report we wait for, per server (or None)
+       timeout: seconds to wait for reports
+       returns: list of server outputs"""
+    outputs = [ '' ] * len( servers )
+    fds = { server.stdout.fileno(): i for i, server in enumerate( servers )
+            if ports[ i ] is not None }
+    end = time() + timeout
+    while fds and time() < end:
+        readable, _w, _x = select.select( list( fds ), [], [],
+                                          max( 0, end - time() ) )
+        for fd in readable:
+            i = fds[ fd ]
+            data = os.read( fd, 4096 )
+            outputs[ i ] += data
+            reports = parseIperfCSV( outputs[ i ] )
+            if not data or any( r[ 'remotePort' ] == ports[ i ]
+                                for r in reports ):
+                del fds[ fd ]
+    for i, server in enumerate( servers ):
+        if server.poll() is None:
+            server.terminate()
+        outputs[ i ] += server.communicate()[ 0 ]
+    return outputs
+
+def runTraffic( net, flows, basePort=5001, timeout=None ):
+    """Run all flows of a traffic matrix concurrently with iperf
+       net: Mininet object
+       flows: list of ( src, dst, protocol, rate, duration )
+       basePort: port of the first flow; each flow uses the next
+       timeout: seconds to wait for each TCP server to listen
+       returns: list of flow result dicts (see FLOW_FIELDS)"""
+    flows = normalizeFlows( net, flows, basePort )
+    info( '*** Starting %d iperf servers\n' % len( flows ) )
+    servers = [ flow[ 'dst' ].popen( iperfArgs( flow, server=True ) )
+                for flow in flows ]
+    try:
+        for flow in flows:
+            flow[ 'error' ] = None
+            if ( flow[ 'protocol' ] == 'TCP' and
+                 not waitListening( flow[ 'src' ], flow[ 'dst' ],
+                                    flow[ 'port' ], timeout=timeout ) ):
+                flow[ 'error' ] = 'server not listening'
+        info( '*** Starting %d iperf clients\n' % len( flows ) )
+        clients = [ flow[ 'src' ].popen( iperfArgs( flow ) )
+                    if not flow[ 'error' ] else None for flow in flows ]
+        clientReports = []
+        for flow, client in zip( flows, clients ):
+            reports = []
+            if client:
+                cliout, clierr = client.communicate()
+                reports = parseIperfCSV( cliout )
+                if not reports:
+                    flow[ 'error' ] = ( clierr.strip() or
+                                        'could not parse client output' )
+            clientReports.append( reports )
+        ports = [ reports[ 0 ][ 'localPort' ] if reports else None
+                  for reports in clientReports ]
+        serverOutputs = readReports( servers, ports )
+    finally:
+        for server in servers:
+            if server.poll() is None:
+                server.kill()
+    results = []
+    for flow, reports, port, servout in zip( flows, clientReports, ports,
+                                             serverOutputs ):
+        result = dict( flow, src=flow[ 'src' ].name, dst=flow[ 'dst' ].name,
+                       bytes=None, clientBps=None, serverBps=None,
+                       jitter=None, lossPct=None )
+        mine = [ r for r in reports if r[ 'localPort' ] == port ]
+        if mine:
+            result.update( bytes=mine[ 0 ][ 'bytes' ],
+                           clientBps=mine[ 0 ][ 'bps' ] )
+        # UDP clients print the server's report as well
+        theirs = [ r for r in parseIperfCSV( servout )
+                   if r[ 'remotePort' ] == port ] + [
+                       r for r in reports if 'jitter' in r ]
+        if theirs:
+            result.update( bytes=theirs[ -1 ][ 'bytes' ],
+                           serverBps=theirs[ -1 ][ 'bps' ],
+                           jitter=theirs[ -1 ].get( 'jitter' ),
+                           lossPct=theirs[ -1 ].get( 'lossPct' ) )
+        elif port is not None and not result[ 'error' ]:
+            result[ 'error' ] = 'no server report'
+        if result[ 'error' ]:
+            error( '*** iperf %s -> %s port %d: %s\n' % (
+                result[ 'src' ], result[ 'dst' ], result[ 'port' ],
+                result[ 'error' ] ) )
+        results.append( result )
+    return results
+
+def formatBps( bps ):
+    "Return bits per second in human-readable form"
+    if bps is None:
+        return '-'
+    for unit in 'bits/sec', 'Kbits/sec', 'Mbits/sec':
+        if bps < 1000:
+            return '%.2f %s' % ( bps, unit )
+        bps /= 1000.0
+    return '%.2f Gbits/sec' % bps
+
+def printFlows( results ):
+    "Print a table of flow results"
+    fmt = '%-8s %-8s %-4s %6s %16s %16s %8s\n'
+    output( fmt % ( 'src', 'dst', 'prot', 'port', 'client', 'server',
+                    'loss%' ) )
+    total = 0
+    for r in results:
+        output( fmt % ( r[ 'src' ], r[ 'dst' ], r[ 'protocol' ], r[ 'port' ],
+                        formatBps( r[ 'clientBps' ] ),
+                        formatBps( r[ 'serverBps' ] ),
+                        '-' if r[ 'lossPct' ] is None
+                        else '%.2f' % r[ 'lossPct' ] ) )
+        total += r[ 'serverBps' ] or 0
+    output( '*** Aggregate throughput: %s\n' % formatBps( total ) )
@@ -2,6 +2,7 @@
 
 
 from mininet.log import output, info, error, debug
+from mininet.profiler import count
 
 from time import sleep
 from select import poll, POLLIN, POLLHUP
@@ -79,6 +80,7 @@ def errRun( *cmd, **kwargs ):
     elif isinstance( cmd, list ) and shell:
         cmd = " ".join( arg for arg in cmd )
     debug( '*** errRun:', cmd, '\n' )
+    count( 'processes' )
     popen = Popen( cmd, stdout=PIPE, stderr=stderr, shell=shell )
     # We use poll() because select() doesn't work with large fd numbers,
     # and thus communicate() doesn't work either
@@ -441,6 +443,11 @@ def ensureRoot():
 def waitListening( client=None, server='127.0.0.1', port=80, timeout=None ):
     """Wait until server is listening on port.
        returns True if server is listening"""
+    if os.uname()[ 0 ] == 'Linux':
+        # Probe with sockets instead; imported here, since
+        # mininet.linux.util imports us
+        from mininet.linux.util import waitListening as probeListening
+        return probeListening( client, server, port, timeout )
     runCmd = ( client.cmd if client else
                partial( quietRun, shell=True ) )
     if not runCmd( 'which telnet' ):
@@ -81,6 +81,18 @@ void cgroup(char *gname)
     pid_t pid = getpid();
     int count = 0;
     validate(gname);
+    /* cgroup v2 unified hierarchy */
+    snprintf(path, PATH_MAX, "/sys/fs/cgroup/%s/cgroup.procs", gname);
+    if (access("/sys/fs/cgroup/cgroup.controllers", F_OK) == 0) {
+        FILE *f = fopen(path, "w");
+        if (f) {
+            fprintf(f, "%d\n", pid);
+            if (fclose(f) == 0)
+                return;
+        }
+        fprintf(stderr, "cgroup: could not add to cgroup %s\n", gname);
+        exit(1);
+    }
     for (gptr = groups; *gptr; gptr++) {
         FILE *f;
         snprintf(path, PATH_MAX, "/sys/fs/cgroup/%s/%s/tasks",
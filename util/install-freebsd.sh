@@ -41,7 +41,7 @@ mn_deps () {
     fi
 
     $install python socat psmisc xterm openssh-portable iperf help2man bash\
-        py27-setuptools py27-pyflakes pylint-py27 py27-pep8 py27-pexpect #\
+        py27-setuptools py27-pyflakes pylint-py27 py27-pep8 py27-pexpect py27-numpy #\
         # gcc gmake
 
     printf '%s\n' "Installing Mininet core"